@@ -0,0 +1,394 @@
+"""生成→投稿パイプラインのベンチマーク（スタブサーバー使用）
+
+benchmarks/fake_servers.py の Anthropic / X API スタブを起動し、実際の
+TweetGenerator・Publisher・PostScheduler と main.py の各モードのループを
+そのまま動かして、投稿スループット・投稿遅延・スケジュールのずれ・メモリ使用量を測る。
+
+- once: run_once（全アカウントを順に1回ずつ）
+- scheduler: run_scheduler（同期スケジューラー）
+- async: run_scheduler_async（非同期スケジューラー）
+
+各計測は新しいPythonプロセスで実行し（メモリ使用量を分離するため）、
+スタブの乱数・Python の乱数を --seed で固定する。
+スケジューラーモードでは投稿枠を開始直後から --window 秒の間に等間隔で投入する。
+履歴・メトリクスは一時ディレクトリに書き出し、logs/ の履歴には残さない。
+
+使い方:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --accounts 10 100 --llm-latency-ms 800 \\
+        --x-rate-limit-rate 0.05 --llm-error-rate 0.02
+    python -m benchmarks.bench_pipeline --save bench.json
+    python -m benchmarks.bench_pipeline --baseline bench.json   # 劣化があれば終了コード1
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import yaml
+
+from benchmarks.fake_servers import add_fault_arguments, start_servers
+
+ROOT = Path(__file__).parent.parent
+
+MODES = ("once", "scheduler", "async")
+
+# 基準値との比較に使う指標: (値が大きいほど良いか, 許容する絶対差)
+# 絶対差はごく小さい値どうしの比較で誤検知しないための下限
+COMPARED = {
+    "posts_per_sec": (True, 0.0),
+    "latency_p99": (False, 0.05),
+    "drift_p99": (False, 0.05),
+    "rss_mb": (False, 2.0),
+}
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """最近傍順位法のパーセンタイル（0 <= q <= 100）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(-(-q * len(ordered) // 100)) - 1))
+    return ordered[index]
+
+
+def _rss_mb() -> float:
+    # Linux の ru_maxrss はKB単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_config(accounts: int, args) -> dict:
+    """accounts.yaml.example の english アカウントを複製したベンチマーク用設定"""
+    with open(ROOT / "config" / "accounts.yaml.example", encoding="utf-8") as f:
+        template = yaml.safe_load(f)["accounts"]["english"]
+    template["pregeneration"] = {"enabled": False}
+    template["schedule"]["timezone"] = "UTC"
+    style = template["content"]["style"]
+    style["thread_probability"] = args.thread_probability
+    style["stream"] = args.stream
+    style["candidates"] = args.candidates
+
+    config = {"accounts": {}}
+    for i in range(accounts):
+        acc_config = copy.deepcopy(template)
+        for key in ("api_key", "api_secret", "access_token",
+                    "access_token_secret"):
+            acc_config[key] = f"bench-{key}-{i}"
+        config["accounts"][f"bench{i:04d}"] = acc_config
+    return config
+
+
+# --- 子プロセス（1計測） ---
+
+def run_child(args) -> dict:
+    import main
+    import src.metrics
+    import src.publisher
+    from src.logger import PostHistory
+    from src.scheduler import PostScheduler
+    from src.tweet_generator import TweetGenerator
+
+    random.seed(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    src.metrics.METRICS_DIR = workdir
+    # ヘッダーの無いエラー時のバックオフを縮める（秒単位の計測に収めるため）
+    for name in ("RATE_LIMIT_BACKOFF", "SERVER_ERROR_BACKOFF",
+                 "OTHER_ERROR_BACKOFF"):
+        setattr(
+            src.publisher, name,
+            getattr(src.publisher, name) * args.backoff_scale
+        )
+
+    config = bench_config(args.child_accounts, args)
+    history = PostHistory(history_dir=workdir)
+    generator = TweetGenerator(
+        api_key="bench", history=history, base_url=args.anthropic_url
+    )
+    generator.prepare(config)
+    publishers = main.create_publishers(config)
+    rss_before = _rss_mb()
+
+    expected = args.child_accounts * args.posts
+    lock = threading.Lock()
+    finished = threading.Event()
+    completions: dict[str, list[float]] = {}
+    drifts: list[float] = []
+
+    def _on_post(entry: dict):
+        with lock:
+            completions.setdefault(entry["account"], []).append(time.time())
+            if sum(len(v) for v in completions.values()) >= expected:
+                finished.set()
+
+    history.subscribe(_on_post)
+
+    publish_result = main.publish_result
+
+    def _publish_result(account_id, result, pub, history, dry_run=False,
+                        planned=None, *rest, **kwargs):
+        if planned is not None:
+            with lock:
+                drifts.append(time.time() - planned.timestamp())
+        return publish_result(
+            account_id, result, pub, history, dry_run, planned,
+            *rest, **kwargs
+        )
+
+    main.publish_result = _publish_result
+
+    # 投稿枠: 開始直後から window 秒の間に等間隔（アカウントを交互に）
+    planned: dict[str, list[float]] = {}
+    start = time.time()
+    first_slot = start + args.lead
+    account_ids = list(config["accounts"])
+    for n in range(expected):
+        account_id = account_ids[n % len(account_ids)]
+        at = first_slot + (args.window * n / expected if expected > 1 else 0)
+        planned.setdefault(account_id, []).append(at)
+
+    scheduler = PostScheduler()
+
+    def _start_schedules(scheduler, *_args, **_kwargs):
+        for account_id, times in planned.items():
+            for at in times:
+                scheduler.requeue(
+                    account_id, datetime.fromtimestamp(at, timezone.utc)
+                )
+
+    main._create_scheduler = lambda *_args, **_kwargs: scheduler
+    main._start_schedules = _start_schedules
+
+    error = None
+
+    def _run():
+        nonlocal error
+        try:
+            if args.child_mode == "once":
+                for _ in range(args.posts):
+                    main.run_once(config, generator, publishers, history)
+            elif args.child_mode == "scheduler":
+                main.run_scheduler(config, generator, publishers, history)
+            else:
+                main.run_scheduler_async(
+                    config, generator, publishers, history,
+                    llm_concurrency=args.llm_concurrency,
+                    x_concurrency=args.x_concurrency,
+                )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            finished.set()
+
+    threading.Thread(target=_run, name="bench", daemon=True).start()
+    finished.wait(args.timeout)
+    elapsed = time.time() - start
+
+    with lock:
+        done = {a: list(v) for a, v in completions.items()}
+        drift_values = list(drifts)
+    completed = sum(len(v) for v in done.values())
+    latencies = []
+    if args.child_mode == "once":
+        # 直前の投稿の完了からの時間（生成 + 投稿）
+        previous = start
+        for t in sorted(t for v in done.values() for t in v):
+            latencies.append(t - previous)
+            previous = t
+        first = start
+        drift_values = []
+    else:
+        # 予定時刻から投稿完了まで（アカウント内の投稿は順に処理される）
+        for account_id, times in done.items():
+            latencies += [
+                t - at for t, at in zip(times, planned[account_id])
+            ]
+        first = first_slot
+    last = max((t for v in done.values() for t in v), default=time.time())
+    rss = _rss_mb()
+
+    return {
+        "mode": args.child_mode,
+        "accounts": args.child_accounts,
+        "expected": expected,
+        "completed": completed,
+        "elapsed": round(elapsed, 3),
+        "posts_per_sec": round(completed / max(last - first, 1e-9), 3),
+        "latency_p50": _round(percentile(latencies, 50)),
+        "latency_p99": _round(percentile(latencies, 99)),
+        "drift_p50": _round(percentile(drift_values, 50)),
+        "drift_p99": _round(percentile(drift_values, 99)),
+        "rss_mb": round(rss, 1),
+        "kb_per_account": round(
+            (rss - rss_before) * 1024 / args.child_accounts, 1
+        ),
+        "error": error,
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 4)
+
+
+# --- 親プロセス（スタブの起動・集計・比較） ---
+
+def run_case(mode: str, accounts: int, args, anthropic, x) -> dict:
+    for server in (anthropic, x):
+        server.profile.reseed(args.seed)
+        server.stats = {}
+    command = [
+        sys.executable, "-m", "benchmarks.bench_pipeline",
+        *sys.argv[1:],
+        "--child-mode", mode, "--child-accounts", str(accounts),
+        "--anthropic-url", anthropic.base_url,
+    ]
+    env = dict(
+        os.environ, ANTHROPIC_API_KEY="bench", LOG_LEVEL=args.log_level,
+        CONFIG_POLL_SECONDS="0", X_API_BASE_URL=x.base_url,
+    )
+    proc = subprocess.run(
+        command, cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True,
+        timeout=args.timeout + 60,
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.strip()]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{mode} x {accounts}: 子プロセスが失敗しました")
+    result = json.loads(lines[-1])
+    result["llm_faults"] = _faults(anthropic.stats)
+    result["x_faults"] = _faults(x.stats)
+    return result
+
+
+def _faults(stats: dict) -> int:
+    return stats.get("errors", 0) + stats.get("rate_limited", 0)
+
+
+def _fmt(value, unit: str = "") -> str:
+    return "-" if value is None else f"{value:.3f}{unit}"
+
+
+def print_result(result: dict):
+    print(
+        f"  {result['mode']:<9} {result['accounts']:>5}件  "
+        f"{result['completed']:>5}/{result['expected']:<5} "
+        f"{result['posts_per_sec']:8.2f} posts/s  "
+        f"遅延 p50 {_fmt(result['latency_p50'], 's')} "
+        f"p99 {_fmt(result['latency_p99'], 's')}  "
+        f"ずれ p50 {_fmt(result['drift_p50'], 's')} "
+        f"p99 {_fmt(result['drift_p99'], 's')}  "
+        f"RSS {result['rss_mb']:.1f}MB "
+        f"({result['kb_per_account']:.1f}KB/件)  "
+        f"失敗注入 LLM {result['llm_faults']} / X {result['x_faults']}"
+    )
+    if result["error"]:
+        print(f"    ❌ 異常終了: {result['error']}")
+
+
+def compare(results: list[dict], baseline: list[dict],
+            tolerance: float) -> list[str]:
+    """基準値より tolerance（割合）を超えて悪化した指標を返す"""
+    previous = {(r["mode"], r["accounts"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result["mode"], result["accounts"]))
+        if base is None:
+            continue
+        label = f"{result['mode']} x {result['accounts']}"
+        if result["completed"] < base["completed"]:
+            regressions.append(
+                f"{label}: 完了数 {base['completed']} → {result['completed']}"
+            )
+        for key, (higher_is_better, slack) in COMPARED.items():
+            old, new = base.get(key), result.get(key)
+            if old is None or new is None:
+                continue
+            worse = old - new if higher_is_better else new - old
+            if worse > old * tolerance and worse > slack:
+                regressions.append(f"{label}: {key} {old} → {new}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="生成→投稿パイプラインのベンチマーク"
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--accounts", nargs="+", type=int, default=[10, 100])
+    parser.add_argument(
+        "--posts", type=int, default=1, help="1アカウントあたりの投稿数"
+    )
+    parser.add_argument(
+        "--window", type=float, default=0.0,
+        help="投稿枠を分散させる秒数（0なら全枠が同時刻）"
+    )
+    parser.add_argument("--lead", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--thread-probability", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--candidates", type=int, default=1)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--x-concurrency", type=int, default=4)
+    parser.add_argument(
+        "--backoff-scale", type=float, default=0.02,
+        help="Publisher のバックオフ秒数に掛ける係数"
+    )
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--save", type=Path, help="結果をJSONで保存")
+    parser.add_argument("--baseline", type=Path, help="比較する保存済みの結果")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="基準値からの悪化をどこまで許容するか（割合）"
+    )
+    add_fault_arguments(parser)
+    # 子プロセス用（親から渡す）
+    parser.add_argument("--child-mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--child-accounts", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--anthropic-url", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.child_mode:
+        print(json.dumps(run_child(args)), flush=True)
+        # スケジューラーのループは止まらないため、スレッドを待たずに終了する
+        os._exit(0)
+
+    anthropic, x = start_servers(args)
+    results = []
+    try:
+        for mode in args.modes:
+            for accounts in args.accounts:
+                result = run_case(mode, accounts, args, anthropic, x)
+                print_result(result)
+                results.append(result)
+    finally:
+        anthropic.stop()
+        x.stop()
+
+    if args.save:
+        args.save.write_text(
+            json.dumps(results, ensure_ascii=False, indent=2),
+            encoding="utf-8"
+        )
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"  ⚠️ 劣化: {line}")
+        if regressions:
+            sys.exit(1)
+        print("  基準値からの劣化なし")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""投稿枠サンプラーのベンチマーク（分単位リスト方式との比較）
+
+使い方:
+    python -m benchmarks.bench_scheduler
+"""
+
+import random
+import timeit
+
+from src.slot_sampler import sample_slots
+
+
+def legacy_sample(posts: int, core_start: int = 8, core_end: int = 22,
+                  min_interval: float = 2) -> list[int]:
+    """以前の generate_daily_schedule の抽選部分（分単位リストを毎回作り直す）"""
+    times = []
+    available = list(range(core_start * 60, core_end * 60))
+    for _ in range(posts):
+        if not available:
+            break
+        minute = random.choice(available)
+        times.append(minute)
+        exclude_start = minute - min_interval * 60
+        exclude_end = minute + min_interval * 60
+        available = [
+            m for m in available if m < exclude_start or m > exclude_end
+        ]
+    return sorted(times)
+
+
+def interval_sample(posts: int, core_start: int = 8, core_end: int = 22,
+                    min_interval: float = 2) -> list[int]:
+    return sample_slots(
+        [(core_start * 3600, core_end * 3600)], posts,
+        int(min_interval * 3600)
+    )
+
+
+CASES = {
+    "4 posts / 2h": (4, 2),
+    "24 posts / 30min": (24, 0.5),
+    "96 posts / 5min": (96, 5 / 60),
+}
+
+
+def main():
+    for label, (posts, interval) in CASES.items():
+        print(f"[{label}]")
+        for name, func in (("legacy", legacy_sample),
+                           ("interval", interval_sample)):
+            number = 200
+            seconds = timeit.timeit(
+                lambda: func(posts, min_interval=interval), number=number
+            )
+            counts = [len(func(posts, min_interval=interval))
+                      for _ in range(50)]
+            print(
+                f"  {name:<9} {seconds / number * 1e6:10.1f} µs/account  "
+                f"平均 {sum(counts) / len(counts):5.1f}/{posts} 件"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""CLIの起動時間ベンチマーク（モードごと）
+
+各モードを新しいPythonプロセスで実行し、終了までの時間を計測する。
+設定は config/accounts.yaml.example を使い、X API・Claude API には接続しない
+（--verify の認証確認と --once の投稿処理は空の関数に差し替える）。
+
+使い方:
+    python -m benchmarks.bench_startup [回数]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+BOOT = """
+import sys
+import yaml
+sys.argv = ["main.py", *{args!r}]
+import main
+with open("config/accounts.yaml.example", encoding="utf-8") as f:
+    config = yaml.safe_load(f)
+main.load_config = lambda: config
+main.verify_all_credentials = lambda publishers: True
+main.run_once = lambda *args, **kwargs: None
+main.main()
+"""
+
+MODES = {
+    "python (baseline)": "pass",
+    "import main": "import main",
+    "--status": BOOT.format(args=["--status"]),
+    "--verify": BOOT.format(args=["--verify"]),
+    "--once --dry-run (init)": BOOT.format(args=["--once", "--dry-run"]),
+}
+
+
+def run(code: str) -> float:
+    env = dict(os.environ, ANTHROPIC_API_KEY="bench", LOG_LEVEL="WARNING")
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for label, code in MODES.items():
+        run(code)  # 初回はバイトコード生成を含むため除外
+        samples = [run(code) * 1000 for _ in range(repeat)]
+        print(
+            f"  {label:<26} median {statistics.median(samples):7.1f} ms  "
+            f"min {min(samples):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
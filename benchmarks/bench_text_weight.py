@@ -0,0 +1,50 @@
+"""重み付き文字数カウントのマイクロベンチマーク
+
+使い方:
+    python -m benchmarks.bench_text_weight
+"""
+
+import timeit
+
+from src.text_weight import fit_prefix, weighted_length
+from src.tweet_generator import TweetGenerator
+
+SAMPLES = {
+    "en": (
+        "Most AI automation projects fail for a boring reason: nobody owns "
+        "the process after launch. Pick one owner, one metric, one weekly "
+        "review. #AI #automation"
+    ),
+    "ja": (
+        "業務改善で一番効くのは、新しいツールより「やめること」を決めること。"
+        "定例会議を1つ減らすだけで、チームの集中時間は驚くほど増えます。"
+        "#DX #業務改善"
+    ),
+    "url": (
+        "Wrote up how we cut our support backlog by 40% with a tiny agent: "
+        "https://example.com/blog/support-agent?utm_source=x。詳しくはこちら"
+    ),
+    "emoji": "Ship it 🚀 then measure 📈 👨‍👩‍👧‍👦 🇯🇵 1️⃣",
+    "long_ja": "これは長い日本語の文章です。" * 30,
+}
+
+
+def bench(label: str, func, text: str, number: int = 20000) -> float:
+    seconds = timeit.timeit(lambda: func(text), number=number)
+    usec = seconds / number * 1e6
+    print(f"  {label:<14} {usec:8.2f} µs/tweet")
+    return usec
+
+
+def main():
+    for name, text in SAMPLES.items():
+        print(f"[{name}] weight={weighted_length(text)} len={len(text)}")
+        bench("weighted_length", weighted_length, text)
+        bench("fit_prefix", lambda t: fit_prefix(t, 280), text, 5000)
+        bench(
+            "trim", lambda t: TweetGenerator._trim_text(t, 280), text, 5000
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""ベンチマーク用のスタブサーバー - Anthropic Messages API と X API v2 の代わり
+
+ローカルで HTTP/1.1（keep-alive）のサーバーを起動し、実際のクライアント
+（anthropic SDK・tweepy）からのリクエストに本物と同じ形式で応答する。
+応答の遅延・エラー率・429の割合を指定でき、乱数は seed で固定する
+（POST /_reset で再シードとカウンターの初期化、GET /_stats で集計を取得）。
+
+単体で起動する場合:
+    python -m benchmarks.fake_servers --llm-latency-ms 300 --x-latency-ms 50
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAULT_ERROR = "error"
+FAULT_RATE_LIMIT = "rate_limit"
+
+# ダミー本文の単語（毎回違う組み合わせにして重複判定に掛からないようにする）
+_SYLLABLES = (
+    "ka", "ri", "to", "mo", "na", "sel", "vor", "tan", "lu", "pe", "dri",
+    "qua", "zen", "fo", "mi", "ar", "ol", "ex", "un", "bri", "cor", "dem",
+)
+
+
+class FaultProfile:
+    """応答の遅延と失敗の注入設定"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 rate_limit_reset_seconds: float = 2.0, seed: int = 0):
+        """
+        Args:
+            latency_ms: 応答までの平均遅延（ミリ秒）
+            jitter_ms: 遅延のばらつき（一様分布の幅の半分）
+            error_rate: 5xx を返す割合
+            rate_limit_rate: 429 を返す割合
+            rate_limit_reset_seconds: 429 で通知する解除までの秒数
+            seed: 乱数のシード
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit_reset_seconds = rate_limit_reset_seconds
+        self._lock = threading.Lock()
+        self.reseed(seed)
+
+    def reseed(self, seed: int):
+        with self._lock:
+            self._rng = random.Random(seed)
+
+    def decide(self) -> tuple[float, str | None]:
+        """1リクエスト分の (遅延秒, 注入する失敗 or None) を決める"""
+        with self._lock:
+            delay = self.latency_ms + self._rng.uniform(
+                -self.jitter_ms, self.jitter_ms
+            )
+            roll = self._rng.random()
+        fault = None
+        if roll < self.rate_limit_rate:
+            fault = FAULT_RATE_LIMIT
+        elif roll < self.rate_limit_rate + self.error_rate:
+            fault = FAULT_ERROR
+        return max(0.0, delay) / 1000, fault
+
+    def fake_text(self, words: int = 24) -> str:
+        with self._lock:
+            return " ".join(
+                "".join(self._rng.choices(_SYLLABLES, k=self._rng.randint(2, 4)))
+                for _ in range(words)
+            )
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.stub.dispatch(self, "GET")
+
+    def do_POST(self):
+        self.server.stub.dispatch(self, "POST")
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def send_body(self, status: int, body: bytes,
+                  content_type: str = "application/json",
+                  headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, data: dict, headers: dict = None):
+        self.send_body(
+            status, json.dumps(data).encode(), headers=headers
+        )
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # クライアントの終了・ストリーミングの打ち切りによる切断は無視する
+        if not isinstance(
+            sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)
+        ):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """スタブサーバーの共通部分（起動・停止・遅延と失敗の注入・集計）"""
+
+    def __init__(self, profile: FaultProfile, host: str = "127.0.0.1",
+                 port: int = 0):
+        self.profile = profile
+        self._server = _StubHTTPServer((host, port), _StubHandler)
+        self._server.stub = self
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.stats: dict[str, int] = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name=type(self).__name__,
+            daemon=True,
+        )
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def dispatch(self, handler: _StubHandler, method: str):
+        if handler.path == "/_reset" and method == "POST":
+            body = handler.read_json()
+            self.profile.reseed(body.get("seed", 0))
+            with self._lock:
+                self.stats = {}
+            handler.send_json(200, {"ok": True})
+            return
+        if handler.path == "/_stats":
+            with self._lock:
+                handler.send_json(200, dict(self.stats))
+            return
+
+        delay, fault = self.profile.decide()
+        if delay:
+            time.sleep(delay)
+        try:
+            self.handle(handler, method, fault)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def handle(self, handler: _StubHandler, method: str, fault: str | None):
+        raise NotImplementedError
+
+
+class FakeAnthropicServer(StubServer):
+    """POST /v1/messages（通常・ストリーミング）"""
+
+    def __init__(self, profile: FaultProfile, **kwargs):
+        super().__init__(profile, **kwargs)
+        self._ids = itertools.count(1)
+
+    def handle(self, handler: _StubHandler, method: str, fault: str | None):
+        if method != "POST" or not handler.path.startswith("/v1/messages"):
+            handler.send_json(404, {"type": "error", "error": {
+                "type": "not_found_error", "message": handler.path,
+            }})
+            return
+        body = handler.read_json()
+        if fault == FAULT_RATE_LIMIT:
+            self.count("rate_limited")
+            handler.send_json(
+                429,
+                {"type": "error", "error": {
+                    "type": "rate_limit_error", "message": "stub"
+                }},
+                headers={
+                    "retry-after": self.profile.rate_limit_reset_seconds
+                },
+            )
+            return
+        if fault == FAULT_ERROR:
+            self.count("errors")
+            handler.send_json(529, {"type": "error", "error": {
+                "type": "overloaded_error", "message": "stub",
+            }})
+            return
+
+        self.count("messages")
+        text = self._reply_text(_last_user_text(body))
+        input_tokens = len(json.dumps(body)) // 4
+        output_tokens = len(text) // 4 + 1
+        message = {
+            "id": f"msg_stub_{next(self._ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        }
+        if body.get("stream"):
+            handler.send_body(
+                200, _sse_events(message).encode(),
+                content_type="text/event-stream",
+            )
+        else:
+            handler.send_json(200, message)
+
+    def _reply_text(self, prompt: str) -> str:
+        """プロンプトの形式（単一・候補・スレッド・一括）に合わせた応答"""
+        batch = re.search(r"Generate (\d+) independent posts", prompt)
+        if batch:
+            sizes = [int(n) for n in re.findall(r'tweets="(\d+)"', prompt)]
+            return json.dumps([
+                {
+                    "index": i + 1,
+                    "tweets": [self.profile.fake_text() for _ in range(n)],
+                }
+                for i, n in enumerate(sizes)
+            ])
+        candidates = re.search(r"JSON array of (\d+) strings", prompt)
+        if candidates:
+            return json.dumps([
+                self.profile.fake_text()
+                for _ in range(int(candidates.group(1)))
+            ])
+        thread = re.search(r"thread of exactly (\d+) tweets", prompt)
+        if thread:
+            # 最後のツイートの後にも区切り線を付ける（プロンプトの指示どおり）
+            return "".join(
+                self.profile.fake_text() + "\n---\n"
+                for _ in range(int(thread.group(1)))
+            )
+        return self.profile.fake_text()
+
+
+def _last_user_text(body: dict) -> str:
+    for message in reversed(body.get("messages", [])):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        return "".join(
+            block.get("text", "") for block in content
+            if block.get("type") == "text"
+        )
+    return ""
+
+
+def _sse_events(message: dict) -> str:
+    """Messages API のストリーミング形式（単語ごとの text_delta）"""
+    text = message["content"][0]["text"]
+    start = dict(message, content=[], stop_reason=None)
+    start["usage"] = dict(message["usage"], output_tokens=1)
+    events = [
+        ("message_start", {"type": "message_start", "message": start}),
+        ("content_block_start", {
+            "type": "content_block_start", "index": 0,
+            "content_block": {"type": "text", "text": ""},
+        }),
+    ]
+    for piece in re.findall(r"\S+\s*|\s+", text):
+        events.append(("content_block_delta", {
+            "type": "content_block_delta", "index": 0,
+            "delta": {"type": "text_delta", "text": piece},
+        }))
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": message["usage"]["output_tokens"]},
+        }),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return "".join(
+        f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events
+    )
+
+
+class FakeXServer(StubServer):
+    """POST /2/tweets（create_tweet）と GET /2/users/me（get_me）"""
+
+    RATE_LIMIT = 200
+
+    def __init__(self, profile: FaultProfile, **kwargs):
+        super().__init__(profile, **kwargs)
+        self._ids = itertools.count(10 ** 18)
+
+    def _limit_headers(self, remaining: int) -> dict:
+        reset = int(time.time() + self.profile.rate_limit_reset_seconds) + 1
+        return {
+            "x-rate-limit-limit": self.RATE_LIMIT,
+            "x-rate-limit-remaining": remaining,
+            "x-rate-limit-reset": reset,
+        }
+
+    def handle(self, handler: _StubHandler, method: str, fault: str | None):
+        path = handler.path.split("?")[0]
+        if method == "POST" and path == "/2/tweets":
+            body = handler.read_json()
+        elif method == "GET" and path == "/2/users/me":
+            body = None
+        else:
+            handler.send_json(404, {"title": "Not Found", "detail": path})
+            return
+
+        if fault == FAULT_RATE_LIMIT:
+            self.count("rate_limited")
+            handler.send_json(
+                429, {"title": "Too Many Requests", "status": 429},
+                headers=self._limit_headers(0),
+            )
+            return
+        if fault == FAULT_ERROR:
+            self.count("errors")
+            handler.send_json(
+                503, {"title": "Service Unavailable", "status": 503}
+            )
+            return
+
+        headers = self._limit_headers(self.RATE_LIMIT - 1)
+        if body is None:
+            self.count("get_me")
+            handler.send_json(200, {"data": {
+                "id": "1", "name": "Stub", "username": "stub",
+            }}, headers=headers)
+            return
+        self.count("tweets")
+        handler.send_json(201, {"data": {
+            "id": str(next(self._ids)), "text": body.get("text", ""),
+            "edit_history_tweet_ids": [],
+        }}, headers=headers)
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    """遅延・失敗の注入設定の引数（--llm-* / --x-*）"""
+    for prefix, latency in (("llm", 300), ("x", 50)):
+        parser.add_argument(
+            f"--{prefix}-latency-ms", type=float, default=latency
+        )
+        parser.add_argument(f"--{prefix}-jitter-ms", type=float, default=0)
+        parser.add_argument(f"--{prefix}-error-rate", type=float, default=0)
+        parser.add_argument(
+            f"--{prefix}-rate-limit-rate", type=float, default=0
+        )
+    parser.add_argument("--rate-limit-reset-seconds", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def start_servers(args) -> tuple[FakeAnthropicServer, FakeXServer]:
+    """引数の設定で両方のスタブサーバーを起動"""
+    servers = []
+    for prefix, cls in (("llm", FakeAnthropicServer), ("x", FakeXServer)):
+        profile = FaultProfile(
+            latency_ms=getattr(args, f"{prefix}_latency_ms"),
+            jitter_ms=getattr(args, f"{prefix}_jitter_ms"),
+            error_rate=getattr(args, f"{prefix}_error_rate"),
+            rate_limit_rate=getattr(args, f"{prefix}_rate_limit_rate"),
+            rate_limit_reset_seconds=args.rate_limit_reset_seconds,
+            seed=args.seed,
+        )
+        server = cls(profile)
+        server.start()
+        servers.append(server)
+    return tuple(servers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="X / Anthropic API スタブ")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    anthropic, x = start_servers(args)
+    print(f"ANTHROPIC_BASE_URL={anthropic.base_url}")
+    print(f"X_API_BASE_URL={x.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,38 @@
-"""X Auto Poster - メインエントリーポイント"""
+"""X Auto Poster - メインエントリーポイント
+
+--status / --verify を速く起動できるよう、anthropic・tweepy・asyncio など
+重いモジュールは必要になるモードでのみ関数内でimportする。
+"""
+
+from __future__ import annotations
 
 import argparse
+import json
 import os
 import sys
 import time
 import yaml
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 
+from src.clock import SYSTEM_CLOCK, Clock, ClockStopped
 from src.logger import setup_logger, PostHistory
-from src.tweet_generator import TweetGenerator
-from src.scheduler import PostScheduler
-from src.publisher import Publisher
+from src.metrics import metrics, load_summary, load_worker_summaries
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from src.config_watcher import ConfigWatcher
+    from src.draft_pool import DraftPool
+    from src.leases import LeaseManager
+    from src.pregenerator import PreGenerator
+    from src.publisher import Publisher
+    from src.quota import QuotaManager
+    from src.scheduler import PostScheduler
+    from src.thread_jobs import ThreadJobStore
+    from src.tweet_generator import TweetGenerator
 
 # .envファイル読み込み
 load_dotenv()
@@ -21,10 +40,21 @@ load_dotenv()
 # ロガー初期化
 logger = setup_logger(os.getenv("LOG_LEVEL", "INFO"))
 
+# スケジューラーの最大スリープ秒数（次のイベントが遠い場合も定期的に起床）
+MAX_IDLE_SLEEP = 3600
+# レート制限等で延期できる回数の上限（超えたら投稿失敗とする）
+MAX_POST_DEFERRALS = 5
+
+CONFIG_PATH = Path(__file__).parent / "config" / "accounts.yaml"
+SCHEDULE_STATE_PATH = Path(__file__).parent / "logs" / "schedule_state.json"
+LEASE_DB_PATH = Path(__file__).parent / "logs" / "leases.sqlite3"
+QUOTA_DB_PATH = Path(__file__).parent / "logs" / "quota.sqlite3"
+WORKERS_DIR = Path(__file__).parent / "logs" / "workers"
+
 
 def load_config() -> dict:
     """設定ファイル読み込み"""
-    config_path = Path(__file__).parent / "config" / "accounts.yaml"
+    config_path = CONFIG_PATH
     if not config_path.exists():
         print("❌ config/accounts.yaml が見つかりません")
         print("   config/accounts.yaml.example をコピーして設定してください")
@@ -34,18 +64,50 @@ def load_config() -> dict:
         return yaml.safe_load(f)
 
 
-def create_publishers(config: dict) -> dict[str, Publisher]:
-    """各アカウントのPublisherを生成"""
-    publishers = {}
+def configure_history(history: PostHistory, config: dict):
+    """アカウントごとの履歴保持件数を反映"""
     for account_id, acc_config in config["accounts"].items():
-        pub = Publisher(
-            api_key=acc_config["api_key"],
-            api_secret=acc_config["api_secret"],
-            access_token=acc_config["access_token"],
-            access_token_secret=acc_config["access_token_secret"],
-        )
-        publishers[account_id] = pub
-    return publishers
+        _configure_account_history(history, account_id, acc_config)
+
+
+def _configure_account_history(history: PostHistory, account_id: str,
+                               acc_config: dict):
+    retention = acc_config.get("history", {}).get("retention")
+    if retention:
+        history.set_retention(account_id, int(retention))
+
+
+def create_publisher(account_id: str, acc_config: dict,
+                     quota: QuotaManager = None) -> Publisher:
+    """1アカウント分のPublisherを生成"""
+    from src.publisher import Publisher
+
+    return Publisher(
+        api_key=acc_config["api_key"],
+        api_secret=acc_config["api_secret"],
+        access_token=acc_config["access_token"],
+        access_token_secret=acc_config["access_token_secret"],
+        account_id=account_id,
+        quota=quota,
+    )
+
+
+def create_publishers(config: dict,
+                      quota: QuotaManager = None) -> dict[str, Publisher]:
+    """各アカウントのPublisherを生成"""
+    return {
+        account_id: create_publisher(account_id, acc_config, quota)
+        for account_id, acc_config in config["accounts"].items()
+    }
+
+
+def _create_quota(config: dict) -> QuotaManager:
+    """月間予算の管理（QUOTA_DB は複数ホストのワーカーで同じファイルを指定する）"""
+    from src.quota import QuotaManager, QuotaStore
+
+    return QuotaManager(
+        QuotaStore(Path(os.getenv("QUOTA_DB") or QUOTA_DB_PATH)), config
+    )
 
 
 def verify_all_credentials(publishers: dict) -> bool:
@@ -58,144 +120,919 @@ def verify_all_credentials(publishers: dict) -> bool:
     return all_ok
 
 
+def publish_result(account_id: str, result: dict, pub: Publisher,
+                   history: PostHistory, dry_run: bool = False,
+                   planned: datetime = None,
+                   defer: bool = False,
+                   thread_jobs: ThreadJobStore = None,
+                   clock: Clock = None) -> dict | None:
+    """
+    生成結果を投稿し履歴に記録する
+
+    Args:
+        defer: Trueならレート制限時に待機せず延期結果を返す
+        thread_jobs: 指定するとスレッドを再開可能なジョブとして投稿する
+            （defer=True ならジョブを作成するだけで投稿はスケジューラーが進める）
+        clock: スケジュールのずれを測る時計（シミュレーションでは仮想時刻）
+
+    Returns:
+        {"id": str, ...}、延期時は {"deferred": True, "retry_at": ...}、
+        スレッドのジョブ化時は {"thread_job": job_id, "next_at": ...}、
+        失敗時は None
+    """
+    if planned is not None:
+        # 予定時刻と実際の投稿時刻のずれ
+        drift = (
+            (clock or SYSTEM_CLOCK).now() - planned
+        ).total_seconds()
+        metrics.observe("schedule_drift_seconds", drift, account=account_id)
+
+    try:
+        return _publish_result(
+            account_id, result, pub, history, dry_run, defer, thread_jobs
+        )
+    finally:
+        metrics.flush()
+
+
+def _publish_result(account_id: str, result: dict, pub: Publisher,
+                    history: PostHistory, dry_run: bool,
+                    defer: bool,
+                    thread_jobs: ThreadJobStore | None) -> dict | None:
+    if dry_run:
+        logger.info(
+            f"[DRY RUN] [{account_id}] "
+            f"[{result['category']}] {result['text']}"
+        )
+        if result["is_thread"]:
+            for i, t in enumerate(result["thread_texts"]):
+                logger.info(f"  スレッド {i+1}: {t}")
+        history.add(
+            account_id, result["text"],
+            "dry-run", result["category"]
+        )
+        metrics.inc("posts_total", account=account_id, result="dry_run")
+        return {"id": "dry-run", "text": result["text"]}
+
+    # スレッドは1ツイートごとに進捗を保存しながら投稿
+    if result["is_thread"] and result["thread_texts"] and thread_jobs:
+        job = thread_jobs.create(account_id, result)
+        if defer:
+            return {"thread_job": job["job_id"], "next_at": job["next_at"]}
+        from src.thread_jobs import run_thread_job
+        run_thread_job(job, pub, thread_jobs, history)
+        return {"thread_job": job["job_id"], "next_at": None}
+
+    # 投稿
+    if result["is_thread"] and result["thread_texts"]:
+        post_results = pub.post_thread(result["thread_texts"])
+        post_result = post_results[0] if post_results else None
+    else:
+        post_result = pub.post_tweet(result["text"], defer=defer)
+        if post_result and post_result.get("deferred"):
+            return post_result
+    tweet_id = post_result["id"] if post_result else None
+
+    # 履歴に追加
+    if tweet_id:
+        history.add(
+            account_id=account_id,
+            tweet_text=result["text"],
+            tweet_id=tweet_id,
+            category=result["category"],
+        )
+        logger.info(
+            f"✅ [{account_id}] 投稿完了: {tweet_id}",
+            extra={"account": account_id},
+        )
+        metrics.inc("posts_total", account=account_id, result="success")
+    else:
+        logger.error(
+            f"❌ [{account_id}] 投稿失敗", extra={"account": account_id}
+        )
+        metrics.inc("posts_total", account=account_id, result="failure")
+    return post_result
+
+
+def defer_post(scheduler: PostScheduler, draft_pool: DraftPool | None,
+               account_id: str, result: dict, outcome: dict):
+    """延期された投稿を下書きプールに戻し、再試行時刻にスケジュールし直す"""
+    if outcome.get("attempt", 0) > MAX_POST_DEFERRALS:
+        logger.error(f"❌ [{account_id}] 投稿失敗（延期回数の上限）")
+        metrics.inc("posts_total", account=account_id, result="failure")
+        return
+    if draft_pool is not None:
+        draft_pool.push_front(account_id, result)
+    scheduler.requeue(
+        account_id,
+        datetime.fromtimestamp(outcome["retry_at"], timezone.utc)
+    )
+
+
+def resume_thread_jobs(scheduler: PostScheduler,
+                       thread_jobs: ThreadJobStore | None,
+                       account_ids=None):
+    """前回中断したスレッド投稿ジョブを再スケジュール（account_ids 指定時はその分のみ）"""
+    if thread_jobs is None:
+        return
+    for job in thread_jobs.pending():
+        if account_ids is not None and job["account"] not in account_ids:
+            continue
+        logger.info(
+            f"[{job['account']}] スレッド投稿を再開: "
+            f"{len(job['posted_ids'])}/{len(job['texts'])}件投稿済み"
+        )
+        scheduler.schedule_thread_step(job["job_id"], job["next_at"])
+
+
+def step_thread_job(scheduler: PostScheduler, thread_jobs: ThreadJobStore,
+                    publishers: dict, history: PostHistory, job_id: str,
+                    leases: LeaseManager = None):
+    """スレッド投稿ジョブを1ステップ進め、次のステップを予約"""
+    from src.thread_jobs import advance_thread_job
+
+    job = thread_jobs.get(job_id)
+    if job is None or not _owns(leases, job["account"]):
+        return
+    pub = publishers.get(job["account"])
+    if pub is None:
+        logger.warning(f"[{job['account']}] Publisherが無いためスレッドを保留")
+        return
+    next_at = advance_thread_job(job, pub, thread_jobs, history)
+    if next_at is not None:
+        scheduler.schedule_thread_step(job_id, next_at)
+
+
+def take_result(account_id: str, acc_config: dict,
+                generator: TweetGenerator,
+                draft_pool: DraftPool | None) -> dict | None:
+    """
+    事前生成済みの下書きがあれば取り出し、なければその場で生成
+
+    全モデルで生成に失敗したら下書きで代替し、それも無ければNone（この枠は見送り）。
+    """
+    from src.model_router import GenerationUnavailable
+    from src.pregenerator import stash_spares
+
+    if draft_pool is not None:
+        result = draft_pool.pop(account_id)
+        if result is not None:
+            logger.info(f"[{account_id}] 事前生成済みの下書きを使用")
+            return result
+    spares = []
+    try:
+        result = generator.generate(account_id, acc_config, spares=spares)
+    except GenerationUnavailable as e:
+        return fallback_draft(account_id, draft_pool, e)
+    stash_spares(draft_pool, account_id, acc_config, spares)
+    return result
+
+
+def fallback_draft(account_id: str, draft_pool: DraftPool | None,
+                   error: Exception) -> dict | None:
+    """生成失敗時の代替: 生成中に補充された下書き → 期限切れで破棄した下書きの順に探す"""
+    result = None
+    if draft_pool is not None:
+        result = draft_pool.pop(account_id) or draft_pool.pop_stale(account_id)
+    if result is None:
+        logger.error(
+            f"❌ [{account_id}] 生成に失敗したため投稿を見送り: {error}",
+            extra={"account": account_id},
+        )
+        metrics.inc("generation_fallbacks_total", account=account_id,
+                    outcome="skipped")
+        return None
+    logger.warning(
+        f"[{account_id}] 生成に失敗したため下書きで代替: {error}",
+        extra={"account": account_id},
+    )
+    metrics.inc("generation_fallbacks_total", account=account_id,
+                outcome="draft")
+    return result
+
+
+def _start_pregenerator(generator: TweetGenerator, draft_pool: DraftPool,
+                        scheduler: PostScheduler,
+                        config: dict) -> PreGenerator | None:
+    """事前生成が有効なアカウントがあればバックグラウンド生成を開始"""
+    from src.pregenerator import PreGenerator, pregeneration_settings
+
+    if draft_pool is None or not any(
+        pregeneration_settings(c) for c in config["accounts"].values()
+    ):
+        return None
+    pregenerator = PreGenerator(generator, draft_pool, scheduler, config)
+    pregenerator.start()
+    return pregenerator
+
+
 def run_once(config: dict, generator: TweetGenerator,
              publishers: dict, history: PostHistory,
-             dry_run: bool = False):
+             dry_run: bool = False, thread_jobs: ThreadJobStore = None):
     """全アカウントに対して1回ずつ投稿"""
+    from src.model_router import GenerationUnavailable
+
     for account_id, acc_config in config["accounts"].items():
         logger.info(f"--- [{account_id}] 投稿生成中 ---")
 
         # ツイート生成
-        result = generator.generate(account_id, acc_config)
+        try:
+            result = generator.generate(account_id, acc_config)
+        except GenerationUnavailable as e:
+            fallback_draft(account_id, None, e)
+            continue
         logger.info(f"生成: [{result['category']}] {result['text'][:60]}...")
 
-        if dry_run:
-            logger.info(f"[DRY RUN] スキップ: {result['text']}")
-            if result["is_thread"]:
-                for i, t in enumerate(result["thread_texts"]):
-                    logger.info(f"  スレッド {i+1}: {t}")
-            history.add(
-                account_id, result["text"],
-                "dry-run", result["category"]
-            )
+        publish_result(
+            account_id, result, publishers.get(account_id), history, dry_run,
+            thread_jobs=thread_jobs
+        )
+
+
+def _create_config_watcher() -> ConfigWatcher | None:
+    """設定ファイルの監視（CONFIG_POLL_SECONDS=0 で無効）"""
+    from src.config_watcher import ConfigWatcher, DEFAULT_POLL_SECONDS
+
+    interval = float(os.getenv("CONFIG_POLL_SECONDS", DEFAULT_POLL_SECONDS))
+    if interval <= 0:
+        return None
+    return ConfigWatcher(CONFIG_PATH, interval)
+
+
+def reload_config(config: dict, new_config: dict, generator: TweetGenerator,
+                  publishers: dict, history: PostHistory,
+                  scheduler: PostScheduler, draft_pool: DraftPool | None,
+                  dry_run: bool = False,
+                  owned: set[str] = None) -> dict[str, set[str]]:
+    """
+    変更された設定をアカウント単位で反映する
+
+    変更のあったアカウントだけ Publisher・固定プロンプト・当日のスケジュールを
+    作り直し、それ以外のアカウントの状態（スケジュール・下書き等）は維持する。
+    config・publishers はその場で更新する（事前生成スレッド等と共有しているため）。
+    ワーカーモードでは担当中（owned）のアカウントだけ作り直し、追加・削除された
+    アカウントの割り当てはリースの再配分に任せる。
+
+    Returns:
+        diff_accounts() の結果
+    """
+    from src.config_watcher import (
+        CHANGE_ADDED, CHANGE_CREDENTIALS, CHANGE_HISTORY, CHANGE_PROMPT,
+        CHANGE_REMOVED, CHANGE_SCHEDULE, diff_accounts,
+    )
+
+    changes = diff_accounts(config, new_config)
+    for account_id, kinds in sorted(changes.items()):
+        if owned is not None and account_id not in owned:
+            continue
+        logger.info(
+            f"🔄 [{account_id}] 設定変更を反映: {', '.join(sorted(kinds))}"
+        )
+        if CHANGE_REMOVED in kinds:
+            publishers.pop(account_id, None)
+            generator.invalidate_prefix(account_id)
+            scheduler.remove_account(account_id)
+            if draft_pool is not None:
+                draft_pool.discard(account_id)
             continue
 
-        # 投稿
-        pub = publishers[account_id]
-        if result["is_thread"] and result["thread_texts"]:
-            post_results = pub.post_thread(result["thread_texts"])
-            tweet_id = post_results[0]["id"] if post_results else None
-        else:
-            post_result = pub.post_tweet(result["text"])
-            tweet_id = post_result["id"] if post_result else None
-
-        # 履歴に追加
-        if tweet_id:
-            history.add(
-                account_id=account_id,
-                tweet_text=result["text"],
-                tweet_id=tweet_id,
-                category=result["category"],
+        acc_config = new_config["accounts"][account_id]
+        added = CHANGE_ADDED in kinds
+        if added or CHANGE_CREDENTIALS in kinds:
+            pub = create_publisher(account_id, acc_config, scheduler.quota)
+            if not dry_run and not pub.verify_credentials():
+                logger.error(f"❌ [{account_id}] 新しい認証情報で認証失敗")
+            publishers[account_id] = pub
+        if added or CHANGE_PROMPT in kinds:
+            # ペルソナ等が変わった下書きは使わない
+            generator.invalidate_prefix(account_id)
+            if draft_pool is not None and not added:
+                draft_pool.discard(account_id)
+        if added or CHANGE_HISTORY in kinds:
+            _configure_account_history(history, account_id, acc_config)
+        if added or CHANGE_SCHEDULE in kinds:
+            # 当日に消化した枠の分は作り直した予定から差し引く
+            scheduler.generate_daily_schedule(
+                account_id, acc_config["schedule"], keep_consumed=not added
             )
-            logger.info(f"✅ [{account_id}] 投稿完了: {tweet_id}")
-        else:
-            logger.error(f"❌ [{account_id}] 投稿失敗")
+
+    # 同じ dict を参照している事前生成スレッドにも反映される
+    config.clear()
+    config.update(new_config)
+    return changes
+
+
+def _poll_config(watcher: ConfigWatcher | None, config: dict,
+                 generator: TweetGenerator, publishers: dict,
+                 history: PostHistory, scheduler: PostScheduler,
+                 draft_pool: DraftPool | None, dry_run: bool,
+                 leases: LeaseManager = None):
+    """設定ファイルが更新されていれば差分を反映"""
+    if watcher is None:
+        return
+    new_config = watcher.poll()
+    if new_config is None:
+        return
+    logger.info("設定ファイルの更新を検知")
+    try:
+        reload_config(
+            config, new_config, generator, publishers, history, scheduler,
+            draft_pool, dry_run, leases.owned() if leases else None
+        )
+    except Exception as e:
+        logger.error(f"❌ 設定の反映に失敗: {e}")
+
+
+def _create_scheduler(leases: LeaseManager = None,
+                      clock: Clock = None,
+                      quota: QuotaManager = None) -> PostScheduler:
+    """
+    スケジュールを保存するスケジューラー
+
+    通常は logs/schedule_state.json、ワーカーモードでは担当が替わっても
+    引き継げるようリースDBに保存する。clock を指定するシミュレーションでは
+    実際のスケジュールに影響しないよう保存しない。
+    """
+    from src.schedule_store import JsonScheduleStore, SqliteScheduleStore
+    from src.scheduler import DEFAULT_REPLAY_INTERVAL_SECONDS, PostScheduler
+
+    if clock is not None:
+        return PostScheduler(clock=clock, quota=quota)
+    if leases is None:
+        store = JsonScheduleStore(SCHEDULE_STATE_PATH)
+    else:
+        store = SqliteScheduleStore(leases.path)
+    return PostScheduler(
+        state_store=store,
+        replay_interval_seconds=float(os.getenv(
+            "SCHEDULE_REPLAY_SECONDS", DEFAULT_REPLAY_INTERVAL_SECONDS
+        )),
+        owns=leases.holds if leases else None,
+        quota=quota,
+    )
+
+
+def _init_schedules(scheduler: PostScheduler, config: dict,
+                    account_ids=None):
+    """保存したスケジュールを復元し、復元できないアカウントは当日分を生成"""
+    accounts = config["accounts"]
+    if account_ids is not None:
+        accounts = {a: accounts[a] for a in account_ids if a in accounts}
+    restored = scheduler.restore_state(accounts)
+    for account_id, acc_config in accounts.items():
+        if account_id not in restored:
+            scheduler.generate_daily_schedule(
+                account_id, acc_config["schedule"]
+            )
+    scheduler.save_state()
+
+
+def _create_leases(worker_id: str) -> LeaseManager:
+    """ワーカーモードのリース（LEASE_DB は全ワーカーで同じファイルを指定する）"""
+    from src.leases import DEFAULT_LEASE_TTL_SECONDS, LeaseManager
+
+    return LeaseManager(
+        Path(os.getenv("LEASE_DB") or LEASE_DB_PATH), worker_id,
+        ttl_seconds=float(os.getenv(
+            "WORKER_LEASE_SECONDS", DEFAULT_LEASE_TTL_SECONDS
+        )),
+    )
+
+
+def _owns(leases: LeaseManager | None, account_id: str) -> bool:
+    """ワーカーモードではリースに余裕のある担当アカウントだけ投稿する"""
+    if leases is None or leases.holds(account_id):
+        return True
+    logger.warning(f"[{account_id}] 担当外のため投稿しません（リース切れ）")
+    return False
+
+
+def _sync_leases(leases: LeaseManager | None, scheduler: PostScheduler,
+                 config: dict, history: PostHistory,
+                 draft_pool: DraftPool | None,
+                 thread_jobs: ThreadJobStore | None):
+    """ワーカーモード: 担当アカウントを再配分し、スケジュールを引き継ぐ・手放す"""
+    if leases is None or not leases.rebalance_due():
+        return
+    # 解放するアカウントの変更を、リースを持っているうちに保存する
+    scheduler.save_state()
+    # スレッド投稿の途中のアカウントは終わるまで手放さない
+    keep = (
+        {job["account"] for job in thread_jobs.pending()}
+        if thread_jobs else set()
+    )
+    acquired, released = leases.rebalance(config["accounts"], keep)
+    for account_id in released:
+        scheduler.release_account(account_id)
+        if draft_pool is not None:
+            draft_pool.discard(account_id)
+    # 引き継いだアカウントは前の担当ワーカーの投稿を含めて履歴を読み直す
+    for account_id in acquired:
+        history.reload_account(account_id)
+    if acquired:
+        _init_schedules(scheduler, config, acquired)
+        resume_thread_jobs(scheduler, thread_jobs, acquired)
+
+
+def _handle_rollovers(scheduler: PostScheduler, config: dict):
+    """ローカル0時を迎えたアカウントのスケジュールを追加生成"""
+    for account_id in scheduler.pop_rollovers():
+        acc_config = config["accounts"].get(account_id)
+        if acc_config is None:
+            continue
+        logger.info(f"--- [{account_id}] 日次スケジュール生成 ---")
+        scheduler.extend_schedule(account_id, acc_config["schedule"])
+
+
+def _log_due(account_id: str, planned: datetime):
+    logger.info(
+        f"⏰ [{account_id}] 投稿時刻到達 "
+        f"({planned.strftime('%H:%M %Z')})",
+        extra={"account": account_id},
+    )
+
+
+def _start_schedules(scheduler: PostScheduler, config: dict,
+                     history: PostHistory, draft_pool: DraftPool | None,
+                     thread_jobs: ThreadJobStore | None,
+                     leases: LeaseManager | None):
+    """起動時のスケジュール復元・生成（ワーカーモードでは担当を取得してから）"""
+    if leases is None:
+        _init_schedules(scheduler, config)
+        resume_thread_jobs(scheduler, thread_jobs)
+        return
+    leases.start()
+    _sync_leases(leases, scheduler, config, history, draft_pool, thread_jobs)
+
+
+def _stop_schedules(scheduler: PostScheduler, leases: LeaseManager | None):
+    """停止時にスケジュールを保存し、リースを解放して他のワーカーに引き継ぐ"""
+    scheduler.save_state()
+    if leases is not None:
+        leases.stop()
+
+
+def _idle_seconds(scheduler: PostScheduler,
+                  watcher: ConfigWatcher = None,
+                  leases: LeaseManager = None) -> float:
+    """次のイベント（投稿枠 or ローカル0時 or 設定ファイルの確認 or 再配分）まで待機する秒数"""
+    # 時計のずれ・サスペンド復帰に備えて上限を設ける
+    limit = MAX_IDLE_SLEEP
+    if watcher is not None:
+        limit = min(limit, watcher.interval_seconds)
+    if leases is not None:
+        limit = min(limit, leases.heartbeat_seconds)
+    wait = scheduler.seconds_until_next_event()
+    if wait is None:
+        return limit
+    return min(wait, limit)
 
 
 def run_scheduler(config: dict, generator: TweetGenerator,
                   publishers: dict, history: PostHistory,
-                  dry_run: bool = False):
-    """スケジューラーモード（常駐）"""
-    scheduler = PostScheduler()
+                  dry_run: bool = False, draft_pool: DraftPool = None,
+                  thread_jobs: ThreadJobStore = None,
+                  leases: LeaseManager = None,
+                  clock: Clock = None,
+                  quota: QuotaManager = None) -> PostScheduler:
+    """
+    スケジューラーモード（常駐）
+
+    clock に仮想時刻を指定するとシミュレーションとして動かし、
+    終了時刻に達したら停止する（設定ファイルの監視とスケジュールの保存はしない）。
+    quota を指定すると月間予算に合わせて日次の投稿枠数を減らす。
+
+    Returns:
+        停止時のスケジューラー（シミュレーションの集計用）
+    """
+    scheduler = _create_scheduler(leases, clock, quota)
+    simulated = clock is not None
+    clock = scheduler.clock
 
     logger.info("=" * 50)
     logger.info("X Auto Poster スケジューラー起動")
     logger.info(f"ドライラン: {'ON' if dry_run else 'OFF'}")
     logger.info("=" * 50)
 
-    # 各アカウントのローカル日付を記録
-    last_schedule_dates: dict[str, object] = {}
-
-    # 初回スケジュール生成
-    for account_id, acc_config in config["accounts"].items():
-        tz = ZoneInfo(acc_config["schedule"]["timezone"])
-        scheduler.generate_daily_schedule(
-            account_id, acc_config["schedule"]
-        )
-        last_schedule_dates[account_id] = datetime.now(tz).date()
+    # 初回スケジュール生成（ワーカーモードでは担当アカウントの分のみ）
+    _start_schedules(
+        scheduler, config, history, draft_pool, thread_jobs, leases
+    )
+    pregenerator = _start_pregenerator(
+        generator, draft_pool, scheduler, config
+    )
+    watcher = None if simulated else _create_config_watcher()
 
     try:
         while True:
-            # 各アカウントのローカル日付が変わったらスケジュール再生成
-            for account_id, acc_config in config["accounts"].items():
-                tz = ZoneInfo(acc_config["schedule"]["timezone"])
-                local_date = datetime.now(tz).date()
-                if local_date != last_schedule_dates.get(account_id):
-                    logger.info(
-                        f"--- [{account_id}] 日次スケジュール再生成 ---"
+            # accounts.yaml の変更を反映
+            _poll_config(
+                watcher, config, generator, publishers, history, scheduler,
+                draft_pool, dry_run, leases
+            )
+            # ワーカーの増減に合わせて担当アカウントを再配分
+            _sync_leases(
+                leases, scheduler, config, history, draft_pool, thread_jobs
+            )
+
+            # ローカル日付が変わったアカウントのスケジュール再生成
+            _handle_rollovers(scheduler, config)
+            scheduler.save_state()
+
+            # 投稿時刻に達したアカウントを処理
+            for account_id, planned in scheduler.pop_due():
+                acc_config = config["accounts"].get(account_id)
+                if acc_config is None:
+                    continue
+                _log_due(account_id, planned)
+
+                # ツイート生成（事前生成済みなら取り出すだけ）・投稿
+                # 想定外のエラーはこの枠だけ見送る（非同期モードのタスクと同じ扱い）
+                try:
+                    result = take_result(
+                        account_id, acc_config, generator, draft_pool
+                    )
+                    if result is None or not _owns(leases, account_id):
+                        continue
+                    outcome = publish_result(
+                        account_id, result, publishers.get(account_id),
+                        history, dry_run, planned, defer=True,
+                        thread_jobs=thread_jobs, clock=clock
+                    )
+                    if outcome and outcome.get("deferred"):
+                        defer_post(
+                            scheduler, draft_pool, account_id, result,
+                            outcome
+                        )
+                    elif outcome and outcome.get("thread_job"):
+                        scheduler.schedule_thread_step(
+                            outcome["thread_job"], outcome["next_at"]
+                        )
+                except Exception as e:
+                    logger.error(
+                        f"❌ [{account_id}] 投稿処理に失敗したため見送り: {e}",
+                        exc_info=True, extra={"account": account_id},
+                    )
+                    metrics.inc("slots_skipped_total", account=account_id)
+
+            # スレッド投稿を1ツイートずつ進める（投稿間隔の待機はスケジューラーに任せる）
+            for job_id in scheduler.pop_due_thread_steps():
+                try:
+                    step_thread_job(
+                        scheduler, thread_jobs, publishers, history, job_id,
+                        leases
                     )
-                    scheduler.generate_daily_schedule(
-                        account_id, acc_config["schedule"]
+                except Exception as e:
+                    logger.error(
+                        f"❌ [thread-{job_id[:8]}] スレッド投稿の処理に失敗: {e}",
+                        exc_info=True,
                     )
-                    last_schedule_dates[account_id] = local_date
 
-            # 各アカウントの投稿チェック
-            for account_id, acc_config in config["accounts"].items():
-                tz = acc_config["schedule"]["timezone"]
+            # 次のイベントまでスリープ
+            clock.sleep(_idle_seconds(scheduler, watcher, leases))
 
-                if scheduler.should_post_now(account_id, tz):
-                    local_time = datetime.now(ZoneInfo(tz))
-                    logger.info(
-                        f"⏰ [{account_id}] 投稿時刻到達 "
-                        f"({local_time.strftime('%H:%M %Z')})"
+    except KeyboardInterrupt:
+        logger.info("スケジューラー停止（Ctrl+C）")
+    except ClockStopped:
+        logger.info("シミュレーション終了")
+    finally:
+        if pregenerator is not None:
+            pregenerator.stop()
+        _stop_schedules(scheduler, leases)
+    return scheduler
+
+
+async def _run_account_pipeline(account_id: str, acc_config: dict,
+                                generator: TweetGenerator, pub: Publisher,
+                                history: PostHistory, dry_run: bool,
+                                llm_sem: asyncio.Semaphore,
+                                x_sem: asyncio.Semaphore,
+                                account_lock: asyncio.Lock,
+                                draft_pool: DraftPool = None,
+                                planned: datetime = None,
+                                on_deferred=None,
+                                thread_jobs: ThreadJobStore = None,
+                                on_thread_job=None,
+                                leases: LeaseManager = None):
+    """1アカウント分の 生成→投稿 パイプライン（非同期タスク）"""
+    import asyncio
+
+    from src.model_router import GenerationUnavailable
+    from src.pregenerator import stash_spares
+
+    # 同一アカウントのパイプラインは直列に実行する
+    async with account_lock:
+        result = None
+        if draft_pool is not None:
+            result = await asyncio.to_thread(draft_pool.pop, account_id)
+        if result is not None:
+            logger.info(f"[{account_id}] 事前生成済みの下書きを使用")
+        else:
+            spares = []
+            try:
+                async with llm_sem:
+                    result = await asyncio.to_thread(
+                        generator.generate, account_id, acc_config,
+                        spares=spares
                     )
+            except GenerationUnavailable as e:
+                result = await asyncio.to_thread(
+                    fallback_draft, account_id, draft_pool, e
+                )
+                if result is None:
+                    return
+            await asyncio.to_thread(
+                stash_spares, draft_pool, account_id, acc_config, spares
+            )
+        # 生成中にリースを失っていれば投稿しない
+        if not _owns(leases, account_id):
+            return
+        if dry_run:
+            # X APIを呼ばないのでX側の同時実行枠は消費しない
+            await asyncio.to_thread(
+                publish_result, account_id, result, pub, history, dry_run,
+                planned
+            )
+            return
+        async with x_sem:
+            outcome = await asyncio.to_thread(
+                publish_result, account_id, result, pub, history, dry_run,
+                planned, True, thread_jobs
+            )
+        if outcome and outcome.get("deferred") and on_deferred:
+            on_deferred(account_id, result, outcome)
+        elif outcome and outcome.get("thread_job") and on_thread_job:
+            on_thread_job(outcome["thread_job"], outcome["next_at"])
 
-                    # ツイート生成
-                    result = generator.generate(account_id, acc_config)
 
-                    if dry_run:
-                        logger.info(
-                            f"[DRY RUN] [{account_id}] "
-                            f"[{result['category']}] {result['text']}"
-                        )
-                        if result["is_thread"]:
-                            for i, t in enumerate(result["thread_texts"]):
-                                logger.info(f"  スレッド {i+1}: {t}")
-                        history.add(
-                            account_id, result["text"],
-                            "dry-run", result["category"]
-                        )
-                        continue
+async def _run_thread_step(scheduler: PostScheduler,
+                           thread_jobs: ThreadJobStore, publishers: dict,
+                           history: PostHistory, job_id: str,
+                           x_sem: asyncio.Semaphore, wakeup: asyncio.Event,
+                           leases: LeaseManager = None):
+    """スレッド投稿ジョブを1ステップ進める（非同期タスク）"""
+    import asyncio
 
-                    # 投稿実行
-                    pub = publishers[account_id]
-                    if result["is_thread"] and result["thread_texts"]:
-                        post_results = pub.post_thread(result["thread_texts"])
-                        tweet_id = (
-                            post_results[0]["id"] if post_results else None
-                        )
-                    else:
-                        post_result = pub.post_tweet(result["text"])
-                        tweet_id = (
-                            post_result["id"] if post_result else None
-                        )
+    from src.thread_jobs import advance_thread_job
 
-                    if tweet_id:
-                        history.add(
-                            account_id, result["text"],
-                            tweet_id, result["category"]
-                        )
-                        logger.info(f"✅ [{account_id}] 投稿完了: {tweet_id}")
-                    else:
-                        logger.error(f"❌ [{account_id}] 投稿失敗")
+    job = thread_jobs.get(job_id)
+    if job is None or not _owns(leases, job["account"]):
+        return
+    pub = publishers.get(job["account"])
+    if pub is None:
+        logger.warning(f"[{job['account']}] Publisherが無いためスレッドを保留")
+        return
+    async with x_sem:
+        next_at = await asyncio.to_thread(
+            advance_thread_job, job, pub, thread_jobs, history
+        )
+    if next_at is not None:
+        scheduler.schedule_thread_step(job_id, next_at)
+        wakeup.set()
+
+
+async def _scheduler_loop_async(config: dict, generator: TweetGenerator,
+                                publishers: dict, history: PostHistory,
+                                dry_run: bool, llm_concurrency: int,
+                                x_concurrency: int,
+                                draft_pool: DraftPool = None,
+                                thread_jobs: ThreadJobStore = None,
+                                leases: LeaseManager = None,
+                                quota: QuotaManager = None):
+    """非同期スケジューラーのメインループ"""
+    import asyncio
+
+    scheduler = _create_scheduler(leases, quota=quota)
+    llm_sem = asyncio.Semaphore(llm_concurrency)
+    x_sem = asyncio.Semaphore(x_concurrency)
+    account_locks: dict[str, asyncio.Lock] = {}
+    tasks: set[asyncio.Task] = set()
+    # 延期された投稿の再投入でスリープを中断する
+    wakeup = asyncio.Event()
 
-            # 30秒ごとにチェック
-            time.sleep(30)
+    def _on_deferred(account_id: str, result: dict, outcome: dict):
+        defer_post(scheduler, draft_pool, account_id, result, outcome)
+        wakeup.set()
 
+    def _on_thread_job(job_id: str, next_at: float):
+        scheduler.schedule_thread_step(job_id, next_at)
+        wakeup.set()
+
+    def _spawn(coro, name: str):
+        task = asyncio.create_task(coro, name=name)
+        tasks.add(task)
+        task.add_done_callback(_on_done)
+
+    def _on_done(task: asyncio.Task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(
+                f"❌ [{task.get_name()}] パイプライン異常終了: "
+                f"{task.exception()}"
+            )
+            if task.get_name() in config["accounts"]:
+                metrics.inc("slots_skipped_total", account=task.get_name())
+
+    _start_schedules(
+        scheduler, config, history, draft_pool, thread_jobs, leases
+    )
+    pregenerator = _start_pregenerator(
+        generator, draft_pool, scheduler, config
+    )
+    watcher = _create_config_watcher()
+
+    try:
+        while True:
+            _poll_config(
+                watcher, config, generator, publishers, history, scheduler,
+                draft_pool, dry_run, leases
+            )
+            _sync_leases(
+                leases, scheduler, config, history, draft_pool, thread_jobs
+            )
+            _handle_rollovers(scheduler, config)
+            scheduler.save_state()
+
+            for account_id, planned in scheduler.pop_due():
+                acc_config = config["accounts"].get(account_id)
+                if acc_config is None:
+                    continue
+                _log_due(account_id, planned)
+                _spawn(
+                    _run_account_pipeline(
+                        account_id, acc_config, generator,
+                        publishers.get(account_id), history, dry_run,
+                        llm_sem, x_sem,
+                        account_locks.setdefault(account_id, asyncio.Lock()),
+                        draft_pool, planned, _on_deferred,
+                        thread_jobs, _on_thread_job, leases,
+                    ),
+                    account_id,
+                )
+
+            for job_id in scheduler.pop_due_thread_steps():
+                _spawn(
+                    _run_thread_step(
+                        scheduler, thread_jobs, publishers, history, job_id,
+                        x_sem, wakeup, leases,
+                    ),
+                    f"thread-{job_id[:8]}",
+                )
+
+            # 次のイベントまでスリープ（投稿処理はバックグラウンドで継続）
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    wakeup.wait(),
+                    timeout=_idle_seconds(scheduler, watcher, leases)
+                )
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if pregenerator is not None:
+            pregenerator.stop()
+        for task in tasks:
+            task.cancel()
+        _stop_schedules(scheduler, leases)
+
+
+def run_scheduler_async(config: dict, generator: TweetGenerator,
+                        publishers: dict, history: PostHistory,
+                        dry_run: bool = False, llm_concurrency: int = 4,
+                        x_concurrency: int = 4,
+                        draft_pool: DraftPool = None,
+                        thread_jobs: ThreadJobStore = None,
+                        leases: LeaseManager = None,
+                        quota: QuotaManager = None):
+    """非同期スケジューラーモード（アカウントごとに並行処理）"""
+    import asyncio
+
+    logger.info("=" * 50)
+    logger.info("X Auto Poster 非同期スケジューラー起動")
+    logger.info(f"ドライラン: {'ON' if dry_run else 'OFF'}")
+    logger.info(
+        f"同時実行数: Anthropic={llm_concurrency}, X={x_concurrency}"
+    )
+    logger.info("=" * 50)
+
+    try:
+        asyncio.run(_scheduler_loop_async(
+            config, generator, publishers, history, dry_run,
+            llm_concurrency, x_concurrency, draft_pool, thread_jobs, leases,
+            quota
+        ))
     except KeyboardInterrupt:
         logger.info("スケジューラー停止（Ctrl+C）")
 
 
+def run_simulation(config: dict, days: float):
+    """
+    仮想時刻で days 日分のスケジューラーを動かし、投稿計画を表示する
+
+    生成・投稿はスタブに置き換え、履歴はメモリ上だけに残しメトリクスも書き出さないため
+    実際の履歴・スケジュール・APIには影響しない。
+    """
+    from src.clock import VirtualClock
+    from src.quota import QuotaManager, QuotaStore
+    from src.simulation import (
+        SimulatedGenerator, SimulatedPublisher, build_report, print_report,
+    )
+
+    start = time.time()
+    end = start + days * 86400
+    clock = VirtualClock(start, end)
+    # 月間予算は実際の使用量を引き継がず、シミュレーション開始時点を0として数える
+    quota = QuotaManager(QuotaStore(":memory:"), config, clock)
+    generator = SimulatedGenerator(clock, quota=quota)
+    publishers = {
+        account_id: SimulatedPublisher(
+            account_id, clock, quota=quota,
+            api_key=acc_config.get("api_key", "")
+        )
+        for account_id, acc_config in config["accounts"].items()
+    }
+    history = PostHistory(backend="memory", clock=clock)
+    configure_history(history, config)
+    metrics.flush_enabled = False
+    try:
+        scheduler = run_scheduler(
+            config, generator, publishers, history, clock=clock, quota=quota
+        )
+    finally:
+        metrics.flush_enabled = True
+    print_report(
+        build_report(
+            config, scheduler, generator, publishers, start, end, quota
+        )
+    )
+
+
+def show_status(config: dict):
+    """直近の投稿履歴とメトリクスを表示"""
+    history = PostHistory()
+    configure_history(history, config)
+    for account_id in config["accounts"]:
+        posts = history.get_recent(account_id, 5)
+        print(f"\n--- {account_id} (直近5件) ---")
+        if not posts:
+            print("  (投稿履歴なし)")
+        for p in posts:
+            print(f"  [{p['timestamp'][:16]}] [{p.get('category', '')}]")
+            print(f"    {p['text'][:80]}...")
+
+    _show_quota(config)
+
+    summary = load_summary()
+    if summary:
+        print("\n--- メトリクス ---")
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    for worker_id, summary in load_worker_summaries().items():
+        print(f"\n--- メトリクス (ワーカー {worker_id}) ---")
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+def _show_quota(config: dict):
+    """当月の使用量と予算を表示（使用量DBが無ければ何もしない）"""
+    import sqlite3
+
+    from src.quota import QuotaManager, QuotaStore
+
+    path = Path(os.getenv("QUOTA_DB") or QUOTA_DB_PATH)
+    if not path.exists():
+        return
+    # 表示だけなので共有の使用量DBには書き込まない
+    store = QuotaStore(path, read_only=True)
+    try:
+        status = QuotaManager(store, config).status()
+    except sqlite3.Error as e:
+        print(f"\n⚠️ 月間クォータを読めません: {e}")
+        return
+    finally:
+        store.close()
+
+    def usage(used: int, limit: int | None) -> str:
+        return f"{used:,}" + (f" / {limit:,}" if limit is not None else "")
+
+    print(
+        f"\n--- 月間クォータ ({status['month']}、残り{status['days_left']}日) ---"
+    )
+    for app in status["apps"]:
+        print(
+            f"  アプリ ({', '.join(app['accounts'])}): "
+            f"{usage(app['tweets'], app['limit'])} ツイート"
+        )
+    for account_id, acc in status["accounts"].items():
+        line = f"  {account_id}: {usage(acc['tweets'], acc['limit'])} ツイート"
+        if acc["daily_tweets"] is not None:
+            line += f"（本日の上限 {acc['daily_tweets']}ツイート）"
+        print(line)
+    print(
+        f"  Claude: 入力 {usage(status['input_tokens'], status['input_limit'])}"
+        f"、出力 {usage(status['output_tokens'], status['output_limit'])}"
+        " トークン"
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description="X Auto Poster")
     parser.add_argument(
@@ -214,46 +1051,93 @@ def main():
         "--status", action="store_true",
         help="直近の投稿履歴を表示"
     )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="アカウントごとに並行処理する非同期スケジューラーで起動"
+    )
+    parser.add_argument(
+        "--worker", action="store_true",
+        help="複数プロセスでアカウントを分担するワーカーとして起動"
+    )
+    parser.add_argument(
+        "--simulate", type=float, metavar="DAYS",
+        help="APIを呼ばずに仮想時刻で DAYS 日分のスケジュールを実行し、"
+             "投稿計画と月間のAPI使用量を表示"
+    )
     args = parser.parse_args()
+    # 0以下を受け付けると --simulate を指定したのに実際のスケジューラーが起動する
+    if args.simulate is not None and not args.simulate > 0:
+        parser.error("--simulate には0より大きい日数を指定してください")
 
     # 環境変数チェック
     dry_run = args.dry_run or os.getenv("DRY_RUN", "false").lower() == "true"
 
     # 設定読み込み
     config = load_config()
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-    if not anthropic_key:
-        print("❌ ANTHROPIC_API_KEY が設定されていません (.env ファイルを確認)")
-        sys.exit(1)
 
-    # コンポーネント初期化
-    history = PostHistory()
-    generator = TweetGenerator(api_key=anthropic_key, history=history)
-    publishers = create_publishers(config)
+    # --status: 履歴表示（履歴とメトリクスを読むだけ）
+    if args.status:
+        show_status(config)
+        return
 
-    # --verify: 認証チェックのみ
+    # --verify: 認証チェックのみ（X APIクライアントだけを構築）
     if args.verify:
-        if verify_all_credentials(publishers):
+        if verify_all_credentials(create_publishers(config)):
             print("✅ 全アカウントの認証OK")
         else:
             print("❌ 認証エラーあり")
         return
 
-    # --status: 履歴表示
-    if args.status:
-        for account_id in config["accounts"]:
-            posts = history.get_recent(account_id, 5)
-            print(f"\n--- {account_id} (直近5件) ---")
-            if not posts:
-                print("  (投稿履歴なし)")
-            for p in posts:
-                print(f"  [{p['timestamp'][:16]}] [{p.get('category', '')}]")
-                print(f"    {p['text'][:80]}...")
+    # --simulate: 仮想時刻でのスケジュール検証（APIキー不要）
+    if args.simulate is not None:
+        # 投稿枠ごとのログは出さず、集計結果だけを表示する
+        logger.setLevel("WARNING")
+        run_simulation(config, args.simulate)
         return
 
+    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
+    if not anthropic_key:
+        print("❌ ANTHROPIC_API_KEY が設定されていません (.env ファイルを確認)")
+        sys.exit(1)
+
+    from src.draft_pool import DraftPool
+    from src.thread_jobs import ThreadJobStore
+    from src.tweet_generator import TweetGenerator
+
+    # ワーカーモード: 下書き・スレッドジョブはワーカーごと、履歴とスケジュールは共有
+    leases = None
+    worker_dir = None
+    if args.worker or os.getenv("WORKER_MODE", "false").lower() == "true":
+        from src.leases import default_worker_id
+
+        if os.getenv("HISTORY_BACKEND", "jsonl") != "sqlite":
+            print("❌ ワーカーモードには HISTORY_BACKEND=sqlite が必要です")
+            sys.exit(1)
+        worker_id = os.getenv("WORKER_ID") or default_worker_id()
+        worker_dir = WORKERS_DIR / worker_id
+        worker_dir.mkdir(parents=True, exist_ok=True)
+        leases = _create_leases(worker_id)
+        metrics.worker_id = worker_id
+
+    # コンポーネント初期化
+    history = PostHistory()
+    configure_history(history, config)
+    quota = _create_quota(config)
+    generator = TweetGenerator(
+        api_key=anthropic_key, history=history, quota=quota
+    )
+    generator.prepare(config)
+    publishers = create_publishers(config, quota)
+
+    thread_jobs = ThreadJobStore(
+        worker_dir / "thread_jobs.json" if worker_dir else None
+    )
+
     # --once: 1回投稿
     if args.once:
-        run_once(config, generator, publishers, history, dry_run)
+        run_once(
+            config, generator, publishers, history, dry_run, thread_jobs
+        )
         return
 
     # デフォルト: スケジューラー起動
@@ -262,7 +1146,29 @@ def main():
             print("❌ 認証エラー。config/accounts.yaml を確認してください")
             sys.exit(1)
 
-    run_scheduler(config, generator, publishers, history, dry_run)
+    draft_pool = DraftPool(worker_dir / "drafts.json" if worker_dir else None)
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        metrics.start_http_server(int(metrics_port))
+    use_async = (
+        args.use_async
+        or os.getenv("ASYNC_SCHEDULER", "false").lower() == "true"
+    )
+    if use_async:
+        run_scheduler_async(
+            config, generator, publishers, history, dry_run,
+            llm_concurrency=int(os.getenv("ANTHROPIC_CONCURRENCY", "4")),
+            x_concurrency=int(os.getenv("X_CONCURRENCY", "4")),
+            draft_pool=draft_pool,
+            thread_jobs=thread_jobs,
+            leases=leases,
+            quota=quota,
+        )
+    else:
+        run_scheduler(
+            config, generator, publishers, history, dry_run, draft_pool,
+            thread_jobs, leases, quota=quota
+        )
 
 
 if __name__ == "__main__":
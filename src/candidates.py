@@ -0,0 +1,101 @@
+"""候補スコアリングモジュール - 1回の生成で得た複数候補をローカルで採点"""
+
+import re
+import unicodedata
+
+from src.text_weight import extract_emojis, extract_urls, weighted_length
+
+# スコアの内訳ごとの重み（合計1.0）
+LENGTH_WEIGHT = 0.35
+NOVELTY_WEIGHT = 0.35
+RULES_WEIGHT = 0.2
+CATEGORY_WEIGHT = 0.1
+
+# 上限に対してこの割合以上の長さがあれば長さは満点
+MIN_FILL_RATIO = 0.5
+# カテゴリのキーワードがこの数だけ含まれていればカテゴリ一致は満点
+CATEGORY_KEYWORD_TARGET = 3
+# 採用しなかった候補を下書きとして残す最低スコア
+MIN_SPARE_SCORE = 0.6
+
+_HASHTAG_RE = re.compile(r"(?:^|(?<=\s))[#＃][^\s#＃]+")
+_WORD_RE = re.compile(r"[a-z][a-z0-9'-]{3,}")
+# 漢字・カタカナの連続（ひらがなは助詞が多くキーワードにならない）
+_CJK_RUN_RE = re.compile(r"[\u30A0-\u30FF\u3400-\u4DBF\u4E00-\u9FFF]{2,}")
+
+
+def count_hashtags(text: str) -> int:
+    return len(_HASHTAG_RE.findall(text))
+
+
+def keywords(text: str) -> set[str]:
+    """英語は4文字以上の単語、日本語は漢字・カタカナの2-gram"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    for url in extract_urls(text):
+        text = text.replace(url, " ")
+    words = set(_WORD_RE.findall(text))
+    for run in _CJK_RUN_RE.findall(text):
+        words.update(run[i:i + 2] for i in range(len(run) - 1))
+    return words
+
+
+def length_fit(text: str, max_chars: int) -> float:
+    """上限内で十分な長さがあるほど高い（上限超過は0）"""
+    weight = weighted_length(text)
+    if weight > max_chars:
+        return 0.0
+    return min(1.0, weight / (max_chars * MIN_FILL_RATIO))
+
+
+def rule_compliance(text: str, style: dict) -> float:
+    """ハッシュタグ・絵文字のルールを守っているか（違反1件ごとに減点）"""
+    violations = 0
+    hashtags = count_hashtags(text)
+    if not style.get("use_hashtags") and hashtags:
+        violations += 1
+    elif hashtags > style.get("max_hashtags", 2):
+        violations += 1
+    if not style.get("use_emojis", False) and extract_emojis(text):
+        violations += 1
+    return 1.0 - violations / 2
+
+
+def category_match(text: str, category: dict) -> float:
+    """カテゴリ名・説明のキーワードをどれだけ含むか"""
+    expected = keywords(
+        f"{category['topic']} {category.get('description', '')}"
+    )
+    if not expected:
+        return 1.0
+    hits = len(expected & keywords(text))
+    return min(1.0, hits / min(len(expected), CATEGORY_KEYWORD_TARGET))
+
+
+def score_candidate(text: str, style: dict, category: dict,
+                    similarity: float) -> dict:
+    """
+    候補を採点する
+
+    Args:
+        text: 候補の本文
+        style: アカウントのstyle設定
+        category: 生成時に指定したカテゴリ
+        similarity: 履歴・下書き・他の候補との最大類似度
+
+    Returns:
+        {"score": float, "length": float, "novelty": float,
+         "rules": float, "category": float, "similarity": float}
+    """
+    parts = {
+        "length": length_fit(text, style["max_characters"]),
+        "novelty": 1.0 - similarity,
+        "rules": rule_compliance(text, style),
+        "category": category_match(text, category),
+    }
+    score = (
+        LENGTH_WEIGHT * parts["length"]
+        + NOVELTY_WEIGHT * parts["novelty"]
+        + RULES_WEIGHT * parts["rules"]
+        + CATEGORY_WEIGHT * parts["category"]
+    )
+    return {"score": round(score, 4), **parts, "similarity": similarity}
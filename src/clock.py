@@ -0,0 +1,51 @@
+"""時計 - 現在時刻と待機を差し替え可能にする（シミュレーションでは仮想時刻）"""
+
+import time
+from datetime import datetime, timezone, tzinfo
+
+
+class ClockStopped(Exception):
+    """仮想時刻が終了時刻に達した（シミュレーションの終了）"""
+
+
+class Clock:
+    """実時間の時計"""
+
+    def time(self) -> float:
+        """現在のUNIX時刻"""
+        return time.time()
+
+    def now(self, tz: tzinfo = timezone.utc) -> datetime:
+        """現在時刻（タイムゾーン付き）"""
+        return datetime.fromtimestamp(self.time(), tz)
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    仮想時刻の時計: sleep() は待たずに時刻を進める
+
+    end を指定すると、時刻が end に達した sleep() で ClockStopped を送出する。
+    """
+
+    def __init__(self, start: float, end: float = None):
+        self._now = start
+        self.end = end
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        """処理にかかる時間の分だけ時刻を進める（待機ではないので end で止めない）"""
+        self._now += max(0.0, seconds)
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+        if self.end is not None and self._now >= self.end:
+            self._now = self.end
+            raise ClockStopped()
+
+
+SYSTEM_CLOCK = Clock()
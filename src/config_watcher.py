@@ -0,0 +1,93 @@
+"""設定ファイル監視モジュール - accounts.yaml の変更を検知してアカウント単位の差分を求める"""
+
+import logging
+from pathlib import Path
+
+import yaml
+
+logger = logging.getLogger("x-auto-poster")
+
+DEFAULT_POLL_SECONDS = 10
+
+# 変更の種類と、それに対応するアカウント設定のキー
+CHANGE_CREDENTIALS = "credentials"  # Publisher を作り直す
+CHANGE_PROMPT = "prompt"            # 固定プロンプトを作り直す
+CHANGE_SCHEDULE = "schedule"        # 当日のスケジュールを作り直す
+CHANGE_HISTORY = "history"          # 履歴の保持件数を反映する
+CHANGE_ADDED = "added"
+CHANGE_REMOVED = "removed"
+
+_CHANGE_KEYS = {
+    CHANGE_CREDENTIALS: (
+        "api_key", "api_secret", "access_token", "access_token_secret"
+    ),
+    CHANGE_PROMPT: ("content", "language"),
+    CHANGE_SCHEDULE: ("schedule",),
+    CHANGE_HISTORY: ("history",),
+}
+
+
+def diff_accounts(old: dict, new: dict) -> dict[str, set[str]]:
+    """
+    新旧の設定をアカウント単位で比較する
+
+    Returns:
+        {account_id: 変更の種類の集合}（変更のないアカウントは含まない）
+    """
+    old_accounts = old.get("accounts") or {}
+    new_accounts = new.get("accounts") or {}
+    changes = {}
+    for account_id in old_accounts.keys() - new_accounts.keys():
+        changes[account_id] = {CHANGE_REMOVED}
+    for account_id, acc_config in new_accounts.items():
+        previous = old_accounts.get(account_id)
+        if previous is None:
+            changes[account_id] = {CHANGE_ADDED}
+            continue
+        kinds = {
+            kind for kind, keys in _CHANGE_KEYS.items()
+            if any(previous.get(k) != acc_config.get(k) for k in keys)
+        }
+        if kinds:
+            changes[account_id] = kinds
+    return changes
+
+
+class ConfigWatcher:
+    """設定ファイルの更新時刻・サイズを監視し、変更があれば読み込み直す"""
+
+    def __init__(self, path: Path,
+                 interval_seconds: float = DEFAULT_POLL_SECONDS):
+        self.path = Path(path)
+        self.interval_seconds = interval_seconds
+        self._stamp = self._stat()
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def poll(self) -> dict | None:
+        """
+        前回から変更されていれば新しい設定を返す
+
+        書きかけ・構文エラーの設定は読み捨て、実行中の設定を使い続ける。
+        """
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as e:
+            logger.error(f"設定ファイルを読み込めません（変更を無視）: {e}")
+            return None
+        if not isinstance(config, dict) or not isinstance(
+            config.get("accounts"), dict
+        ):
+            logger.error("設定ファイルに accounts がありません（変更を無視）")
+            return None
+        return config
@@ -0,0 +1,137 @@
+"""重複検知モジュール - MinHash + LSH による類似投稿の検出"""
+
+import random
+import re
+import threading
+import unicodedata
+import zlib
+
+from src.logger import PostHistory
+
+# シグネチャ長 = バンド数 × 1バンドの行数
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 3
+DEFAULT_SIMILARITY_THRESHOLD = 0.6
+
+_MASK = (1 << 32) - 1
+_URL_RE = re.compile(r"https?://\S+")
+_STRIP_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+# 再現性のため固定シードでハッシュ係数を生成
+_rng = random.Random(0x5EED)
+_PERMS = [
+    (_rng.getrandbits(32) | 1, _rng.getrandbits(32)) for _ in range(NUM_PERM)
+]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """
+    正規化した本文の文字n-gramをハッシュ化して返す
+
+    日本語のように単語区切りのない言語でも使えるよう文字単位にする。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _STRIP_RE.sub("", _URL_RE.sub("", text))
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))} if text else set()
+    return {
+        zlib.crc32(text[i:i + size].encode("utf-8"))
+        for i in range(len(text) - size + 1)
+    }
+
+
+def signature(text: str) -> tuple[int, ...]:
+    """MinHashシグネチャを計算"""
+    hashes = shingles(text)
+    if not hashes:
+        return (_MASK,) * NUM_PERM
+    return tuple(
+        min([(a * h + b) & _MASK for h in hashes]) for a, b in _PERMS
+    )
+
+
+def estimate_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """2つのシグネチャから Jaccard 類似度を推定"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _bands(sig: tuple) -> list[tuple]:
+    return [
+        (i, sig[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND])
+        for i in range(NUM_BANDS)
+    ]
+
+
+class DuplicateIndex:
+    """アカウントごとの投稿履歴に対する近似重複インデックス"""
+
+    def __init__(self, history: PostHistory,
+                 threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        self.history = history
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # account_id -> シグネチャのリスト / LSHバケット
+        self._signatures: dict[str, list[tuple]] = {}
+        self._buckets: dict[str, dict[tuple, list[int]]] = {}
+        history.subscribe(self._on_post)
+        history.subscribe_reload(self._forget)
+
+    def _ensure_account(self, account_id: str):
+        """初回参照時に履歴全体からインデックスを構築"""
+        if account_id in self._signatures:
+            return
+        self._signatures[account_id] = []
+        self._buckets[account_id] = {}
+        for post in self.history.get_recent(account_id, 10 ** 9):
+            self._add(account_id, post["text"])
+
+    def _add(self, account_id: str, text: str):
+        sig = signature(text)
+        sigs = self._signatures[account_id]
+        sigs.append(sig)
+        buckets = self._buckets[account_id]
+        for band in _bands(sig):
+            buckets.setdefault(band, []).append(len(sigs) - 1)
+
+    def _forget(self, account_id: str):
+        """次回参照時に履歴から作り直す"""
+        with self._lock:
+            self._signatures.pop(account_id, None)
+            self._buckets.pop(account_id, None)
+
+    def _on_post(self, entry: dict):
+        with self._lock:
+            if entry["account"] in self._signatures:
+                self._add(entry["account"], entry["text"])
+
+    def max_similarity(self, account_id: str, text: str,
+                       extra_texts: list[str] = None) -> float:
+        """
+        履歴（と extra_texts）の中で最も似ている投稿との類似度
+
+        LSHバケットで候補を絞ってからシグネチャを比較する。
+        """
+        sig = signature(text)
+        best = 0.0
+        with self._lock:
+            self._ensure_account(account_id)
+            sigs = self._signatures[account_id]
+            buckets = self._buckets[account_id]
+            candidates = set()
+            for band in _bands(sig):
+                candidates.update(buckets.get(band, ()))
+            for i in candidates:
+                best = max(best, estimate_similarity(sig, sigs[i]))
+        for extra in extra_texts or ():
+            best = max(best, estimate_similarity(sig, signature(extra)))
+        return best
+
+    def is_duplicate(self, account_id: str, text: str,
+                     extra_texts: list[str] = None,
+                     threshold: float = None) -> bool:
+        """類似度がしきい値以上なら重複とみなす"""
+        if threshold is None:
+            threshold = self.threshold
+        return self.max_similarity(account_id, text, extra_texts) >= threshold
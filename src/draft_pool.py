@@ -0,0 +1,170 @@
+"""下書きプール - 事前生成した投稿待ちツイートをアカウントごとに保持"""
+
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from src.clock import SYSTEM_CLOCK, Clock
+from src.history_store import atomic_write_text
+
+logger = logging.getLogger("x-auto-poster")
+
+DEFAULT_DRAFT_TTL_HOURS = 12
+# 生成に失敗したときの代替としてメモリに残す期限切れ下書きの件数（アカウントごと）
+STALE_DRAFT_LIMIT = 5
+
+
+class DraftPool:
+    """アカウントごとの投稿待ち下書きキュー（logs/drafts.json に永続化）"""
+
+    def __init__(self, path: str = None, clock: Clock = None):
+        if path is None:
+            path = Path(__file__).parent.parent / "logs" / "drafts.json"
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True)
+        # 作成・期限の判定に使う時刻の取得元（シミュレーションでは仮想時刻）
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.RLock()
+        self._queues: dict[str, deque] = {}
+        # 期限切れで破棄した下書き（永続化しない）
+        self._stale: dict[str, deque] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            logger.warning(f"下書きファイルを読み込めません: {e}")
+            return
+        for account_id, drafts in data.get("drafts", {}).items():
+            self._queues[account_id] = deque(drafts)
+        self.purge_expired()
+
+    def _save(self):
+        data = {
+            "drafts": {
+                account_id: list(queue)
+                for account_id, queue in self._queues.items() if queue
+            }
+        }
+        atomic_write_text(
+            self.path, json.dumps(data, ensure_ascii=False, indent=2)
+        )
+
+    @staticmethod
+    def _is_expired(draft: dict, now: datetime) -> bool:
+        return datetime.fromisoformat(draft["expires_at"]) <= now
+
+    def _keep_stale(self, account_id: str, draft: dict):
+        self._stale.setdefault(
+            account_id, deque(maxlen=STALE_DRAFT_LIMIT)
+        ).append(draft)
+
+    def _now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock.time())
+
+    def _make_draft(self, result: dict, ttl_hours: float) -> dict:
+        now = self._now()
+        return {
+            "result": result,
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(hours=ttl_hours)).isoformat(),
+        }
+
+    def push(self, account_id: str, result: dict,
+             ttl_hours: float = DEFAULT_DRAFT_TTL_HOURS):
+        """
+        下書きを末尾に追加
+
+        Args:
+            account_id: アカウント識別子
+            result: TweetGenerator.generate() の戻り値
+            ttl_hours: 下書きの有効期限（時間）
+        """
+        draft = self._make_draft(result, ttl_hours)
+        with self._lock:
+            self._queues.setdefault(account_id, deque()).append(draft)
+            self._save()
+
+    def push_front(self, account_id: str, result: dict,
+                   ttl_hours: float = DEFAULT_DRAFT_TTL_HOURS):
+        """延期された投稿を次に取り出されるよう先頭に戻す"""
+        draft = self._make_draft(result, ttl_hours)
+        with self._lock:
+            self._queues.setdefault(account_id, deque()).appendleft(draft)
+            self._save()
+
+    def pop(self, account_id: str) -> dict | None:
+        """有効期限内の最も古い下書きを取り出す（なければNone）"""
+        now = self._now()
+        with self._lock:
+            queue = self._queues.get(account_id)
+            result = None
+            while queue:
+                draft = queue.popleft()
+                if not self._is_expired(draft, now):
+                    result = draft["result"]
+                    break
+                logger.info(f"[{account_id}] 期限切れの下書きを破棄")
+                self._keep_stale(account_id, draft)
+            self._save()
+            return result
+
+    def pop_stale(self, account_id: str) -> dict | None:
+        """
+        期限切れで破棄した下書きのうち最も新しいものを取り出す（なければNone）
+
+        全モデルで生成に失敗したときの最後の代替。再起動すると失われる。
+        """
+        with self._lock:
+            stale = self._stale.get(account_id)
+            return stale.pop()["result"] if stale else None
+
+    def count(self, account_id: str) -> int:
+        """有効期限内の下書き数"""
+        now = self._now()
+        with self._lock:
+            return sum(
+                1 for d in self._queues.get(account_id, ())
+                if not self._is_expired(d, now)
+            )
+
+    def texts(self, account_id: str) -> list[str]:
+        """下書き本文の一覧（事前生成時の重複防止用）"""
+        with self._lock:
+            return [
+                d["result"]["text"] for d in self._queues.get(account_id, ())
+            ]
+
+    def discard(self, account_id: str) -> int:
+        """アカウントの下書きをすべて破棄し、破棄件数を返す（設定変更時）"""
+        with self._lock:
+            self._stale.pop(account_id, None)
+            queue = self._queues.pop(account_id, None)
+            if queue:
+                self._save()
+            return len(queue) if queue else 0
+
+    def purge_expired(self) -> int:
+        """期限切れの下書きを削除し、削除件数を返す"""
+        now = self._now()
+        removed = 0
+        with self._lock:
+            for account_id, queue in self._queues.items():
+                alive = deque()
+                for draft in queue:
+                    if self._is_expired(draft, now):
+                        self._keep_stale(account_id, draft)
+                    else:
+                        alive.append(draft)
+                removed += len(queue) - len(alive)
+                self._queues[account_id] = alive
+            if removed:
+                self._save()
+        return removed
@@ -0,0 +1,342 @@
+"""投稿履歴の永続化バックエンド - JSON / 追記型JSONL / SQLite"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger("x-auto-poster")
+
+LEGACY_HISTORY_FILE = "post_history.json"
+
+
+def atomic_write_text(path: Path, text: str):
+    """一時ファイルに書いてから置き換える（書き込み途中のクラッシュで壊れない）"""
+    path = Path(path)
+    # 同じファイルへ同時に書き込んでも一時ファイルを取り合わないよう名前を一意にする
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, prefix=path.name + ".",
+        suffix=".tmp", delete=False
+    ) as f:
+        tmp_path = f.name
+        try:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+class HistoryStore:
+    """履歴バックエンドの共通インターフェース"""
+
+    # 保存件数がこの値を超えたら compact() で詰め直す
+    compact_threshold = 1000
+
+    # 複数プロセスで共有するストアは自分の保持分で詰め直さず trim() で削る
+    shared = False
+
+    def load(self) -> list[dict]:
+        """保存済みの全エントリを古い順に返す"""
+        raise NotImplementedError
+
+    def load_account(self, account_id: str, limit: int) -> list[dict]:
+        """アカウントの直近 limit 件を古い順に返す"""
+        entries = [e for e in self.load() if e["account"] == account_id]
+        return entries[-limit:] if limit > 0 else []
+
+    def append(self, entry: dict):
+        """エントリを1件追記する"""
+        raise NotImplementedError
+
+    def needs_compaction(self) -> bool:
+        """compact() を呼ぶべきか"""
+        return False
+
+    def compact(self, entries: list[dict]):
+        """保存内容を entries（保持対象）だけに詰め直す"""
+
+    def trim(self, retention: dict[str, int], default_retention: int):
+        """アカウントごとに直近の保持件数だけを残す（shared のストア用）"""
+
+    def close(self):
+        pass
+
+
+class MemoryHistoryStore(HistoryStore):
+    """保存しない（シミュレーション用、履歴はプロセス内のリングバッファのみ）"""
+
+    def load(self) -> list[dict]:
+        return []
+
+    def append(self, entry: dict):
+        pass
+
+
+class JsonHistoryStore(HistoryStore):
+    """従来形式: post_history.json を毎回全体書き換え"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: list[dict] = []
+
+    def load(self) -> list[dict]:
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("posts", [])
+        return list(self._entries)
+
+    def append(self, entry: dict):
+        self._entries.append(entry)
+        self._write()
+
+    def needs_compaction(self) -> bool:
+        return len(self._entries) > self.compact_threshold
+
+    def compact(self, entries: list[dict]):
+        self._entries = list(entries)
+        self._write()
+
+    def _write(self):
+        atomic_write_text(
+            self.path,
+            json.dumps({"posts": self._entries}, ensure_ascii=False, indent=2)
+        )
+
+
+class JsonlHistoryStore(HistoryStore):
+    """追記型JSONLログ（1行1エントリ、定期的にコンパクション）"""
+
+    def __init__(self, path: Path, compact_threshold: int = 1000):
+        self.path = Path(path)
+        self.compact_threshold = compact_threshold
+        self._lines = 0
+        self._file = None
+
+    def load(self) -> list[dict]:
+        entries = []
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # 追記途中でクラッシュした最終行などは読み飛ばす
+                        logger.warning(
+                            f"履歴の破損行をスキップ: {self.path.name}:{line_no}"
+                        )
+        self._lines = len(entries)
+        return entries
+
+    def append(self, entry: dict):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._lines += 1
+
+    def needs_compaction(self) -> bool:
+        return self._lines > self.compact_threshold
+
+    def compact(self, entries: list[dict]):
+        self.close()
+        atomic_write_text(
+            self.path,
+            "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        )
+        self._lines = len(entries)
+        logger.debug(f"履歴をコンパクション: {self._lines}件")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SqliteHistoryStore(HistoryStore):
+    """SQLite（WALモード）による履歴保存（ワーカーモードでは全ワーカーで共有）"""
+
+    shared = True
+
+    def __init__(self, path: Path, compact_threshold: int = 1000):
+        self.path = Path(path)
+        self.compact_threshold = compact_threshold
+        self._rows = 0
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " account TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " tweet_id TEXT,"
+            " category TEXT,"
+            " timestamp TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_posts_account"
+            " ON posts (account, id)"
+        )
+
+    def load(self) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT account, text, tweet_id, category, timestamp"
+            " FROM posts ORDER BY id"
+        ).fetchall()
+        self._rows = len(rows)
+        return [self._entry(r) for r in rows]
+
+    def load_account(self, account_id: str, limit: int) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT account, text, tweet_id, category, timestamp"
+            " FROM posts WHERE account = ? ORDER BY id DESC LIMIT ?",
+            (account_id, max(0, limit))
+        ).fetchall()
+        return [self._entry(r) for r in reversed(rows)]
+
+    @staticmethod
+    def _entry(row) -> dict:
+        return {
+            "account": row[0], "text": row[1], "tweet_id": row[2],
+            "category": row[3], "timestamp": row[4],
+        }
+
+    def append(self, entry: dict):
+        self._conn.execute(
+            "INSERT INTO posts (account, text, tweet_id, category, timestamp)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                entry["account"], entry["text"], entry.get("tweet_id"),
+                entry.get("category"), entry["timestamp"],
+            )
+        )
+        self._rows += 1
+
+    def needs_compaction(self) -> bool:
+        return self._rows > self.compact_threshold
+
+    def compact(self, entries: list[dict]):
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM posts")
+            self._conn.executemany(
+                "INSERT INTO posts (account, text, tweet_id, category,"
+                " timestamp) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        e["account"], e["text"], e.get("tweet_id"),
+                        e.get("category"), e["timestamp"],
+                    )
+                    for e in entries
+                ]
+            )
+        self._rows = len(entries)
+        logger.debug(f"履歴をコンパクション: {self._rows}件")
+
+    def trim(self, retention: dict[str, int], default_retention: int):
+        """
+        アカウントごとに新しい順で保持件数を超えた行を削除する
+
+        他のワーカーが追記した行もテーブル上の順位で判断するため、
+        このプロセスが読み込んでいない履歴を消すことはない。
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            accounts = [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT account FROM posts"
+            )]
+            for account_id in accounts:
+                keep = retention.get(account_id, default_retention)
+                if keep <= 0:
+                    self._conn.execute(
+                        "DELETE FROM posts WHERE account = ?", (account_id,)
+                    )
+                    continue
+                # 保持する最古の行より古い行を削除（(account, id) の索引を使う）
+                self._conn.execute(
+                    "DELETE FROM posts WHERE account = ? AND id < ("
+                    " SELECT id FROM posts WHERE account = ?"
+                    " ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (account_id, account_id, keep - 1)
+                )
+            self._rows = self._conn.execute(
+                "SELECT COUNT(*) FROM posts"
+            ).fetchone()[0]
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.debug(f"履歴をコンパクション: {self._rows}件")
+
+    def close(self):
+        self._conn.close()
+
+
+def migrate_legacy_json(history_dir: Path, store: HistoryStore) -> int:
+    """
+    従来の post_history.json を新バックエンドへ一度だけ移行する
+
+    移行後の元ファイルは post_history.json.migrated にリネームする。
+
+    Returns:
+        移行した件数（移行不要なら0）
+    """
+    legacy = Path(history_dir) / LEGACY_HISTORY_FILE
+    if not legacy.exists():
+        return 0
+    if store.load():
+        logger.warning(
+            f"{LEGACY_HISTORY_FILE} が残っていますが、移行先に履歴があるため移行しません"
+        )
+        return 0
+
+    with open(legacy, "r", encoding="utf-8") as f:
+        posts = json.load(f).get("posts", [])
+    store.compact(posts)
+    os.replace(legacy, legacy.with_name(legacy.name + ".migrated"))
+    logger.info(f"投稿履歴を移行しました: {len(posts)}件")
+    return len(posts)
+
+
+def create_history_store(backend: str, history_dir: Path,
+                         compact_threshold: int = 1000) -> HistoryStore:
+    """
+    バックエンド名から履歴ストアを生成
+
+    Args:
+        backend: "json" / "jsonl" / "sqlite" / "memory"
+        history_dir: 保存先ディレクトリ
+        compact_threshold: コンパクションを行う保存件数
+    """
+    history_dir = Path(history_dir)
+    if backend == "memory":
+        return MemoryHistoryStore()
+    if backend == "json":
+        return JsonHistoryStore(history_dir / LEGACY_HISTORY_FILE)
+
+    if backend == "jsonl":
+        store = JsonlHistoryStore(
+            history_dir / "post_history.jsonl", compact_threshold
+        )
+    elif backend == "sqlite":
+        store = SqliteHistoryStore(
+            history_dir / "post_history.sqlite3", compact_threshold
+        )
+    else:
+        raise ValueError(f"未対応の履歴バックエンド: {backend}")
+
+    migrate_legacy_json(history_dir, store)
+    return store
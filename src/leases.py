@@ -0,0 +1,246 @@
+"""アカウントのリース - 複数ワーカー（プロセス・ホスト）でアカウントを分担する
+
+SQLiteのリーステーブルで「どのワーカーがどのアカウントを担当しているか」を管理する。
+
+- 各ワーカーは heartbeat_seconds ごとに生存を記録し、担当中のリースを延長する
+- 担当の割り当てはランデブーハッシュ（アカウントごとに各ワーカーとのハッシュ値が
+  最大のワーカーが担当）で決めるため、ワーカーの増減で移動するアカウントは一部だけ
+- リースは期限切れになるまで他のワーカーに取得されない。停止したワーカーの
+  アカウントは期限切れ後に残りのワーカーが引き継ぐ
+- 投稿の直前に holds() で期限に余裕があることを確認するため、同じアカウントを
+  2つのワーカーが同時に投稿することはない
+"""
+
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from src.metrics import metrics
+
+logger = logging.getLogger("x-auto-poster")
+
+DEFAULT_LEASE_TTL_SECONDS = 90
+
+
+def default_worker_id() -> str:
+    """WORKER_ID が無い場合のワーカーID（ホスト名-PID）"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _rank(worker_id: str, account_id: str) -> bytes:
+    return hashlib.sha1(f"{worker_id}\0{account_id}".encode()).digest()
+
+
+def assign_owner(account_id: str, workers) -> str | None:
+    """ランデブーハッシュでアカウントの担当ワーカーを決める"""
+    return max(workers, key=lambda w: _rank(w, account_id), default=None)
+
+
+class LeaseManager:
+    """SQLiteのリーステーブルによるアカウント担当の取得・延長・解放"""
+
+    def __init__(self, path: Path, worker_id: str,
+                 ttl_seconds: float = DEFAULT_LEASE_TTL_SECONDS):
+        """
+        Args:
+            path: リースDB（全ワーカーから同じファイルを参照する）
+            worker_id: このワーカーのID（再起動しても同じ値を推奨）
+            ttl_seconds: リースの有効期間。停止したワーカーのアカウントは
+                最大でこの時間だけ投稿されない
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True)
+        self.worker_id = worker_id
+        self.ttl_seconds = ttl_seconds
+        # 延長の間隔と、投稿に必要なリースの残り時間
+        self.heartbeat_seconds = ttl_seconds / 6
+        self.safety_seconds = ttl_seconds / 3
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " account_id TEXT PRIMARY KEY,"
+            " worker_id TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            " worker_id TEXT PRIMARY KEY,"
+            " heartbeat_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        # 担当中のアカウントとリースの期限（UNIX時刻）
+        self._held: dict[str, float] = {}
+        # スケジューラーに反映済みの担当アカウント
+        self._active: set[str] = set()
+        self._next_rebalance = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- 延長（バックグラウンドスレッド） ---
+
+    def heartbeat(self):
+        """生存を記録し、担当中のリースを延長する（奪われたリースは手放す）"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (worker_id, heartbeat_at) VALUES (?, ?)"
+                " ON CONFLICT(worker_id) DO UPDATE SET"
+                " heartbeat_at = excluded.heartbeat_at",
+                (self.worker_id, now),
+            )
+            if not self._held:
+                return
+            self._conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE worker_id = ?",
+                (expires_at, self.worker_id),
+            )
+            rows = self._conn.execute(
+                "SELECT account_id FROM leases WHERE worker_id = ?",
+                (self.worker_id,),
+            ).fetchall()
+            owned = {r[0] for r in rows}
+            for account_id in list(self._held):
+                if account_id in owned:
+                    self._held[account_id] = expires_at
+                else:
+                    del self._held[account_id]
+                    logger.warning(
+                        f"[{account_id}] リースを失いました（他のワーカーが取得）"
+                    )
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except sqlite3.Error as e:
+                # 延長できなければ期限切れで holds() が False になる
+                logger.error(f"リースの延長に失敗: {e}")
+
+    def start(self):
+        """生存を記録し、延長スレッドを開始"""
+        self.heartbeat()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="lease-heartbeat", daemon=True
+            )
+            self._thread.start()
+        logger.info(
+            f"ワーカー {self.worker_id} 起動（リース {self.ttl_seconds:.0f}秒）"
+        )
+
+    def stop(self):
+        """延長を止め、担当中のリースをすべて解放する（他のワーカーがすぐ引き継げる）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM leases WHERE worker_id = ?", (self.worker_id,)
+            )
+            self._conn.execute(
+                "DELETE FROM workers WHERE worker_id = ?", (self.worker_id,)
+            )
+            self._held.clear()
+        self._active.clear()
+        self._conn.close()
+
+    # --- 割り当て（メインループ） ---
+
+    def holds(self, account_id: str) -> bool:
+        """このワーカーがアカウントを担当しており、リースの残り時間に余裕があるか"""
+        with self._lock:
+            expires_at = self._held.get(account_id, 0.0)
+        return expires_at - time.time() > self.safety_seconds
+
+    def rebalance_due(self) -> bool:
+        return time.time() >= self._next_rebalance
+
+    def live_workers(self) -> list[str]:
+        """期限内に生存を記録したワーカー"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker_id FROM workers WHERE heartbeat_at >= ?",
+                (time.time() - self.ttl_seconds,),
+            ).fetchall()
+        return sorted(r[0] for r in rows)
+
+    def rebalance(self, account_ids, keep=()) -> tuple[set[str], set[str]]:
+        """
+        担当すべきアカウントを取得し、担当外になったアカウントを解放する
+
+        Args:
+            account_ids: 設定にある全アカウント
+            keep: 担当外になっても解放しないアカウント（スレッド投稿の途中など）
+
+        Returns:
+            (新たに担当したアカウント, 担当を外れたアカウント)
+        """
+        self._next_rebalance = time.time() + self.heartbeat_seconds
+        account_ids = set(account_ids)
+        workers = self.live_workers()
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        desired = {
+            a for a in account_ids
+            if assign_owner(a, workers) == self.worker_id
+        }
+
+        with self._lock:
+            # 延長に失敗した・他のワーカーに取得されたアカウント
+            lost = {a for a in self._active if a not in self._held}
+            surplus = {
+                a for a in self._held
+                if a not in desired and (a not in keep or a not in account_ids)
+            }
+            now = time.time()
+            for account_id in surplus:
+                self._conn.execute(
+                    "DELETE FROM leases WHERE account_id = ? AND worker_id = ?",
+                    (account_id, self.worker_id),
+                )
+                del self._held[account_id]
+
+            acquired = set()
+            for account_id in sorted(desired - self._held.keys()):
+                # 空いているか期限切れのリースだけを取得できる
+                cursor = self._conn.execute(
+                    "INSERT INTO leases (account_id, worker_id, expires_at)"
+                    " VALUES (?, ?, ?)"
+                    " ON CONFLICT(account_id) DO UPDATE SET"
+                    " worker_id = excluded.worker_id,"
+                    " expires_at = excluded.expires_at"
+                    " WHERE leases.worker_id = excluded.worker_id"
+                    " OR leases.expires_at <= ?",
+                    (account_id, self.worker_id, now + self.ttl_seconds, now),
+                )
+                if cursor.rowcount == 1:
+                    self._held[account_id] = now + self.ttl_seconds
+                    acquired.add(account_id)
+
+        released = (lost | surplus) & self._active
+        self._active = (self._active - released) | acquired
+        if acquired or released:
+            logger.info(
+                f"担当アカウントを更新: +{len(acquired)} -{len(released)} "
+                f"（担当 {len(self._active)}件 / ワーカー {len(workers)}台）"
+            )
+        if acquired:
+            metrics.inc("lease_changes_total", len(acquired), change="acquired")
+        if released:
+            metrics.inc("lease_changes_total", len(released), change="released")
+        return acquired, released
+
+    def owned(self) -> set[str]:
+        """スケジューラーに反映済みの担当アカウント"""
+        return set(self._active)
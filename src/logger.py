@@ -1,19 +1,112 @@
 """ログ管理モジュール - 投稿履歴とアプリケーションログ"""
 
+import atexit
+import gzip
+import itertools
 import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
+from src.clock import SYSTEM_CLOCK, Clock
+from src.history_store import create_history_store
+
+# アカウントごとに保持する投稿履歴の件数（デフォルト）
+DEFAULT_HISTORY_RETENTION = 500
+
+# ログファイルのローテーション（LOG_ROTATION）
+ROTATION_DAILY = "daily"  # ローカル0時ごと
+ROTATION_SIZE = "size"    # LOG_MAX_BYTES ごと
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 14
+# ログファイルの形式（LOG_FORMAT）
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"
+# JSON形式で独立したフィールドとして出力する extra の項目
+LOG_FIELDS = ("account", "stage", "duration")
+
+# setup_logger() で開始したファイル・コンソール出力のスレッド
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1JSONのログ（account / stage / duration は extra から独立した項目にする）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).astimezone()
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def _gzip_rotator(source: str, dest: str):
+    """ローテーションしたファイルをgzip圧縮して置き換える"""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(log_dir: Path) -> logging.Handler:
+    """logs/app.log への出力（ローテーション・圧縮は環境変数で設定）"""
+    path = log_dir / "app.log"
+    backup_count = int(
+        os.getenv("LOG_BACKUP_COUNT", DEFAULT_LOG_BACKUP_COUNT)
+    )
+    if os.getenv("LOG_ROTATION", ROTATION_DAILY) == ROTATION_SIZE:
+        handler = logging.handlers.RotatingFileHandler(
+            path, encoding="utf-8", backupCount=backup_count,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", DEFAULT_LOG_MAX_BYTES)),
+        )
+    else:
+        # 既存のファイルは更新時刻を基準にするため、再起動をまたいでも日付で切り替わる
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when="midnight", encoding="utf-8", backupCount=backup_count,
+        )
+    if os.getenv("LOG_COMPRESS", "true").lower() == "true":
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+
+    if os.getenv("LOG_FORMAT", LOG_FORMAT_TEXT) == LOG_FORMAT_JSON:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+        ))
+    return handler
+
 
 def setup_logger(log_level: str = "INFO") -> logging.Logger:
-    """アプリケーションロガーのセットアップ"""
-    log_dir = Path(__file__).parent.parent / "logs"
-    log_dir.mkdir(exist_ok=True)
+    """
+    アプリケーションロガーのセットアップ
+
+    ログ呼び出しはキューに積むだけで、コンソール・ファイルへの書き込み
+    （ローテーション・圧縮を含む）はバックグラウンドのスレッドが行う。
+    2回目以降の呼び出しはログレベルの変更だけを行う。
+    """
+    global _listener
 
     logger = logging.getLogger("x-auto-poster")
     logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    if _listener is not None:
+        return logger
+
+    log_dir = Path(__file__).parent.parent / "logs"
+    log_dir.mkdir(exist_ok=True)
 
     # コンソール出力
     console = logging.StreamHandler()
@@ -21,17 +114,16 @@ def setup_logger(log_level: str = "INFO") -> logging.Logger:
         "%(asctime)s [%(levelname)s] %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     ))
-    logger.addHandler(console)
 
-    # ファイル出力
-    file_handler = logging.FileHandler(
-        log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log",
-        encoding="utf-8"
+    log_queue: queue.Queue = queue.Queue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(
+        log_queue, console, _file_handler(log_dir),
+        respect_handler_level=True,
     )
-    file_handler.setFormatter(logging.Formatter(
-        "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
-    ))
-    logger.addHandler(file_handler)
+    _listener.start()
+    # 終了時にキューに残ったログを書き出す
+    atexit.register(_listener.stop)
 
     return logger
 
@@ -39,23 +131,96 @@ def setup_logger(log_level: str = "INFO") -> logging.Logger:
 class PostHistory:
     """投稿履歴の管理（重複チェック用）"""
 
-    def __init__(self, history_dir: str = None):
+    def __init__(self, history_dir: str = None, backend: str = None,
+                 default_retention: int = DEFAULT_HISTORY_RETENTION,
+                 clock: Clock = None):
         if history_dir is None:
             history_dir = Path(__file__).parent.parent / "logs"
-        self.history_file = Path(history_dir) / "post_history.json"
-        self.history_file.parent.mkdir(exist_ok=True)
+        history_dir = Path(history_dir)
+        history_dir.mkdir(exist_ok=True)
+        # json（従来の全体書き換え） / jsonl（追記型） / sqlite（WAL） / memory（保存しない）
+        backend = backend or os.getenv("HISTORY_BACKEND", "jsonl")
+        self.store = create_history_store(backend, history_dir)
+        self.default_retention = default_retention
+        # 投稿時刻の取得元（シミュレーションでは仮想時刻）
+        self.clock = clock or SYSTEM_CLOCK
+        self._retention: dict[str, int] = {}
+        # アカウントごとの固定長リングバッファ（古い順）
+        self._index: dict[str, deque] = {}
+        # 非同期スケジューラーでは複数スレッドから参照・追加される
+        self._lock = threading.RLock()
+        # 追加時に通知するコールバック（重複インデックス等）
+        self._subscribers: list = []
+        # アカウントの履歴を読み直したときに通知するコールバック
+        self._reload_subscribers: list = []
         self._load()
 
+    def subscribe(self, callback):
+        """履歴追加時に callback(entry) を呼び出すよう登録"""
+        self._subscribers.append(callback)
+
+    def subscribe_reload(self, callback):
+        """アカウントの履歴の読み直し時に callback(account_id) を呼び出すよう登録"""
+        self._reload_subscribers.append(callback)
+
     def _load(self):
-        if self.history_file.exists():
-            with open(self.history_file, "r", encoding="utf-8") as f:
-                self.data = json.load(f)
-        else:
-            self.data = {"posts": []}
+        with self._lock:
+            self._index = {}
+            for entry in self.store.load():
+                self._get_buffer(entry["account"]).append(entry)
+            self._update_compact_threshold()
 
-    def _save(self):
-        with open(self.history_file, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+    def reload_account(self, account_id: str):
+        """
+        アカウントの履歴をストアから読み直す
+
+        ワーカーモードで他のワーカーからアカウントを引き継いだとき、
+        起動時に読み込んだ履歴には引き継ぎ前の投稿が含まれないため。
+        """
+        with self._lock:
+            self._index.pop(account_id, None)
+            buf = self._get_buffer(account_id)
+            buf.extend(self.store.load_account(account_id, buf.maxlen))
+        for callback in self._reload_subscribers:
+            callback(account_id)
+
+    def _get_buffer(self, account_id: str) -> deque:
+        buf = self._index.get(account_id)
+        if buf is None:
+            buf = self._index[account_id] = deque(
+                maxlen=self._retention.get(
+                    account_id, self.default_retention
+                )
+            )
+        return buf
+
+    def _update_compact_threshold(self):
+        # 保持件数の2倍を超えたらストアを詰め直す
+        total = sum(buf.maxlen for buf in self._index.values())
+        self.store.compact_threshold = max(
+            2 * total, 2 * self.default_retention
+        )
+
+    def set_retention(self, account_id: str, count: int):
+        """アカウントごとの保持件数を設定"""
+        with self._lock:
+            self._retention[account_id] = count
+            old = self._index.pop(account_id, ())
+            self._get_buffer(account_id).extend(old)
+            self._update_compact_threshold()
+
+    def _retained_entries(self) -> list[dict]:
+        """保持中の全エントリ（時刻順）"""
+        entries = list(itertools.chain.from_iterable(self._index.values()))
+        entries.sort(key=lambda e: e["timestamp"])
+        return entries
+
+    def _compact(self):
+        if self.store.shared:
+            # 他のプロセスが追記した行を消さないよう、ストア上の順位で削る
+            self.store.trim(self._retention, self.default_retention)
+        else:
+            self.store.compact(self._retained_entries())
 
     def add(self, account_id: str, tweet_text: str, tweet_id: str = None,
             category: str = None):
@@ -65,19 +230,26 @@ class PostHistory:
             "text": tweet_text,
             "tweet_id": tweet_id,
             "category": category,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.fromtimestamp(self.clock.time()).isoformat(),
         }
-        self.data["posts"].append(entry)
-        # 直近500件のみ保持
-        self.data["posts"] = self.data["posts"][-500:]
-        self._save()
+        with self._lock:
+            # 保持件数を超えた古い投稿はリングバッファから自動的に押し出される
+            self._get_buffer(account_id).append(entry)
+            self.store.append(entry)
+            if self.store.needs_compaction():
+                self._compact()
+        for callback in self._subscribers:
+            callback(entry)
 
     def get_recent(self, account_id: str, count: int = 20) -> list:
         """指定アカウントの直近の投稿を取得"""
-        account_posts = [
-            p for p in self.data["posts"] if p["account"] == account_id
-        ]
-        return account_posts[-count:]
+        with self._lock:
+            buf = self._index.get(account_id)
+            if not buf or count <= 0:
+                return []
+            recent = list(itertools.islice(reversed(buf), count))
+        recent.reverse()
+        return recent
 
     def get_recent_texts(self, account_id: str, count: int = 20) -> list[str]:
         """直近の投稿テキストのみ取得（重複チェック用）"""
@@ -0,0 +1,322 @@
+"""メトリクスモジュール - 処理段階ごとのレイテンシ・トークン・リトライを集計"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.history_store import atomic_write_text
+
+logger = logging.getLogger("x-auto-poster")
+
+# 秒単位のヒストグラムのバケット境界
+DEFAULT_BUCKETS = (
+    0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+METRICS_DIR = Path(__file__).parent.parent / "logs"
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return (
+        str(value).replace("\\", "\\\\").replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float | None:
+        """バケットから分位点を概算（バケット上限値を返す）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, c in zip(self.buckets, self.counts):
+            seen += c
+            if seen >= target:
+                return bound
+        return self.max
+
+
+class MetricsRegistry:
+    """カウンターとヒストグラムをラベル付きで保持するレジストリ"""
+
+    def __init__(self, prefix: str = "xautopost"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # 並行する flush() が同じファイルを書き換え合わないよう直列化する
+        self._flush_lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, _Histogram]] = {}
+        self._help: dict[str, str] = {}
+        # False なら flush() で書き出さない（シミュレーション用）
+        self.flush_enabled = True
+        # ワーカーモードでは全系列に worker_id ラベルを付け、ファイルもワーカーごとに分ける
+        self.worker_id: str | None = None
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """カウンターを加算"""
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float,
+                buckets: tuple = DEFAULT_BUCKETS, **labels):
+        """ヒストグラムに値を記録"""
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """with ブロックの所要時間（秒）をヒストグラムに記録（DEBUGログにも出力）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.observe(name, duration, **labels)
+            logger.debug(
+                f"所要時間 "
+                f"{' '.join(f'{k}={v}' for k, v in labels.items())}: "
+                f"{duration:.3f}秒",
+                extra={**labels, "duration": round(duration, 4)},
+            )
+
+    def to_prometheus(self) -> str:
+        """Prometheus テキスト形式で出力"""
+        lines = []
+        const = {"worker_id": self.worker_id} if self.worker_id else {}
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(
+                        f"{full}{_format_labels(key, const)} {value:g}"
+                    )
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, c in zip(hist.buckets, hist.counts):
+                        cumulative += c
+                        le = {**const, "le": f"{bound:g}"}
+                        lines.append(
+                            f"{full}_bucket{_format_labels(key, le)} "
+                            f"{cumulative}"
+                        )
+                    lines.append(
+                        f"{full}_bucket"
+                        f"{_format_labels(key, {**const, 'le': '+Inf'})} "
+                        f"{hist.count}"
+                    )
+                    lines.append(
+                        f"{full}_sum{_format_labels(key, const)} {hist.sum:g}"
+                    )
+                    lines.append(
+                        f"{full}_count{_format_labels(key, const)} {hist.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """--status 用のJSONサマリー"""
+        with self._lock:
+            counters = {
+                name: [
+                    {"labels": dict(key), "value": value}
+                    for key, value in sorted(series.items())
+                ]
+                for name, series in sorted(self._counters.items())
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": hist.count,
+                        "sum": round(hist.sum, 4),
+                        "avg": round(hist.sum / hist.count, 4),
+                        "min": hist.min,
+                        "max": hist.max,
+                        "p50": hist.quantile(0.5),
+                        "p99": hist.quantile(0.99),
+                    }
+                    for key, hist in sorted(series.items()) if hist.count
+                ]
+                for name, series in sorted(self._histograms.items())
+            }
+        summary = {"counters": counters, "histograms": histograms}
+        if self.worker_id:
+            summary["worker_id"] = self.worker_id
+        return summary
+
+    def flush(self, directory: Path = None):
+        """
+        metrics.prom（textfile collector用）と metrics.json を書き出す
+
+        ワーカーモードでは他のワーカーの値を上書きしないよう
+        metrics-<worker_id>.prom / .json に書き出す。
+        """
+        if not self.flush_enabled:
+            return
+        directory = Path(directory or METRICS_DIR)
+        directory.mkdir(exist_ok=True)
+        stem = f"metrics-{self.worker_id}" if self.worker_id else "metrics"
+        try:
+            with self._flush_lock:
+                atomic_write_text(
+                    directory / f"{stem}.prom", self.to_prometheus()
+                )
+                summary = self.summary()
+                summary["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+                atomic_write_text(
+                    directory / f"{stem}.json",
+                    json.dumps(summary, ensure_ascii=False, indent=2)
+                )
+        except OSError as e:
+            logger.warning(f"メトリクスの書き出しに失敗: {e}")
+
+    def start_http_server(self, port: int, host: str = "127.0.0.1"):
+        """/metrics（Prometheus）と /metrics.json を返すHTTPサーバーを起動"""
+        # デーモン以外（--status 等）では不要なため遅延import
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(
+                        registry.summary(), ensure_ascii=False
+                    ).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        logger.info(f"メトリクスHTTPサーバー起動: http://{host}:{port}/metrics")
+        return server
+
+
+def load_summary(directory: Path = None) -> dict | None:
+    """デーモンが書き出した metrics.json を読み込む"""
+    path = Path(directory or METRICS_DIR) / "metrics.json"
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_worker_summaries(directory: Path = None) -> dict[str, dict]:
+    """ワーカーモードの各ワーカーが書き出した metrics-<worker_id>.json を読み込む"""
+    summaries = {}
+    for path in sorted(Path(directory or METRICS_DIR).glob("metrics-*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        summaries[summary.get("worker_id") or path.stem[8:]] = summary
+    return summaries
+
+
+# プロセス全体で共有するレジストリ
+metrics = MetricsRegistry()
+metrics.describe("stage_duration_seconds", "Duration of each pipeline stage")
+metrics.describe("tokens_total", "Anthropic tokens by kind")
+metrics.describe("retries_total", "X API retries by reason")
+metrics.describe("retry_sleep_seconds_total", "Time spent in retry backoff")
+metrics.describe("posts_total", "Post attempts by result")
+metrics.describe("deferrals_total", "Posts deferred by rate limits or errors")
+metrics.describe(
+    "http_phase_seconds", "HTTP connect, TLS handshake and time to first byte"
+)
+metrics.describe(
+    "http_connections_total", "HTTP requests by whether a pooled connection was reused"
+)
+metrics.describe(
+    "candidates_total", "Generated candidates by selection outcome"
+)
+metrics.describe(
+    "stream_early_stops_total", "Streaming generations stopped early"
+)
+metrics.describe(
+    "schedule_drift_seconds", "Actual minus planned post time"
+)
+metrics.describe(
+    "lease_changes_total", "Accounts acquired or released by this worker"
+)
+metrics.describe(
+    "model_latency_seconds", "Anthropic call latency by model"
+)
+metrics.describe(
+    "model_calls_total", "Anthropic calls by model and result"
+)
+metrics.describe("cost_usd_total", "Estimated Anthropic cost in USD")
+metrics.describe(
+    "generation_fallbacks_total",
+    "Generations that failed on every model, by draft fallback outcome"
+)
+metrics.describe(
+    "slots_skipped_total", "Post slots skipped because of an unexpected error"
+)
+metrics.describe(
+    "quota_removed_slots_total",
+    "Post slots removed to stay within the monthly quota"
+)
@@ -0,0 +1,202 @@
+"""モデルルーター - 生成の種類・カテゴリごとにモデルを選び、遅延・失敗時は代替モデルに切り替える"""
+
+import logging
+import threading
+import time
+
+import anthropic
+
+from src.metrics import metrics
+
+logger = logging.getLogger("x-auto-poster")
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# 生成の種類（models.single / models.thread / models.batch）
+ROUTE_SINGLE = "single"  # 単一ツイート・複数候補
+ROUTE_THREAD = "thread"  # スレッド
+ROUTE_BATCH = "batch"    # 1日分の一括生成（未指定なら thread と同じ）
+
+# 1回の呼び出しの上限（秒）。超えたら打ち切って代替モデルへ
+DEFAULT_LATENCY_BUDGET_SECONDS = 60.0
+# 実測レイテンシの指数移動平均の重み
+LATENCY_EWMA_ALPHA = 0.3
+# 連続でこの回数失敗したモデルは COOLDOWN_SECONDS の間、後回しにする
+FAILURE_THRESHOLD = 3
+COOLDOWN_SECONDS = 300
+
+# 100万トークンあたりの料金（USD）: (入力, 出力)
+MODEL_PRICES = {
+    "claude-opus-4-20250514": (15.0, 75.0),
+    "claude-sonnet-4-20250514": (3.0, 15.0),
+    "claude-3-7-sonnet-20250219": (3.0, 15.0),
+    "claude-3-5-haiku-20241022": (0.8, 4.0),
+}
+# キャッシュ書き込み・読み込みの入力料金に対する倍率
+CACHE_WRITE_PRICE_RATE = 1.25
+CACHE_READ_PRICE_RATE = 0.1
+
+
+class LatencyBudgetExceeded(Exception):
+    """ストリーミング生成がレイテンシ予算を超えた"""
+
+
+class GenerationUnavailable(Exception):
+    """
+    全てのモデルが失敗した、または応答から投稿を取り出せなかった
+
+    下書きへのフォールバック・見送りは呼び出し側で判断する。
+    """
+
+
+def is_failover_error(error: Exception) -> bool:
+    """代替モデルで再試行する価値のあるエラーか（過負荷・タイムアウト・接続断など）"""
+    if isinstance(error, (LatencyBudgetExceeded, anthropic.APIConnectionError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        # 404 はモデルが使えない場合（名前の誤り・提供終了）
+        return error.status_code in (404, 408, 429) or error.status_code >= 500
+    return False
+
+
+def estimate_cost(model: str, usage) -> float:
+    """usage から1回の呼び出しの料金（USD）を見積もる（料金表にないモデルは0）"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    input_price, output_price = prices
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return (
+        usage.input_tokens * input_price
+        + cache_write * input_price * CACHE_WRITE_PRICE_RATE
+        + cache_read * input_price * CACHE_READ_PRICE_RATE
+        + usage.output_tokens * output_price
+    ) / 1_000_000
+
+
+class _ModelStats:
+    """モデルごとの実測値"""
+
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.latency_ewma: float | None = None
+        self.measured_at = 0.0
+        self.cooldown_until = 0.0
+
+    def record_latency(self, seconds: float):
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (
+                seconds - self.latency_ewma
+            )
+        self.measured_at = time.monotonic()
+
+    def penalty(self, budget: float, now: float) -> tuple[bool, bool]:
+        """(クールダウン中か, 実測レイテンシが予算超過か)"""
+        # 後回しにしたモデルは実測が更新されないため、古い実測値は使わない
+        slow = (
+            self.latency_ewma is not None
+            and self.latency_ewma > budget
+            and now - self.measured_at < COOLDOWN_SECONDS
+        )
+        return (self.cooldown_until > now, slow)
+
+
+class ModelRouter:
+    """
+    アカウント設定の models に従って呼び出すモデルの順番を決める
+
+    設定例（アカウント直下）:
+        models:
+          single: claude-3-5-haiku-20241022
+          thread: claude-sonnet-4-20250514
+          fallback: [claude-3-5-haiku-20241022]
+          latency_budget_seconds: 30
+          categories:
+            "Industry trends": {single: claude-sonnet-4-20250514}
+
+    実測のレイテンシ（指数移動平均）が予算を超えているモデルと、連続して失敗し
+    クールダウン中のモデルは後回しにする。全プロセスではなくこのプロセス内の実測値。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, _ModelStats] = {}
+
+    @staticmethod
+    def settings(acc_config: dict, kind: str, category: str = None) -> dict:
+        """種類・カテゴリに対応する主モデル・代替モデル・レイテンシ予算"""
+        models = acc_config.get("models") or {}
+        override = (models.get("categories") or {}).get(category) or {}
+
+        def lookup(key, default=None):
+            return override.get(key, models.get(key, default))
+
+        primary = lookup(kind)
+        if primary is None and kind == ROUTE_BATCH:
+            primary = lookup(ROUTE_THREAD)
+        fallback = lookup("fallback", [])
+        if isinstance(fallback, str):
+            fallback = [fallback]
+        return {
+            "primary": primary or DEFAULT_MODEL,
+            "fallback": list(fallback),
+            "latency_budget_seconds": float(lookup(
+                "latency_budget_seconds", DEFAULT_LATENCY_BUDGET_SECONDS
+            )),
+        }
+
+    def route(self, acc_config: dict, kind: str,
+              category: str = None) -> tuple[list[str], float]:
+        """試す順のモデル一覧とレイテンシ予算（秒）を返す"""
+        settings = self.settings(acc_config, kind, category)
+        budget = settings["latency_budget_seconds"]
+        models = list(dict.fromkeys(
+            [settings["primary"]] + settings["fallback"]
+        ))
+        now = time.monotonic()
+        with self._lock:
+            penalties = {
+                model: self._stats[model].penalty(budget, now)
+                for model in models if model in self._stats
+            }
+        # sorted は安定なので、同じ条件のモデルは設定の順のまま
+        return (
+            sorted(models, key=lambda m: penalties.get(m, (False, False))),
+            budget,
+        )
+
+    def record_success(self, model: str, account_id: str, seconds: float,
+                       usage):
+        """成功した呼び出しのレイテンシと料金を記録"""
+        cost = estimate_cost(model, usage)
+        with self._lock:
+            stats = self._stats.setdefault(model, _ModelStats())
+            stats.consecutive_failures = 0
+            stats.cooldown_until = 0.0
+            stats.record_latency(seconds)
+        metrics.observe("model_latency_seconds", seconds, model=model)
+        metrics.inc("model_calls_total", model=model, result="success")
+        metrics.inc("cost_usd_total", cost, account=account_id, model=model)
+
+    def record_failure(self, model: str, seconds: float, error: Exception):
+        """失敗した呼び出しを記録（タイムアウトは予算いっぱいのレイテンシとして扱う）"""
+        with self._lock:
+            stats = self._stats.setdefault(model, _ModelStats())
+            stats.consecutive_failures += 1
+            if isinstance(error, (LatencyBudgetExceeded,
+                                  anthropic.APITimeoutError)):
+                stats.record_latency(seconds)
+            cooling = stats.consecutive_failures == FAILURE_THRESHOLD
+            if stats.consecutive_failures >= FAILURE_THRESHOLD:
+                stats.cooldown_until = time.monotonic() + COOLDOWN_SECONDS
+        if cooling:
+            logger.warning(
+                f"モデル {model} が{FAILURE_THRESHOLD}回連続で失敗したため"
+                f"{COOLDOWN_SECONDS}秒間は後回しにします"
+            )
+        metrics.inc(
+            "model_calls_total", model=model, result=type(error).__name__
+        )
@@ -0,0 +1,171 @@
+"""事前生成モジュール - 投稿枠より前に下書きを生成してプールに補充"""
+
+import logging
+import threading
+
+from src.draft_pool import DraftPool, DEFAULT_DRAFT_TTL_HOURS
+from src.scheduler import PostScheduler
+
+logger = logging.getLogger("x-auto-poster")
+
+DEFAULT_LOOKAHEAD_MINUTES = 90
+
+# 事前生成の方式（pregeneration.mode）
+MODE_LOOKAHEAD = "lookahead"  # 投稿枠ごとに直前に生成
+MODE_BATCH = "batch"          # 日次スケジュール生成後に1日分をまとめて生成
+
+
+def pregeneration_settings(acc_config: dict) -> dict | None:
+    """アカウントの事前生成設定（無効ならNone）"""
+    settings = acc_config.get("pregeneration") or {}
+    if not settings.get("enabled", False):
+        return None
+    return {
+        "mode": settings.get("mode", MODE_LOOKAHEAD),
+        "lookahead_minutes": settings.get(
+            "lookahead_minutes", DEFAULT_LOOKAHEAD_MINUTES
+        ),
+        "draft_ttl_hours": settings.get(
+            "draft_ttl_hours", DEFAULT_DRAFT_TTL_HOURS
+        ),
+    }
+
+
+def stash_spares(pool: DraftPool | None, account_id: str, acc_config: dict,
+                 spares: list[dict]) -> int:
+    """複数候補生成で採用しなかった候補を、後の投稿枠の下書きとしてプールに追加"""
+    if pool is None or not spares:
+        return 0
+    settings = pregeneration_settings(acc_config)
+    ttl_hours = (
+        settings["draft_ttl_hours"] if settings else DEFAULT_DRAFT_TTL_HOURS
+    )
+    for result in spares:
+        pool.push(account_id, result, ttl_hours=ttl_hours)
+    logger.info(f"[{account_id}] 予備の候補を下書きに追加: {len(spares)}件")
+    return len(spares)
+
+
+class PreGenerator:
+    """投稿枠のlookahead内に入ったら下書きを先に生成するバックグラウンド処理"""
+
+    def __init__(self, generator, pool: DraftPool, scheduler: PostScheduler,
+                 config: dict, interval_seconds: float = 60):
+        self.generator = generator
+        self.pool = pool
+        self.scheduler = scheduler
+        self.config = config
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # 一括生成を実施したスケジュール日付
+        self._batched_dates: dict[str, object] = {}
+
+    def fill_day(self, account_id: str, acc_config: dict,
+                 settings: dict) -> int:
+        """本日のスケジュール全体の下書きを1回のリクエストで生成"""
+        schedule_date = self.scheduler.schedule_dates.get(account_id)
+        if (schedule_date is None
+                or self._batched_dates.get(account_id) == schedule_date):
+            return 0
+        # 失敗しても同じ日に再送しない（不足分は lookahead で補う）
+        self._batched_dates[account_id] = schedule_date
+
+        # 下書きはその日のうちに使い切る（lookahead_days で先の日の枠があっても対象外）
+        ttl_seconds = self.scheduler.seconds_until_rollover(account_id)
+        ttl_hours = (
+            ttl_seconds / 3600 if ttl_seconds
+            else settings["draft_ttl_hours"]
+        )
+        today_slots = (
+            self.scheduler.upcoming(account_id, ttl_seconds)
+            if ttl_seconds else self.scheduler.schedules.get(account_id, ())
+        )
+        missing = len(today_slots) - self.pool.count(account_id)
+        if missing <= 0:
+            return 0
+        results = self.generator.generate_batch(
+            account_id, acc_config, missing,
+            pending_texts=self.pool.texts(account_id),
+        )
+        for result in results:
+            self.pool.push(account_id, result, ttl_hours=ttl_hours)
+        logger.info(
+            f"[{account_id}] 1日分の下書きを一括生成: "
+            f"{len(results)}/{missing}件"
+        )
+        return len(results)
+
+    def fill_account(self, account_id: str, acc_config: dict) -> int:
+        """1アカウント分の不足している下書きを生成し、生成数を返す"""
+        settings = pregeneration_settings(acc_config)
+        if settings is None:
+            return 0
+
+        generated = 0
+        if settings["mode"] == MODE_BATCH:
+            try:
+                generated += self.fill_day(account_id, acc_config, settings)
+            except Exception as e:
+                logger.error(f"[{account_id}] 一括生成エラー: {e}")
+
+        slots = self.scheduler.upcoming(
+            account_id, settings["lookahead_minutes"] * 60
+        )
+        missing = len(slots) - self.pool.count(account_id)
+        for _ in range(max(0, missing)):
+            # 予備の候補で埋まった分は生成しない
+            if self.pool.count(account_id) >= len(slots):
+                break
+            spares = []
+            result = self.generator.generate(
+                account_id, acc_config,
+                pending_texts=self.pool.texts(account_id),
+                spares=spares,
+            )
+            self.pool.push(
+                account_id, result, ttl_hours=settings["draft_ttl_hours"]
+            )
+            logger.info(
+                f"[{account_id}] 下書きを事前生成: "
+                f"[{result['category']}] {result['text'][:40]}..."
+            )
+            generated += 1 + stash_spares(
+                self.pool, account_id, acc_config, spares
+            )
+        return generated
+
+    def run_once(self) -> int:
+        """全アカウントの下書きを補充"""
+        generated = 0
+        for account_id, acc_config in list(self.config["accounts"].items()):
+            if self._stop.is_set():
+                break
+            try:
+                generated += self.fill_account(account_id, acc_config)
+            except Exception as e:
+                # 事前生成に失敗しても投稿時に同期生成でフォールバックする
+                logger.error(f"[{account_id}] 事前生成エラー: {e}")
+        self.pool.purge_expired()
+        return generated
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        """バックグラウンドスレッドを開始"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="pregenerator", daemon=True
+        )
+        self._thread.start()
+        logger.info("下書き事前生成スレッド起動")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -2,70 +2,288 @@
 
 import time
 import logging
+import threading
+import requests
 import tweepy
 
+from src.metrics import metrics
+from src.quota import QuotaManager, app_id
+from src.transport import get_x_session
+
 logger = logging.getLogger("x-auto-poster")
 
+# レート制限ヘッダーの種類と、状態を保持する単位
+#   x-rate-limit-*        エンドポイント単位（ユーザーごと）
+#   x-user-limit-24hour-* 24時間の投稿上限（ユーザーごと）
+#   x-app-limit-24hour-*  24時間の投稿上限（アプリごと）
+ACCOUNT_LIMIT_HEADERS = ("x-rate-limit", "x-user-limit-24hour")
+APP_LIMIT_HEADERS = ("x-app-limit-24hour",)
+
+# ヘッダーが無い場合のバックオフ（秒）: 基準値 × 2^連続失敗回数
+RATE_LIMIT_BACKOFF = 60
+SERVER_ERROR_BACKOFF = 30
+OTHER_ERROR_BACKOFF = 10
+# 指数バックオフの指数（連続失敗回数）の上限
+MAX_BACKOFF_EXPONENT = 6
+# 同期モードで1回に待機する上限（秒）
+MAX_BLOCKING_WAIT = 15 * 60
+
+
+class RateLimitState:
+    """X APIのレート制限ヘッダーから読み取った残数とリセット時刻"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ヘッダー名 -> (remaining, reset のUNIX時刻)
+        self.limits: dict[str, tuple[int, float]] = {}
+        # ヘッダーが無い429/5xxで設定する待機期限（UNIX時刻）
+        self.backoff_until = 0.0
+
+    def update(self, headers, prefixes: tuple[str, ...]):
+        """レスポンスヘッダーから残数・リセット時刻を更新"""
+        with self._lock:
+            for prefix in prefixes:
+                remaining = headers.get(f"{prefix}-remaining")
+                reset = headers.get(f"{prefix}-reset")
+                if remaining is None or reset is None:
+                    continue
+                try:
+                    self.limits[prefix] = (int(remaining), float(reset))
+                except ValueError:
+                    continue
+
+    def blocked_until(self, now: float = None) -> float:
+        """投稿できるようになる時刻（制限中でなければ0）"""
+        now = now or time.time()
+        with self._lock:
+            until = self.backoff_until if self.backoff_until > now else 0.0
+            for remaining, reset in self.limits.values():
+                if remaining <= 0 and reset > now:
+                    until = max(until, reset)
+        return until
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                prefix: {"remaining": remaining, "reset": reset}
+                for prefix, (remaining, reset) in self.limits.items()
+            }
+
 
 class Publisher:
     """X APIへのツイート投稿を管理"""
 
+    # 同じアプリ（API Key）を使うアカウント間で共有するレート制限状態
+    _app_states: dict[str, RateLimitState] = {}
+    _app_states_lock = threading.Lock()
+
     def __init__(self, api_key: str, api_secret: str,
-                 access_token: str, access_token_secret: str):
+                 access_token: str, access_token_secret: str,
+                 account_id: str = "", quota: QuotaManager = None):
+        self.account_id = account_id
+        # 投稿したツイート数をアプリ・アカウントごとに記録する
+        self.quota = quota
+        self.app_id = app_id(api_key)
+        # ヘッダーを読むため requests.Response をそのまま受け取る
         self.client = tweepy.Client(
             consumer_key=api_key,
             consumer_secret=api_secret,
             access_token=access_token,
             access_token_secret=access_token_secret,
+            return_type=requests.Response,
         )
+        # 接続プールは全アカウントで共有（認証はリクエストごとのOAuth署名）
+        self.client.session = get_x_session()
+        self.rate_limit = RateLimitState()
+        with Publisher._app_states_lock:
+            self.app_rate_limit = Publisher._app_states.setdefault(
+                api_key, RateLimitState()
+            )
+        # 連続失敗回数（バックオフ計算用、成功でリセット）
+        self._failures = 0
+
+    def _update_limits(self, response):
+        if response is None:
+            return
+        self.rate_limit.update(response.headers, ACCOUNT_LIMIT_HEADERS)
+        self.app_rate_limit.update(response.headers, APP_LIMIT_HEADERS)
+
+    def blocked_until(self) -> float:
+        """アカウント・アプリいずれかの制限で投稿できない場合、その解除時刻"""
+        return max(
+            self.rate_limit.blocked_until(),
+            self.app_rate_limit.blocked_until(),
+        )
+
+    def _deferred(self, text: str, retry_at: float,
+                  reason: str = "rate_limit") -> dict:
+        logger.warning(
+            f"[{self.account_id}] 投稿を延期: "
+            f"{time.strftime('%H:%M:%S', time.localtime(retry_at))} に再試行"
+        )
+        metrics.inc("deferrals_total", account=self.account_id)
+        return {
+            "id": None, "text": text, "deferred": True,
+            "retry_at": retry_at, "attempt": self._failures,
+            "reason": reason,
+        }
 
     def post_tweet(self, text: str, reply_to: str = None,
-                   max_retries: int = 3) -> dict | None:
+                   max_retries: int = 3, defer: bool = False) -> dict | None:
         """
         ツイートを投稿する
 
         Args:
             text: ツイート本文
             reply_to: リプライ先のツイートID（スレッド用）
-            max_retries: リトライ回数
+            max_retries: リトライ回数（defer=False の場合）
+            defer: Trueならレート制限・サーバーエラー時に待機せず、
+                再試行時刻を返す
 
         Returns:
-            {"id": str, "text": str} or None
+            {"id": str, "text": str}、
+            延期時は {"id": None, "deferred": True, "retry_at": UNIX時刻,
+            "reason": "rate_limit" / "server_error" / "other", ...}、
+            失敗時（429以外の4xxなど再試行しても成功しないエラー）は None
         """
-        for attempt in range(max_retries):
-            try:
-                kwargs = {"text": text}
-                if reply_to:
-                    kwargs["in_reply_to_tweet_id"] = reply_to
+        with metrics.timer(
+            "stage_duration_seconds", account=self.account_id,
+            stage="posting"
+        ):
+            if defer:
+                return self._post_tweet_deferred(text, reply_to)
+            return self._post_tweet(text, reply_to, max_retries)
+
+    def _retry_wait(self, seconds: float, reason: str):
+        """リトライ待機（待機時間をメトリクスに記録）"""
+        metrics.inc("retries_total", account=self.account_id, reason=reason)
+        metrics.inc(
+            "retry_sleep_seconds_total", seconds, account=self.account_id
+        )
+        time.sleep(seconds)
+
+    def _create_tweet(self, text: str, reply_to: str) -> dict:
+        kwargs = {"text": text}
+        if reply_to:
+            kwargs["in_reply_to_tweet_id"] = reply_to
 
-                response = self.client.create_tweet(**kwargs)
+        response = self.client.create_tweet(**kwargs)
+        self._update_limits(response)
 
-                tweet_id = response.data["id"]
-                logger.info(f"投稿成功: ID={tweet_id}, 文字数={len(text)}")
-                return {"id": str(tweet_id), "text": text}
+        tweet_id = response.json()["data"]["id"]
+        self._failures = 0
+        if self.quota is not None:
+            self.quota.record_post(self.account_id, self.app_id)
+        logger.info(f"投稿成功: ID={tweet_id}, 文字数={len(text)}")
+        return {"id": str(tweet_id), "text": text}
 
-            except tweepy.TooManyRequests:
-                wait = 60 * (2 ** attempt)
+    def _backoff_until(self, error: Exception, base: float) -> float:
+        """エラー応答から再試行可能な時刻を求める"""
+        now = time.time()
+        self._update_limits(getattr(error, "response", None))
+        until = self.blocked_until()
+        if until <= now:
+            # ヘッダーが無ければ指数バックオフ
+            until = now + base * (2 ** self._failures)
+            self.rate_limit.backoff_until = until
+        self._failures = min(self._failures + 1, MAX_BACKOFF_EXPONENT)
+        return until
+
+    @staticmethod
+    def _is_payload_error(error: Exception) -> bool:
+        """429以外の4xx（本文・認証・リプライ先の誤りなど）は再試行しても成功しない"""
+        return (
+            isinstance(error, tweepy.HTTPException)
+            and not isinstance(error, tweepy.TooManyRequests)
+            and 400 <= error.response.status_code < 500
+        )
+
+    def _post_tweet_deferred(self, text: str, reply_to: str) -> dict | None:
+        """1回だけ試行し、制限中・一時エラーなら再試行時刻を返す"""
+        until = self.blocked_until()
+        if until > time.time():
+            return self._deferred(text, until)
+
+        try:
+            return self._create_tweet(text, reply_to)
+
+        except tweepy.TooManyRequests as e:
+            metrics.inc(
+                "retries_total", account=self.account_id, reason="rate_limit"
+            )
+            return self._deferred(
+                text, self._backoff_until(e, RATE_LIMIT_BACKOFF)
+            )
+
+        except tweepy.Forbidden as e:
+            logger.error(f"投稿拒否（権限エラー）: {e}")
+            return None
+
+        except tweepy.TwitterServerError as e:
+            logger.warning(f"Xサーバーエラー: {e}")
+            metrics.inc(
+                "retries_total", account=self.account_id,
+                reason="server_error"
+            )
+            return self._deferred(
+                text, self._backoff_until(e, SERVER_ERROR_BACKOFF),
+                "server_error"
+            )
+
+        except Exception as e:
+            # 投稿内容のエラーはアカウント全体のバックオフに含めない
+            if self._is_payload_error(e):
+                logger.error(f"投稿失敗（再試行しません）: {e}")
+                return None
+            logger.error(f"予期しないエラー: {e}")
+            metrics.inc(
+                "retries_total", account=self.account_id, reason="other"
+            )
+            return self._deferred(
+                text, self._backoff_until(e, OTHER_ERROR_BACKOFF), "other"
+            )
+
+    def _post_tweet(self, text: str, reply_to: str,
+                    max_retries: int) -> dict | None:
+        for attempt in range(max_retries):
+            until = self.blocked_until()
+            if until > time.time():
+                self._retry_wait(
+                    min(until - time.time(), MAX_BLOCKING_WAIT), "rate_limit"
+                )
+
+            try:
+                return self._create_tweet(text, reply_to)
+
+            except tweepy.TooManyRequests as e:
+                wait = self._backoff_until(e, RATE_LIMIT_BACKOFF) - time.time()
+                wait = min(max(wait, 1), MAX_BLOCKING_WAIT)
                 logger.warning(
-                    f"レート制限。{wait}秒待機 (試行 {attempt + 1}/{max_retries})"
+                    f"レート制限。{wait:.0f}秒待機 (試行 {attempt + 1}/{max_retries})"
                 )
-                time.sleep(wait)
+                self._retry_wait(wait, "rate_limit")
 
             except tweepy.Forbidden as e:
                 logger.error(f"投稿拒否（権限エラー）: {e}")
                 return None
 
             except tweepy.TwitterServerError as e:
-                wait = 30 * (2 ** attempt)
+                wait = SERVER_ERROR_BACKOFF * (2 ** attempt)
                 logger.warning(
                     f"Xサーバーエラー。{wait}秒待機: {e}"
                 )
-                time.sleep(wait)
+                self._update_limits(e.response)
+                self._retry_wait(wait, "server_error")
 
             except Exception as e:
+                if self._is_payload_error(e):
+                    logger.error(f"投稿失敗（再試行しません）: {e}")
+                    return None
                 logger.error(f"予期しないエラー: {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(10 * (2 ** attempt))
+                    self._retry_wait(
+                        OTHER_ERROR_BACKOFF * (2 ** attempt), "other"
+                    )
                 else:
                     return None
 
@@ -82,6 +300,13 @@ class Publisher:
         Returns:
             投稿結果のリスト
         """
+        with metrics.timer(
+            "stage_duration_seconds", account=self.account_id,
+            stage="thread_posting"
+        ):
+            return self._post_thread(tweets)
+
+    def _post_thread(self, tweets: list[str]) -> list[dict]:
         results = []
         reply_to = None
 
@@ -103,8 +328,10 @@ class Publisher:
         """API認証情報の確認"""
         try:
             me = self.client.get_me()
-            if me.data:
-                logger.info(f"認証OK: @{me.data.username}")
+            self._update_limits(me)
+            data = me.json().get("data")
+            if data:
+                logger.info(f"認証OK: @{data['username']}")
                 return True
             return False
         except Exception as e:
@@ -0,0 +1,389 @@
+"""クォータ管理 - X の月間投稿数と Anthropic のトークン使用量を予算内に収める
+
+使用量は SQLite（複数プロセス・ワーカーから同じファイルを参照）に月単位で加算し、
+月の残り予算を残り日数で割った1日あたりのペースを超えないよう、日次スケジュールの
+投稿枠を減らす。
+
+- X: アプリ（API Key）ごとの月間ツイート数と、アカウントごとの月間ツイート数
+- Anthropic: 全アカウント合計の月間入力・出力トークン数
+
+設定例（accounts.yaml の最上位とアカウント直下）:
+    quota:
+      x_monthly_tweets_per_app: 1500
+      anthropic_monthly_input_tokens: 20000000
+      anthropic_monthly_output_tokens: 2000000
+    accounts:
+      english:
+        quota:
+          monthly_tweets: 150
+"""
+
+import calendar
+import hashlib
+import logging
+import random
+import sqlite3
+import threading
+from datetime import date, timezone
+from pathlib import Path
+
+from src.clock import SYSTEM_CLOCK, Clock
+from src.metrics import metrics
+from src.slot_sampler import DEFAULT_POSTS_PER_DAY
+
+logger = logging.getLogger("x-auto-poster")
+
+# 使用量の種類（usage.scope）
+SCOPE_APP_TWEETS = "app_tweets"          # key = アプリID
+SCOPE_ACCOUNT_TWEETS = "account_tweets"  # key = account_id
+SCOPE_INPUT_TOKENS = "input_tokens"      # key = account_id
+SCOPE_OUTPUT_TOKENS = "output_tokens"    # key = account_id
+
+# スレッド（2〜4ツイート）の平均ツイート数
+AVERAGE_THREAD_TWEETS = 3
+# 実績が少ないうちに使う1ツイートあたりのトークン数の見積もり
+DEFAULT_INPUT_TOKENS_PER_TWEET = 1500
+DEFAULT_OUTPUT_TOKENS_PER_TWEET = 150
+# 実績のトークン数/ツイートを使い始めるツイート数
+MIN_TWEETS_FOR_ESTIMATE = 20
+# 使用量を残す月数（当月を含む）
+RETENTION_MONTHS = 3
+
+
+def app_id(api_key: str) -> str:
+    """アプリの識別子（API Key をそのまま保存しない）"""
+    return hashlib.sha1(api_key.encode()).hexdigest()[:12]
+
+
+def _month(day: date) -> str:
+    return day.strftime("%Y-%m")
+
+
+def _days_in_month(day: date) -> int:
+    return calendar.monthrange(day.year, day.month)[1]
+
+
+def _round_random(value: float) -> int:
+    """端数を確率的に切り上げる（長期的な平均が value に一致する）"""
+    whole = int(value)
+    return whole + (1 if random.random() < value - whole else 0)
+
+
+class QuotaStore:
+    """月単位の使用量を加算するSQLiteテーブル"""
+
+    def __init__(self, path: Path, read_only: bool = False):
+        """
+        Args:
+            path: 使用量DB（全プロセス・ワーカーから同じファイルを参照する）。
+                ":memory:" ならメモリ上だけに保持する（シミュレーション用）
+            read_only: 読み取り専用で開く（--status 用。DBは作成・変更しない）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"{Path(path).resolve().as_uri()}?mode=ro", uri=True,
+                check_same_thread=False, isolation_level=None, timeout=30,
+            )
+            return
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            " scope TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " month TEXT NOT NULL,"
+            " amount INTEGER NOT NULL,"
+            " PRIMARY KEY (scope, key, month))"
+        )
+
+    def add(self, month: str, items: list[tuple[str, str, int]]):
+        """使用量を加算（他のプロセスの加算と競合しても失われない）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO usage (scope, key, month, amount)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(scope, key, month) DO UPDATE SET"
+                    " amount = amount + excluded.amount",
+                    [(scope, key, month, amount)
+                     for scope, key, amount in items],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def usage(self, month: str) -> dict[str, dict[str, int]]:
+        """その月の使用量 {scope: {key: amount}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT scope, key, amount FROM usage WHERE month = ?",
+                (month,),
+            ).fetchall()
+        result: dict[str, dict[str, int]] = {}
+        for scope, key, amount in rows:
+            result.setdefault(scope, {})[key] = amount
+        return result
+
+    def prune(self, oldest_month: str):
+        """oldest_month より前の月の使用量を削除"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM usage WHERE month < ?", (oldest_month,)
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class QuotaManager:
+    """
+    使用量の記録と、予算から見た1日の投稿枠の上限
+
+    config は呼び出し側と同じ dict を参照する（設定の再読み込みがそのまま反映される）。
+    月の区切りはUTC。
+    """
+
+    def __init__(self, store: QuotaStore, config: dict, clock: Clock = None):
+        self.store = store
+        self.config = config
+        self.clock = clock or SYSTEM_CLOCK
+        # このプロセスで予算のために減らした投稿枠の数（アカウントごと）
+        self.removed_slots: dict[str, int] = {}
+        # 古い月の使用量を削除済みの月（記録時に月ごとに1回だけ削除する）
+        self._pruned_month: str | None = None
+
+    def _today(self) -> date:
+        return self.clock.now(timezone.utc).date()
+
+    def _settings(self) -> dict:
+        return self.config.get("quota") or {}
+
+    def _account_limit(self, account_id: str) -> int | None:
+        acc_config = self.config["accounts"].get(account_id) or {}
+        return (acc_config.get("quota") or {}).get("monthly_tweets")
+
+    # --- 記録 ---
+
+    def _add(self, items: list[tuple[str, str, int]]):
+        """当月の使用量に加算し、月が替わっていれば保存期間を過ぎた月を削除"""
+        today = self._today()
+        month = _month(today)
+        self.store.add(month, items)
+        if self._pruned_month == month:
+            return
+        oldest = date(today.year, today.month, 1)
+        for _ in range(RETENTION_MONTHS - 1):
+            oldest = date(
+                oldest.year - (oldest.month == 1),
+                12 if oldest.month == 1 else oldest.month - 1, 1
+            )
+        self.store.prune(_month(oldest))
+        self._pruned_month = month
+
+    def record_post(self, account_id: str, app: str, tweets: int = 1):
+        """投稿したツイート数を記録（記録に失敗しても投稿は止めない）"""
+        try:
+            self._add([
+                (SCOPE_APP_TWEETS, app, tweets),
+                (SCOPE_ACCOUNT_TWEETS, account_id, tweets),
+            ])
+        except sqlite3.Error as e:
+            logger.warning(f"[{account_id}] 投稿数の記録に失敗: {e}")
+
+    def record_tokens(self, account_id: str, input_tokens: int,
+                      output_tokens: int):
+        """Anthropic のトークン使用量を記録（キャッシュ読込・書込も入力に含める）"""
+        try:
+            self._add([
+                (SCOPE_INPUT_TOKENS, account_id, input_tokens),
+                (SCOPE_OUTPUT_TOKENS, account_id, output_tokens),
+            ])
+        except sqlite3.Error as e:
+            logger.warning(f"[{account_id}] トークン使用量の記録に失敗: {e}")
+
+    # --- 予算 ---
+
+    def _tweets_per_post(self, account_id: str) -> float:
+        """1回の投稿の平均ツイート数（スレッドの確率から見積もる）"""
+        acc_config = self.config["accounts"].get(account_id) or {}
+        style = (acc_config.get("content") or {}).get("style") or {}
+        return 1 + style.get("thread_probability", 0) * (
+            AVERAGE_THREAD_TWEETS - 1
+        )
+
+    def _weight(self, account_id: str) -> float:
+        """予算を分け合うときの重み（1日の見込みツイート数）"""
+        acc_config = self.config["accounts"].get(account_id) or {}
+        posts = (acc_config.get("schedule") or {}).get(
+            "posts_per_day", DEFAULT_POSTS_PER_DAY
+        )
+        return max(0, posts) * self._tweets_per_post(account_id)
+
+    def _share(self, account_id: str, members) -> float:
+        total = sum(self._weight(a) for a in members)
+        return self._weight(account_id) / total if total else 0.0
+
+    def _daily_pace(self, day: date, limit: int, used: int) -> float:
+        """day に使える量: 当月なら残り予算 / 残り日数、翌月以降なら月の予算 / 日数"""
+        today = self._today()
+        if _month(day) != _month(today):
+            return limit / _days_in_month(day)
+        days_left = _days_in_month(today) - today.day + 1
+        return max(0, limit - used) / days_left
+
+    def _tokens_per_tweet(self, usage: dict) -> tuple[float, float]:
+        """当月の実績から1ツイートあたりの入力・出力トークン数を求める"""
+        tweets = sum(usage.get(SCOPE_ACCOUNT_TWEETS, {}).values())
+        input_tokens = sum(usage.get(SCOPE_INPUT_TOKENS, {}).values())
+        output_tokens = sum(usage.get(SCOPE_OUTPUT_TOKENS, {}).values())
+        if tweets < MIN_TWEETS_FOR_ESTIMATE or not input_tokens:
+            return (
+                DEFAULT_INPUT_TOKENS_PER_TWEET,
+                DEFAULT_OUTPUT_TOKENS_PER_TWEET,
+            )
+        return input_tokens / tweets, max(1, output_tokens) / tweets
+
+    def _tweet_caps(self, account_id: str, day: date,
+                    usage: dict) -> list[tuple[str, float]]:
+        """day にこのアカウントが使えるツイート数の上限（予算ごと）"""
+        settings = self._settings()
+        accounts = self.config["accounts"]
+        acc_config = accounts.get(account_id) or {}
+        caps = []
+
+        limit = self._account_limit(account_id)
+        if limit is not None:
+            used = usage.get(SCOPE_ACCOUNT_TWEETS, {}).get(account_id, 0)
+            caps.append(("アカウント", self._daily_pace(day, limit, used)))
+
+        limit = settings.get("x_monthly_tweets_per_app")
+        if limit is not None and acc_config.get("api_key"):
+            app = app_id(acc_config["api_key"])
+            used = usage.get(SCOPE_APP_TWEETS, {}).get(app, 0)
+            # 同じアプリのアカウントで1日の見込みツイート数に応じて分け合う
+            members = [
+                a for a, c in accounts.items()
+                if c.get("api_key") == acc_config["api_key"]
+            ]
+            caps.append((
+                "アプリ",
+                self._daily_pace(day, limit, used)
+                * self._share(account_id, members),
+            ))
+
+        per_tweet = self._tokens_per_tweet(usage)
+        for (key, scope), tokens in zip(
+            (("anthropic_monthly_input_tokens", SCOPE_INPUT_TOKENS),
+             ("anthropic_monthly_output_tokens", SCOPE_OUTPUT_TOKENS)),
+            per_tweet,
+        ):
+            limit = settings.get(key)
+            if limit is None:
+                continue
+            used = sum(usage.get(scope, {}).values())
+            caps.append((
+                "Claude " + ("入力" if scope == SCOPE_INPUT_TOKENS else "出力"),
+                self._daily_pace(day, limit, used) / tokens
+                * self._share(account_id, accounts),
+            ))
+        return caps
+
+    def daily_allowance(self, account_id: str, day: date,
+                        planned: int) -> int:
+        """
+        予算内に収まる day の投稿枠数（planned 以下）
+
+        ツイート数の上限をスレッドの確率から見積もった1投稿あたりのツイート数で
+        割って投稿数にする。端数は確率的に切り上げ、月全体で予算に近づける。
+        """
+        if planned <= 0:
+            return planned
+        try:
+            usage = self.store.usage(_month(self._today()))
+        except sqlite3.Error as e:
+            logger.warning(f"[{account_id}] 使用量を読めないため枠を減らしません: {e}")
+            return planned
+        caps = self._tweet_caps(account_id, day, usage)
+        if not caps:
+            return planned
+
+        reason, tweets = min(caps, key=lambda c: c[1])
+        allowed = min(
+            planned, _round_random(tweets / self._tweets_per_post(account_id))
+        )
+        if allowed < planned:
+            logger.info(
+                f"[{account_id}] {day} の投稿枠を予算に合わせて削減: "
+                f"{planned}→{allowed}件（{reason}の月間予算）",
+                extra={"account": account_id},
+            )
+            self.removed_slots[account_id] = (
+                self.removed_slots.get(account_id, 0) + planned - allowed
+            )
+            metrics.inc(
+                "quota_removed_slots_total", planned - allowed,
+                account=account_id
+            )
+        return allowed
+
+    # --- 表示 ---
+
+    def status(self) -> dict:
+        """当月の使用量・予算と、本日の1日あたりの上限（--status 用）"""
+        today = self._today()
+        usage = self.store.usage(_month(today))
+        settings = self._settings()
+        accounts = self.config["accounts"]
+
+        apps: dict[str, dict] = {}
+        for account_id, acc_config in accounts.items():
+            if not acc_config.get("api_key"):
+                continue
+            app = app_id(acc_config["api_key"])
+            apps.setdefault(app, {
+                "accounts": [],
+                "tweets": usage.get(SCOPE_APP_TWEETS, {}).get(app, 0),
+                "limit": settings.get("x_monthly_tweets_per_app"),
+            })["accounts"].append(account_id)
+
+        account_status = {}
+        for account_id in accounts:
+            caps = self._tweet_caps(account_id, today, usage)
+            account_status[account_id] = {
+                "tweets": usage.get(SCOPE_ACCOUNT_TWEETS, {}).get(
+                    account_id, 0
+                ),
+                "limit": self._account_limit(account_id),
+                "input_tokens": usage.get(SCOPE_INPUT_TOKENS, {}).get(
+                    account_id, 0
+                ),
+                "output_tokens": usage.get(SCOPE_OUTPUT_TOKENS, {}).get(
+                    account_id, 0
+                ),
+                "daily_tweets": (
+                    round(min(t for _, t in caps), 1) if caps else None
+                ),
+            }
+
+        return {
+            "month": _month(today),
+            "days_left": _days_in_month(today) - today.day + 1,
+            "apps": list(apps.values()),
+            "accounts": account_status,
+            "input_tokens": sum(usage.get(SCOPE_INPUT_TOKENS, {}).values()),
+            "input_limit": settings.get("anthropic_monthly_input_tokens"),
+            "output_tokens": sum(
+                usage.get(SCOPE_OUTPUT_TOKENS, {}).values()
+            ),
+            "output_limit": settings.get("anthropic_monthly_output_tokens"),
+        }
@@ -0,0 +1,137 @@
+"""スケジュール状態の永続化バックエンド - JSONファイル / SQLite（ワーカー間で共有）"""
+
+import json
+import logging
+import sqlite3
+from datetime import timezone
+from pathlib import Path
+
+from src.clock import SYSTEM_CLOCK, Clock
+from src.history_store import atomic_write_text
+
+logger = logging.getLogger("x-auto-poster")
+
+
+class ScheduleStore:
+    """アカウントごとのスケジュール状態（dict）を保存するストアの共通インターフェース"""
+
+    def load(self, account_ids) -> dict[str, dict]:
+        """指定アカウントの保存済み状態を返す（保存されていないアカウントは含まない）"""
+        raise NotImplementedError
+
+    def save(self, states: dict[str, dict]):
+        """アカウントごとの状態を上書き保存"""
+        raise NotImplementedError
+
+    def delete(self, account_ids):
+        """アカウントの状態を削除（設定から削除された場合）"""
+        raise NotImplementedError
+
+
+class JsonScheduleStore(ScheduleStore):
+    """1プロセス用: 全アカウントの状態を1つのJSONファイルに保存"""
+
+    def __init__(self, path: Path, clock: Clock = None):
+        self.path = Path(path)
+        self.clock = clock or SYSTEM_CLOCK
+        self._states: dict[str, dict] | None = None
+
+    def _all(self) -> dict[str, dict]:
+        if self._states is None:
+            self._states = {}
+            if self.path.exists():
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._states = json.load(f).get("accounts", {})
+                except (OSError, json.JSONDecodeError) as e:
+                    logger.warning(
+                        f"スケジュールの保存ファイルを読み込めません: {e}"
+                    )
+        return self._states
+
+    def load(self, account_ids) -> dict[str, dict]:
+        states = self._all()
+        return {a: states[a] for a in account_ids if a in states}
+
+    def save(self, states: dict[str, dict]):
+        self._all().update(states)
+        self._write()
+
+    def delete(self, account_ids):
+        states = self._all()
+        for account_id in account_ids:
+            states.pop(account_id, None)
+        self._write()
+
+    def _write(self):
+        data = {
+            "saved_at": self.clock.now(timezone.utc).isoformat(),
+            "accounts": self._all(),
+        }
+        self.path.parent.mkdir(exist_ok=True)
+        atomic_write_text(
+            self.path, json.dumps(data, ensure_ascii=False, indent=2)
+        )
+
+
+class SqliteScheduleStore(ScheduleStore):
+    """
+    複数ワーカー用: アカウント単位の行としてSQLite（WALモード）に保存
+
+    アカウントの担当ワーカーが替わっても、新しい担当が同じ状態を引き継げる。
+    """
+
+    def __init__(self, path: Path, clock: Clock = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True)
+        self.clock = clock or SYSTEM_CLOCK
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS schedule_state ("
+            " account_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def load(self, account_ids) -> dict[str, dict]:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        placeholders = ", ".join("?" * len(account_ids))
+        rows = self._conn.execute(
+            "SELECT account_id, state FROM schedule_state"
+            f" WHERE account_id IN ({placeholders})",
+            account_ids,
+        ).fetchall()
+        return {account_id: json.loads(state) for account_id, state in rows}
+
+    def save(self, states: dict[str, dict]):
+        now = self.clock.time()
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO schedule_state (account_id, state, updated_at)"
+                " VALUES (?, ?, ?)"
+                " ON CONFLICT(account_id) DO UPDATE SET"
+                " state = excluded.state, updated_at = excluded.updated_at",
+                [
+                    (account_id, json.dumps(state, ensure_ascii=False), now)
+                    for account_id, state in states.items()
+                ],
+            )
+
+    def delete(self, account_ids):
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "DELETE FROM schedule_state WHERE account_id = ?",
+                [(account_id,) for account_id in account_ids],
+            )
+
+    def close(self):
+        self._conn.close()
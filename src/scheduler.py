@@ -1,89 +1,225 @@
 """スケジュール管理モジュール - コアタイム内のランダム投稿時刻を生成"""
 
-import random
+import heapq
+import itertools
+import json
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 from zoneinfo import ZoneInfo
 
+from src.clock import SYSTEM_CLOCK, Clock
+from src.quota import QuotaManager
+from src.schedule_store import ScheduleStore
+from src.slot_sampler import (
+    DEFAULT_MIN_INTERVAL_HOURS, day_profile, day_windows, post_count,
+    sample_slots,
+)
+
 logger = logging.getLogger("x-auto-poster")
 
+# 取りこぼした投稿枠の扱い（schedule.catch_up）
+CATCH_UP_POST = "post"   # 猶予時間内なら遅れて投稿する
+CATCH_UP_SKIP = "skip"   # 許容誤差を超えたら投稿しない
+DEFAULT_CATCH_UP_GRACE_MINUTES = 30
+# 何日先までスケジュールを作っておくか（schedule.lookahead_days）
+DEFAULT_LOOKAHEAD_DAYS = 1
+# 再起動前に取りこぼした枠を再実行する間隔（秒、全アカウント共通）
+DEFAULT_REPLAY_INTERVAL_SECONDS = 30
+# 消化済みの枠を状態ファイルに残す期間
+CONSUMED_RETENTION = timedelta(days=1)
+
+# 消化済みの枠の結果
+SLOT_TAKEN = "taken"      # 投稿処理に渡した
+SLOT_SKIPPED = "skipped"  # 遅延しすぎて見送った
+
 
 class PostScheduler:
     """各アカウントの投稿スケジュールを管理"""
 
-    def __init__(self):
+    def __init__(self, tolerance_seconds: int = 120,
+                 state_store: ScheduleStore = None,
+                 replay_interval_seconds: float =
+                 DEFAULT_REPLAY_INTERVAL_SECONDS,
+                 owns=None, clock: Clock = None,
+                 quota: QuotaManager = None):
+        """
+        Args:
+            tolerance_seconds: 投稿時刻の許容誤差（秒）
+            state_store: スケジュールの保存先（省略時は保存しない）
+            replay_interval_seconds: 再起動前に取りこぼした枠を再実行する間隔
+            owns: account_id を担当中か返す関数（ワーカーモード）。
+                担当していないアカウントの状態は保存しない
+            clock: 現在時刻の取得元（シミュレーションでは仮想時刻）
+            quota: 指定すると月間予算に合わせて1日の投稿枠数を減らす
+        """
         self.schedules: dict[str, list[datetime]] = {}
+        # スケジュールを生成したローカル日付
+        self.schedule_dates: dict[str, object] = {}
+        self.tolerance_seconds = tolerance_seconds
+        # 全アカウント共通の最小ヒープ: (UNIX時刻, 連番, account_id, 予定時刻)
+        self._heap: list[tuple[float, int, str, datetime]] = []
+        # 日付切り替え（各アカウントのローカル0時）のヒープ: (UNIX時刻, 連番, account_id)
+        self._rollover_heap: list[tuple[float, int, str]] = []
+        self._next_rollover: dict[str, float] = {}
+        # スレッド投稿ジョブの次ステップ: (UNIX時刻, 連番, job_id)
+        self._thread_heap: list[tuple[float, int, str]] = []
+        self._catch_up: dict[str, tuple[str, float]] = {}
+        # スケジュールを生成済みの最終日と、その最後の枠（日をまたぐ間隔の確保用）
+        self._generated_until: dict[str, date] = {}
+        self._last_slot: dict[str, float] = {}
+        # 消化済みの枠: [(予定時刻, SLOT_TAKEN / SLOT_SKIPPED), ...]
+        self._consumed: dict[str, list[tuple[datetime, str]]] = {}
+        # requeue() で再投入した延期中の投稿（元の枠は消化済みに記録済み）
+        self._retries: dict[str, set[datetime]] = {}
+        # スケジュール生成に使った設定（再起動時に設定変更を検知する）
+        self._fingerprints: dict[str, str] = {}
+        self.state_store = state_store
+        self.replay_interval_seconds = replay_interval_seconds
+        self.owns = owns
+        self.clock = clock or SYSTEM_CLOCK
+        self.quota = quota
+        # 前回の保存以降に変更・削除されたアカウント
+        self._dirty: set[str] = set()
+        self._removed: set[str] = set()
+        self._seq = itertools.count()
+        self._tz_cache: dict[str, ZoneInfo] = {}
+
+    def _get_tz(self, timezone: str) -> ZoneInfo:
+        """ZoneInfoをキャッシュして返す"""
+        tz = self._tz_cache.get(timezone)
+        if tz is None:
+            tz = self._tz_cache[timezone] = ZoneInfo(timezone)
+        return tz
 
     def generate_daily_schedule(self, account_id: str,
-                                schedule_config: dict) -> list[datetime]:
+                                schedule_config: dict,
+                                keep_consumed: bool = False) -> list[datetime]:
         """
-        1日分の投稿スケジュールを生成
+        当日から lookahead_days 日分の投稿スケジュールを作り直す
 
         Args:
             account_id: アカウント識別子
             schedule_config: schedule設定
+            keep_consumed: Trueなら消化済みの枠と延期中の再試行を引き継ぎ、
+                当日分は消化済みの枠数を差し引いて抽選する（設定変更の反映用）
 
         Returns:
-            投稿予定時刻のリスト（UTCのdatetime）
+            投稿予定時刻のリスト（タイムゾーン付きdatetime）
         """
-        tz = ZoneInfo(schedule_config["timezone"])
-        now_local = datetime.now(tz)
-        today = now_local.date()
+        # 古いヒープ要素は schedules に存在しないため、取り出し時に読み捨てる
+        retries = self._retries.pop(account_id, set())
+        consumed = self._consumed.pop(account_id, [])
+        pending = self.schedules.get(account_id, [])
+        self.schedules[account_id] = []
+        self._generated_until.pop(account_id, None)
+        self._last_slot.pop(account_id, None)
+        if keep_consumed:
+            self._consumed[account_id] = consumed
+            if consumed:
+                # 投稿済みの枠から min_interval_hours 以上空ける
+                self._last_slot[account_id] = max(
+                    t.timestamp() for t, _ in consumed
+                )
+            # 再試行の枠はヒープに残っているため schedules に戻すだけでよい
+            kept = [t for t in pending if t in retries]
+            if kept:
+                self.schedules[account_id] = kept
+                self._retries[account_id] = set(kept)
+        self.extend_schedule(account_id, schedule_config)
+        return list(self.schedules[account_id])
 
-        posts_per_day = schedule_config.get("posts_per_day", 4)
-        # 3〜5の範囲でランダムに変動させる
-        actual_posts = random.randint(
-            max(3, posts_per_day - 1),
-            min(5, posts_per_day + 1)
-        )
-
-        core_start = schedule_config.get("core_hours_start", 8)
-        core_end = schedule_config.get("core_hours_end", 22)
-        min_interval = schedule_config.get("min_interval_hours", 2)
+    def extend_schedule(self, account_id: str,
+                        schedule_config: dict) -> list[datetime]:
+        """
+        まだ生成していない日のスケジュールを追加する（日付切り替え時）
 
-        # コアタイム内でランダムな時刻を生成
-        times = []
-        available_minutes = list(range(core_start * 60, core_end * 60))
+        生成済みの日の予定は変えないため、lookahead_days が2以上なら
+        翌日以降の予定は前日までに決まっている。
 
-        for _ in range(actual_posts):
-            if not available_minutes:
-                break
+        Returns:
+            追加した投稿予定時刻のリスト
+        """
+        tz = self._get_tz(schedule_config["timezone"])
+        now_local = self.clock.now(tz)
+        today = now_local.date()
+        lookahead = max(
+            1, schedule_config.get("lookahead_days", DEFAULT_LOOKAHEAD_DAYS)
+        )
 
-            minute = random.choice(available_minutes)
-            hour = minute // 60
-            mins = minute % 60
-            # 秒もランダムに（bot感を減らす）
-            secs = random.randint(0, 59)
+        day = today
+        generated_until = self._generated_until.get(account_id)
+        if generated_until is not None and generated_until >= today:
+            day = generated_until + timedelta(days=1)
 
-            post_time = datetime(
-                today.year, today.month, today.day,
-                hour, mins, secs,
-                tzinfo=tz
+        added = []
+        while day < today + timedelta(days=lookahead):
+            times = self._sample_day(account_id, schedule_config, day, tz)
+            # 既に過ぎた時刻を除外（サービス再起動時対応）
+            times = [t for t in times if t > now_local]
+            added.extend(times)
+            self._generated_until[account_id] = day
+            logger.info(
+                f"[{account_id}] {day} のスケジュール生成: {len(times)}件 "
+                f"({schedule_config['timezone']}) "
+                + ", ".join(t.strftime("%H:%M:%S") for t in times)
             )
+            day += timedelta(days=1)
 
-            # この時刻の前後min_interval時間を除外
-            exclude_start = minute - (min_interval * 60)
-            exclude_end = minute + (min_interval * 60)
-            available_minutes = [
-                m for m in available_minutes
-                if m < exclude_start or m > exclude_end
-            ]
-
-            times.append(post_time)
-
+        times = self.schedules.setdefault(account_id, [])
+        times.extend(added)
         times.sort()
-        # 既に過ぎた時刻を除外（サービス再起動時対応）
-        times = [t for t in times if t > now_local]
-        self.schedules[account_id] = times
+        self.schedule_dates[account_id] = today
+        for t in added:
+            heapq.heappush(
+                self._heap,
+                (t.timestamp(), next(self._seq), account_id, t)
+            )
+
+        # 次のローカル0時に翌日以降の分を追加する
+        next_midnight = datetime.combine(
+            today + timedelta(days=1), time(0), tzinfo=tz
+        ).timestamp()
+        self._next_rollover[account_id] = next_midnight
+        heapq.heappush(
+            self._rollover_heap,
+            (next_midnight, next(self._seq), account_id)
+        )
 
-        logger.info(
-            f"[{account_id}] 本日のスケジュール生成: {len(times)}件 "
-            f"({schedule_config['timezone']})"
+        self._catch_up[account_id] = (
+            schedule_config.get("catch_up", CATCH_UP_POST),
+            schedule_config.get(
+                "catch_up_grace_minutes", DEFAULT_CATCH_UP_GRACE_MINUTES
+            ) * 60,
         )
-        for t in times:
-            logger.info(f"  → {t.strftime('%H:%M:%S %Z')}")
+        self._fingerprints[account_id] = _fingerprint(schedule_config)
+        self._dirty.add(account_id)
+        return added
 
-        return times
+    def _sample_day(self, account_id: str, schedule_config: dict,
+                    day: date, tz: ZoneInfo) -> list[datetime]:
+        """1日分の投稿時刻を抽選（weekday / weekend の設定を適用、予算で枠数を制限）"""
+        profile = day_profile(schedule_config, day)
+        # 作り直した日は消化済みの枠（投稿・見送り）の分を差し引く
+        done = sum(
+            1 for t, _ in self._consumed.get(account_id, ())
+            if t.astimezone(tz).date() == day
+        )
+        count = max(0, post_count(profile) - done)
+        if self.quota is not None:
+            count = self.quota.daily_allowance(account_id, day, count)
+        min_gap = int(
+            profile.get("min_interval_hours", DEFAULT_MIN_INTERVAL_HOURS)
+            * 3600
+        )
+        # 前日の最後の枠から min_interval_hours 以上空ける
+        last = self._last_slot.get(account_id)
+        slots = sample_slots(
+            day_windows(profile, day, tz), count, min_gap,
+            not_before=None if last is None else int(last) + min_gap,
+        )
+        if slots:
+            self._last_slot[account_id] = slots[-1]
+        return [datetime.fromtimestamp(ts, tz) for ts in slots]
 
     def get_next_post_time(self, account_id: str,
                            timezone: str) -> datetime | None:
@@ -91,8 +227,7 @@ class PostScheduler:
         if account_id not in self.schedules:
             return None
 
-        tz = ZoneInfo(timezone)
-        now = datetime.now(tz)
+        now = self.clock.now(self._get_tz(timezone))
 
         for t in self.schedules[account_id]:
             if t > now:
@@ -100,6 +235,16 @@ class PostScheduler:
 
         return None
 
+    def upcoming(self, account_id: str, within_seconds: float,
+                 now: datetime = None) -> list[datetime]:
+        """指定秒数以内に予定されている未消化の投稿枠"""
+        now = now or self.clock.now(dt_timezone.utc)
+        limit = now + timedelta(seconds=within_seconds)
+        return [
+            t for t in list(self.schedules.get(account_id, ()))
+            if t <= limit
+        ]
+
     def should_post_now(self, account_id: str, timezone: str,
                         tolerance_seconds: int = 120) -> bool:
         """
@@ -116,18 +261,347 @@ class PostScheduler:
         if account_id not in self.schedules:
             return False
 
-        tz = ZoneInfo(timezone)
-        now = datetime.now(tz)
+        now = self.clock.now(self._get_tz(timezone))
 
         for i, t in enumerate(self.schedules[account_id]):
             diff = abs((now - t).total_seconds())
             if diff <= tolerance_seconds:
                 # 使用済みとしてマーク（リストから除去）
                 self.schedules[account_id].pop(i)
+                self._consumed.setdefault(account_id, []).append(
+                    (t, SLOT_TAKEN)
+                )
+                self._dirty.add(account_id)
                 return True
 
         return False
 
+    def remove_account(self, account_id: str):
+        """アカウントの予定をすべて破棄（設定から削除された場合）"""
+        self._forget(account_id)
+        self._dirty.discard(account_id)
+        self._removed.add(account_id)
+
+    def release_account(self, account_id: str):
+        """
+        アカウントの担当を外れる（保存した状態は残し、新しい担当が引き継ぐ）
+
+        リースを解放する前に save_state() で変更を保存しておくこと。
+        """
+        self._dirty.discard(account_id)
+        self._forget(account_id)
+
+    def _forget(self, account_id: str):
+        # ヒープに残った要素は schedules に存在しないため取り出し時に読み捨てる
+        self.schedules.pop(account_id, None)
+        self.schedule_dates.pop(account_id, None)
+        self._next_rollover.pop(account_id, None)
+        self._catch_up.pop(account_id, None)
+        self._generated_until.pop(account_id, None)
+        self._last_slot.pop(account_id, None)
+        self._consumed.pop(account_id, None)
+        self._retries.pop(account_id, None)
+        self._fingerprints.pop(account_id, None)
+
+    def requeue(self, account_id: str, retry_at: datetime):
+        """
+        延期された投稿を再試行時刻に再投入
+
+        元の枠は取り出した時点で消化済みに記録しているため、
+        再試行の枠は pop_due() で取り出しても消化済みに数えない。
+        """
+        self.schedules.setdefault(account_id, []).append(retry_at)
+        self._retries.setdefault(account_id, set()).add(retry_at)
+        self.schedules[account_id].sort()
+        heapq.heappush(
+            self._heap,
+            (retry_at.timestamp(), next(self._seq), account_id, retry_at)
+        )
+        self._dirty.add(account_id)
+
+    def _take_retry(self, account_id: str, t: datetime) -> bool:
+        """t が requeue() で再投入した枠なら記録から外して True を返す"""
+        retries = self._retries.get(account_id)
+        if not retries or t not in retries:
+            return False
+        retries.discard(t)
+        return True
+
+    # --- 永続化 ---
+
+    def save_state(self, force: bool = False):
+        """
+        変更のあったアカウントの未消化・消化済みの枠を state_store に保存する
+
+        pop_due() は枠を取り出した直後に保存するため、投稿中に停止しても
+        再起動後に同じ枠を二重に投稿することはない。
+
+        Args:
+            force: Trueなら変更の有無にかかわらず全アカウントを保存
+        """
+        if self.state_store is None:
+            return
+        dirty = set(self.schedules) if force else self._dirty
+        # リースを失ったアカウントの状態は新しい担当が書き込む
+        states = {
+            account_id: self._account_state(account_id)
+            for account_id in dirty
+            if account_id in self.schedules
+            and (self.owns is None or self.owns(account_id))
+        }
+        if states:
+            self.state_store.save(states)
+        if self._removed:
+            self.state_store.delete(self._removed)
+        self._dirty = set()
+        self._removed = set()
+
+    def _account_state(self, account_id: str) -> dict:
+        cutoff = self.clock.now(dt_timezone.utc) - CONSUMED_RETENTION
+        consumed = [
+            (t, outcome)
+            for t, outcome in self._consumed.get(account_id, ())
+            if t >= cutoff
+        ]
+        self._consumed[account_id] = consumed
+        pending = self.schedules[account_id]
+        generated_until = self._generated_until.get(account_id)
+        return {
+            "config": self._fingerprints.get(account_id),
+            "generated_until": (
+                generated_until.isoformat() if generated_until else None
+            ),
+            "last_slot": self._last_slot.get(account_id),
+            "pending": [t.isoformat() for t in pending],
+            "retries": sorted(
+                t.isoformat()
+                for t in self._retries.get(account_id, ()) if t in pending
+            ),
+            "consumed": [
+                {"at": t.isoformat(), "outcome": outcome}
+                for t, outcome in consumed
+            ],
+        }
+
+    def restore_state(self, accounts: dict[str, dict],
+                      now: datetime = None) -> set[str]:
+        """
+        保存したスケジュールを読み込む（起動時・ワーカーが担当を引き継いだ時）
+
+        schedule 設定が保存時と同じアカウントだけ復元し、その日の予定を
+        抽選し直さない（再起動で投稿数が変わらない）。停止中に過ぎた枠は
+        catch_up 設定の猶予内なら replay_interval_seconds 間隔で順に再実行し、
+        それ以外は見送る。
+
+        Args:
+            accounts: accounts.yaml の accounts
+            now: 現在時刻（省略時は現在のUTC時刻）
+
+        Returns:
+            復元したアカウントIDの集合（それ以外は generate_daily_schedule が必要）
+        """
+        if self.state_store is None:
+            return set()
+        saved = self.state_store.load(accounts.keys())
+
+        now = now or self.clock.now(dt_timezone.utc)
+        restored = set()
+        missed = []
+        for account_id, acc_config in accounts.items():
+            state = saved.get(account_id)
+            schedule_config = acc_config["schedule"]
+            if (not state or state.get("config")
+                    != _fingerprint(schedule_config)):
+                continue
+            tz = self._get_tz(schedule_config["timezone"])
+            pending = [
+                datetime.fromisoformat(s).astimezone(tz)
+                for s in state.get("pending", ())
+            ]
+            self.schedules[account_id] = []
+            self._consumed[account_id] = [
+                (datetime.fromisoformat(c["at"]).astimezone(tz), c["outcome"])
+                for c in state.get("consumed", ())
+            ]
+            retries = {
+                datetime.fromisoformat(s).astimezone(tz)
+                for s in state.get("retries", ())
+            }
+            if retries:
+                self._retries[account_id] = retries
+            if state.get("generated_until"):
+                self._generated_until[account_id] = date.fromisoformat(
+                    state["generated_until"]
+                )
+            if state.get("last_slot") is not None:
+                self._last_slot[account_id] = state["last_slot"]
+
+            # 停止中に日付が変わっていれば不足している日を追加する
+            self.extend_schedule(account_id, schedule_config)
+            times = self.schedules[account_id]
+            for t in pending:
+                if t > now:
+                    times.append(t)
+                    heapq.heappush(
+                        self._heap,
+                        (t.timestamp(), next(self._seq), account_id, t)
+                    )
+                else:
+                    missed.append((t, account_id))
+            times.sort()
+            restored.add(account_id)
+            self._dirty.add(account_id)
+            logger.info(
+                f"[{account_id}] 保存したスケジュールを復元: 残り{len(times)}件"
+            )
+
+        self._replay_missed(sorted(missed), now)
+        return restored
+
+    def _replay_missed(self, missed: list[tuple[datetime, str]],
+                       now: datetime):
+        """停止中に過ぎた枠を猶予内なら間隔を空けて再実行、それ以外は見送る"""
+        now_ts = now.timestamp()
+        replay_at = now_ts
+        for t, account_id in missed:
+            delay = now_ts - t.timestamp()
+            policy, grace = self._catch_up.get(
+                account_id,
+                (CATCH_UP_POST, DEFAULT_CATCH_UP_GRACE_MINUTES * 60)
+            )
+            if delay > self.tolerance_seconds and (
+                policy != CATCH_UP_POST or delay > grace
+            ):
+                logger.warning(
+                    f"[{account_id}] 停止中に過ぎた投稿枠を見送り: "
+                    f"{t.strftime('%H:%M:%S %Z')} ({int(delay)}秒経過)"
+                )
+                if not self._take_retry(account_id, t):
+                    self._consumed[account_id].append((t, SLOT_SKIPPED))
+                continue
+            # 一度に投稿が集中しないよう、取りこぼした枠は1件ずつ間隔を空ける
+            logger.info(
+                f"[{account_id}] 停止中に過ぎた投稿枠を再実行: "
+                f"{t.strftime('%H:%M:%S %Z')} → "
+                f"{int(replay_at - now_ts)}秒後"
+            )
+            self.schedules[account_id].append(t)
+            self.schedules[account_id].sort()
+            heapq.heappush(
+                self._heap, (replay_at, next(self._seq), account_id, t)
+            )
+            replay_at += self.replay_interval_seconds
+
+    def pop_due(self, now: datetime = None) -> list[tuple[str, datetime]]:
+        """
+        投稿時刻に達した枠をヒープから取り出す
+
+        許容誤差（tolerance_seconds）を超えて遅れた枠は、アカウントごとの
+        catch_up 設定に従って遅延投稿するか読み捨てる。
+
+        Args:
+            now: 現在時刻（省略時は現在のUTC時刻）
+
+        Returns:
+            [(account_id, 予定時刻), ...]（予定時刻順）
+        """
+        now_ts = (now or self.clock.now(dt_timezone.utc)).timestamp()
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            ts, _, account_id, t = heapq.heappop(self._heap)
+            times = self.schedules.get(account_id)
+            if not times or t not in times:
+                continue  # 再生成や should_post_now で消費済み
+            times.remove(t)
+            self._dirty.add(account_id)
+            # 延期した投稿の再試行は元の枠として記録済み
+            retry = self._take_retry(account_id, t)
+
+            delay = now_ts - ts
+            if delay > self.tolerance_seconds:
+                policy, grace = self._catch_up.get(
+                    account_id,
+                    (CATCH_UP_POST, DEFAULT_CATCH_UP_GRACE_MINUTES * 60)
+                )
+                if policy != CATCH_UP_POST or delay > grace:
+                    logger.warning(
+                        f"[{account_id}] 投稿枠を見送り: "
+                        f"{t.strftime('%H:%M:%S %Z')} ({int(delay)}秒遅延)"
+                    )
+                    if not retry:
+                        self._consumed.setdefault(account_id, []).append(
+                            (t, SLOT_SKIPPED)
+                        )
+                    continue
+                logger.info(
+                    f"[{account_id}] 遅延した投稿枠を実行: "
+                    f"{t.strftime('%H:%M:%S %Z')} ({int(delay)}秒遅延)"
+                )
+            if not retry:
+                self._consumed.setdefault(account_id, []).append(
+                    (t, SLOT_TAKEN)
+                )
+            due.append((account_id, t))
+        # 投稿処理の前に保存する（途中で停止しても同じ枠を再実行しない）
+        self.save_state()
+        return due
+
+    def pop_rollovers(self, now: datetime = None) -> list[str]:
+        """ローカル日付が切り替わったアカウントを取り出す"""
+        now_ts = (now or self.clock.now(dt_timezone.utc)).timestamp()
+        rolled = []
+        while self._rollover_heap and self._rollover_heap[0][0] <= now_ts:
+            ts, _, account_id = heapq.heappop(self._rollover_heap)
+            # 再生成済みで次の0時が更新されていれば古い要素
+            if self._next_rollover.get(account_id) == ts:
+                del self._next_rollover[account_id]
+                rolled.append(account_id)
+        return rolled
+
+    def schedule_thread_step(self, job_id: str, at: float):
+        """スレッド投稿ジョブの次のステップをUNIX時刻 at に予約"""
+        heapq.heappush(self._thread_heap, (at, next(self._seq), job_id))
+
+    def pop_due_thread_steps(self, now: datetime = None) -> list[str]:
+        """実行時刻に達したスレッド投稿ジョブのIDを取り出す"""
+        now_ts = (now or self.clock.now(dt_timezone.utc)).timestamp()
+        due = []
+        while self._thread_heap and self._thread_heap[0][0] <= now_ts:
+            due.append(heapq.heappop(self._thread_heap)[2])
+        return due
+
+    def seconds_until_rollover(self, account_id: str,
+                               now: datetime = None) -> float | None:
+        """指定アカウントの次のローカル0時までの秒数"""
+        ts = self._next_rollover.get(account_id)
+        if ts is None:
+            return None
+        now_ts = (now or self.clock.now(dt_timezone.utc)).timestamp()
+        return max(0.0, ts - now_ts)
+
+    def seconds_until_next_event(self, now: datetime = None) -> float | None:
+        """次の投稿枠・スレッドの次ステップ・ローカル0時までの秒数（予定がなければNone）"""
+        while self._heap:
+            _, _, account_id, t = self._heap[0]
+            if t in self.schedules.get(account_id, ()):
+                break
+            heapq.heappop(self._heap)
+        while self._rollover_heap:
+            ts, _, account_id = self._rollover_heap[0]
+            if self._next_rollover.get(account_id) == ts:
+                break
+            heapq.heappop(self._rollover_heap)
+
+        candidates = [
+            h[0][0]
+            for h in (self._heap, self._rollover_heap, self._thread_heap)
+            if h
+        ]
+        if not candidates:
+            return None
+        now_ts = (now or self.clock.now(dt_timezone.utc)).timestamp()
+        return max(0.0, min(candidates) - now_ts)
+
     def is_schedule_done(self, account_id: str) -> bool:
         """本日のスケジュールが完了したか"""
         return (
@@ -141,6 +615,16 @@ class PostScheduler:
         for account_id, times in self.schedules.items():
             status[account_id] = {
                 "remaining": len(times),
+                "consumed": len(self._consumed.get(account_id, ())),
                 "next": times[0].isoformat() if times else None,
             }
         return status
+
+    def consumed_slots(self, account_id: str) -> list[tuple[datetime, str]]:
+        """消化済みの枠 [(予定時刻, SLOT_TAKEN / SLOT_SKIPPED), ...]"""
+        return list(self._consumed.get(account_id, ()))
+
+
+def _fingerprint(schedule_config: dict) -> str:
+    """schedule 設定の比較用文字列（保存時と設定が変わっていれば作り直す）"""
+    return json.dumps(schedule_config, sort_keys=True, default=str)
@@ -0,0 +1,242 @@
+"""シミュレーション - 仮想時刻でスケジューラーを動かし、投稿計画とAPI使用量を見積もる
+
+生成と投稿は X API・Claude API を呼ばないスタブに置き換え、所要時間の分だけ
+仮想時刻を進める。スケジューラーのループ（main.run_scheduler）はそのまま動かすため、
+投稿が集中したときの遅延・見送りも実際の運用と同じ規則で再現される。
+"""
+
+import random
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from src.clock import VirtualClock
+from src.quota import (
+    DEFAULT_INPUT_TOKENS_PER_TWEET, DEFAULT_OUTPUT_TOKENS_PER_TWEET,
+    QuotaManager, app_id,
+)
+from src.scheduler import PostScheduler, SLOT_SKIPPED, SLOT_TAKEN
+from src.slot_sampler import (
+    DEFAULT_MIN_INTERVAL_HOURS, day_profile, day_windows,
+)
+
+# 1回の生成・1ツイートの投稿にかかる時間の見積もり（秒）
+DEFAULT_GENERATION_SECONDS = 8.0
+DEFAULT_POST_SECONDS = 1.0
+# Publisher.post_thread のツイート間の待機
+THREAD_TWEET_INTERVAL_SECONDS = 2
+# 月間の見積もりに使う日数
+MONTH_DAYS = 30
+
+
+class SimulatedGenerator:
+    """TweetGenerator の代わり: 生成時間の分だけ仮想時刻を進めてダミー本文を返す"""
+
+    def __init__(self, clock: VirtualClock,
+                 generation_seconds: float = DEFAULT_GENERATION_SECONDS,
+                 quota: QuotaManager = None):
+        self.clock = clock
+        self.generation_seconds = generation_seconds
+        self.quota = quota
+        # アカウントごとの Claude API 呼び出し回数
+        self.requests: dict[str, int] = {}
+
+    def prepare(self, config: dict):
+        pass
+
+    def invalidate_prefix(self, account_id: str):
+        pass
+
+    def generate(self, account_id: str, config: dict,
+                 pending_texts: list[str] = None,
+                 spares: list = None) -> dict:
+        self.clock.advance(self.generation_seconds)
+        self.requests[account_id] = self.requests.get(account_id, 0) + 1
+        style = config["content"]["style"]
+        if self.quota is not None:
+            # トークン数は見積もり値（クォータの予算消化を再現するため）
+            self.quota.record_tokens(
+                account_id, DEFAULT_INPUT_TOKENS_PER_TWEET,
+                DEFAULT_OUTPUT_TOKENS_PER_TWEET
+            )
+        category = random.choice(config["content"]["categories"])["topic"]
+        text = f"[simulation] {account_id} #{self.requests[account_id]}"
+        if random.random() < style.get("thread_probability", 0):
+            texts = [
+                f"{text} ({i + 1})" for i in range(random.randint(2, 4))
+            ]
+            return {
+                "text": texts[0], "category": category,
+                "is_thread": True, "thread_texts": texts,
+            }
+        return {
+            "text": text, "category": category,
+            "is_thread": False, "thread_texts": [],
+        }
+
+
+class SimulatedPublisher:
+    """Publisher の代わり: 投稿時間の分だけ仮想時刻を進め、投稿時刻を記録する"""
+
+    def __init__(self, account_id: str, clock: VirtualClock,
+                 post_seconds: float = DEFAULT_POST_SECONDS,
+                 quota: QuotaManager = None, api_key: str = ""):
+        self.account_id = account_id
+        self.clock = clock
+        self.post_seconds = post_seconds
+        self.quota = quota
+        self.app_id = app_id(api_key)
+        # [(投稿開始のUNIX時刻, ツイート数), ...]
+        self.posts: list[tuple[float, int]] = []
+        self._ids = 0
+
+    def _post(self, text: str) -> dict:
+        self.clock.advance(self.post_seconds)
+        self._ids += 1
+        if self.quota is not None:
+            self.quota.record_post(self.account_id, self.app_id)
+        return {"id": f"sim-{self.account_id}-{self._ids}", "text": text}
+
+    def post_tweet(self, text: str, reply_to: str = None,
+                   max_retries: int = 3, defer: bool = False) -> dict:
+        self.posts.append((self.clock.time(), 1))
+        return self._post(text)
+
+    def post_thread(self, tweets: list[str]) -> list[dict]:
+        self.posts.append((self.clock.time(), len(tweets)))
+        results = []
+        for i, text in enumerate(tweets):
+            results.append(self._post(text))
+            if i < len(tweets) - 1:
+                self.clock.advance(THREAD_TWEET_INTERVAL_SECONDS)
+        return results
+
+    def verify_credentials(self) -> bool:
+        return True
+
+    def blocked_until(self) -> float:
+        return 0.0
+
+
+def _in_windows(ts: float, schedule_config: dict, tz: ZoneInfo) -> bool:
+    day = datetime.fromtimestamp(ts, tz).date()
+    profile = day_profile(schedule_config, day)
+    return any(
+        start <= ts < end for start, end in day_windows(profile, day, tz)
+    )
+
+
+def build_report(config: dict, scheduler: PostScheduler,
+                 generator: SimulatedGenerator,
+                 publishers: dict[str, SimulatedPublisher],
+                 start: float, end: float,
+                 quota: QuotaManager = None) -> dict:
+    """アカウントごとの投稿タイムライン・間隔の遵守状況・見送り・月間使用量を集計"""
+    days = (end - start) / 86400
+    accounts = {}
+    apps: dict[str, dict] = {}
+    for account_id, acc_config in config["accounts"].items():
+        schedule_config = acc_config["schedule"]
+        tz = ZoneInfo(schedule_config["timezone"])
+        posts = publishers[account_id].posts
+        consumed = scheduler.consumed_slots(account_id)
+        taken = [t for t, outcome in consumed if outcome == SLOT_TAKEN]
+
+        timeline: dict[str, list[str]] = {}
+        gaps, violations, outside = [], 0, 0
+        for i, (ts, tweets) in enumerate(posts):
+            local = datetime.fromtimestamp(ts, tz)
+            timeline.setdefault(local.strftime("%Y-%m-%d %a"), []).append(
+                local.strftime("%H:%M") + ("*" if tweets > 1 else "")
+            )
+            if not _in_windows(ts, schedule_config, tz):
+                outside += 1
+            if i:
+                gap = ts - posts[i - 1][0]
+                gaps.append(gap)
+                min_gap = day_profile(schedule_config, local.date()).get(
+                    "min_interval_hours", DEFAULT_MIN_INTERVAL_HOURS
+                ) * 3600
+                if gap < min_gap:
+                    violations += 1
+        # 同期ループでは取り出した枠の順に投稿される
+        drifts = [
+            ts - planned.timestamp()
+            for (ts, _), planned in zip(posts, taken)
+        ]
+
+        tweets = sum(n for _, n in posts)
+        requests = generator.requests.get(account_id, 0)
+        accounts[account_id] = {
+            "timezone": schedule_config["timezone"],
+            "timeline": timeline,
+            "posts": len(posts),
+            "threads": sum(1 for _, n in posts if n > 1),
+            "tweets": tweets,
+            "llm_requests": requests,
+            "min_gap_hours": round(min(gaps) / 3600, 2) if gaps else None,
+            "interval_violations": violations,
+            "outside_windows": outside,
+            "missed": sum(1 for _, o in consumed if o == SLOT_SKIPPED),
+            "quota_removed": (
+                quota.removed_slots.get(account_id, 0) if quota else 0
+            ),
+            "max_drift_seconds": round(max(drifts), 1) if drifts else None,
+            "monthly_tweets": round(tweets / days * MONTH_DAYS),
+            "monthly_llm_requests": round(requests / days * MONTH_DAYS),
+        }
+        # X の24時間上限はアプリ（API Key）単位でも数えられる
+        app = apps.setdefault(acc_config.get("api_key"), {
+            "accounts": [], "monthly_tweets": 0
+        })
+        app["accounts"].append(account_id)
+        app["monthly_tweets"] += accounts[account_id]["monthly_tweets"]
+
+    return {
+        "start": datetime.fromtimestamp(start).isoformat(timespec="minutes"),
+        "end": datetime.fromtimestamp(end).isoformat(timespec="minutes"),
+        "days": days,
+        "accounts": accounts,
+        "apps": list(apps.values()),
+        "monthly_tweets": sum(a["monthly_tweets"] for a in accounts.values()),
+        "monthly_llm_requests": sum(
+            a["monthly_llm_requests"] for a in accounts.values()
+        ),
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"シミュレーション: {report['start']} 〜 {report['end']} "
+        f"({report['days']:g}日、仮想時刻、* はスレッド投稿)"
+    )
+    for account_id, acc in report["accounts"].items():
+        print(f"\n--- {account_id} ({acc['timezone']}) ---")
+        for day, times in acc["timeline"].items():
+            print(f"  {day}  {' '.join(times)}")
+        print(
+            f"  投稿 {acc['posts']}件（スレッド {acc['threads']}件、"
+            f"ツイート {acc['tweets']}件） / 見送り {acc['missed']}件 / "
+            f"予算による削減 {acc['quota_removed']}件"
+        )
+        print(
+            f"  最短間隔 {acc['min_gap_hours']}時間 / "
+            f"最低間隔の違反 {acc['interval_violations']}件 / "
+            f"時間帯外 {acc['outside_windows']}件 / "
+            f"最大遅延 {acc['max_drift_seconds']}秒"
+        )
+        print(
+            f"  月間見込み: X {acc['monthly_tweets']}ツイート / "
+            f"Claude {acc['monthly_llm_requests']}リクエスト"
+        )
+
+    print(f"\n--- 月間見込み（{MONTH_DAYS}日換算）---")
+    for app in report["apps"]:
+        print(
+            f"  アプリ ({', '.join(app['accounts'])}): "
+            f"{app['monthly_tweets']}ツイート"
+        )
+    print(
+        f"  合計: X {report['monthly_tweets']}ツイート / "
+        f"Claude {report['monthly_llm_requests']}リクエスト"
+    )
+
@@ -0,0 +1,153 @@
+"""投稿枠サンプラー - 投稿可能な時間帯の中で最低間隔を保った投稿時刻を抽選
+
+時間帯を秒単位の区間として扱い、各区間に投稿数を割り当ててから区間内の
+配置を一様に抽選する。計算量は投稿数 k に対して O(k log k) で、
+分単位のリストを作り直す方式と違い時間帯の長さに依存しない。
+"""
+
+import random
+from datetime import date, datetime, time, timedelta, tzinfo
+
+DEFAULT_POSTS_PER_DAY = 4
+DEFAULT_POSTS_PER_DAY_JITTER = 1
+DEFAULT_CORE_HOURS_START = 8
+DEFAULT_CORE_HOURS_END = 22
+DEFAULT_MIN_INTERVAL_HOURS = 2
+# 土日（datetime.weekday() の値）
+DEFAULT_WEEKEND_DAYS = (5, 6)
+
+PROFILE_WEEKDAY = "weekday"
+PROFILE_WEEKEND = "weekend"
+
+
+def parse_clock(value) -> int:
+    """時刻設定を0時からの分に変換（8 / 8.5 / "08:30" / "24:00" を受け付ける）"""
+    if isinstance(value, str):
+        hours, _, minutes = value.partition(":")
+        return int(hours) * 60 + int(minutes or 0)
+    return int(round(float(value) * 60))
+
+
+def day_profile(schedule_config: dict, day: date) -> dict:
+    """曜日に応じた設定（schedule.weekday / schedule.weekend の上書きを適用）"""
+    weekend_days = schedule_config.get("weekend_days", DEFAULT_WEEKEND_DAYS)
+    key = PROFILE_WEEKEND if day.weekday() in weekend_days else PROFILE_WEEKDAY
+    return {**schedule_config, **(schedule_config.get(key) or {})}
+
+
+def day_windows(profile: dict, day: date, tz: tzinfo) -> list[tuple[int, int]]:
+    """
+    投稿可能な時間帯をUNIX秒の区間 [start, end) のリストで返す
+
+    windows が無ければ core_hours_start〜core_hours_end の1区間とする。
+    ローカル時刻で指定するため、夏時間の切り替え日は区間の長さが変わる。
+    """
+    windows = profile.get("windows") or [{
+        "start": profile.get("core_hours_start", DEFAULT_CORE_HOURS_START),
+        "end": profile.get("core_hours_end", DEFAULT_CORE_HOURS_END),
+    }]
+    midnight = datetime.combine(day, time(0))
+    result = []
+    for window in windows:
+        start, end = parse_clock(window["start"]), parse_clock(window["end"])
+        if end <= start:
+            continue
+        result.append((
+            int((midnight + timedelta(minutes=start))
+                .replace(tzinfo=tz).timestamp()),
+            int((midnight + timedelta(minutes=end))
+                .replace(tzinfo=tz).timestamp()),
+        ))
+    return sorted(result)
+
+
+def post_count(profile: dict, rng: random.Random = random) -> int:
+    """その日の投稿数（posts_per_day ± posts_per_day_jitter、1以上）"""
+    posts_per_day = profile.get("posts_per_day", DEFAULT_POSTS_PER_DAY)
+    if posts_per_day <= 0:
+        return 0
+    jitter = profile.get(
+        "posts_per_day_jitter", DEFAULT_POSTS_PER_DAY_JITTER
+    )
+    return max(1, rng.randint(posts_per_day - jitter, posts_per_day + jitter))
+
+
+def _to_real(block: list[tuple[int, int]], offset: int) -> int:
+    """区間を詰めた仮想座標から実際のUNIX秒に戻す"""
+    for start, end in block:
+        if offset < end - start:
+            return start + offset
+        offset -= end - start
+    raise ValueError("offset out of range")
+
+
+def sample_slots(windows: list[tuple[int, int]], count: int, min_gap: int,
+                 rng: random.Random = random,
+                 not_before: int = None) -> list[int]:
+    """
+    区間の和集合の中から、互いに min_gap 秒以上離れた count 個の時刻を抽選
+
+    1. 重なる・接する区間を合併し、間隔が min_gap 未満の区間どうしは
+       1つのブロックにまとめて間の空白を詰める
+       （詰めた座標で min_gap 離れていれば実際の時刻でも離れている）
+    2. 各ブロックの収容数を超えない範囲で、長さに比例して投稿数を割り当てる
+    3. ブロック内では n 個の基準点を [0, 長さ - (n-1)×min_gap] から抽選して
+       ソートし、i 番目に i×min_gap を足す（間隔を保つ配置を一様に抽選）
+
+    Args:
+        windows: 投稿可能な区間 [(start, end), ...]（UNIX秒、end は含まない）
+        count: 投稿数（収容できない分は減らす）
+        min_gap: 最低間隔（秒）
+        rng: 乱数生成器
+        not_before: これより前の時刻は使わない（前日の最後の枠との間隔用）
+
+    Returns:
+        UNIX秒の昇順リスト
+    """
+    min_gap = max(0, int(min_gap))
+    # 重なる・接する区間は先に1つにまとめる（重複を二重に数えない）
+    union: list[tuple[int, int]] = []
+    for start, end in sorted(windows):
+        if not_before is not None:
+            start = max(start, not_before)
+        if end <= start:
+            continue
+        if union and start <= union[-1][1]:
+            union[-1] = (union[-1][0], max(union[-1][1], end))
+        else:
+            union.append((start, end))
+
+    blocks: list[list[tuple[int, int]]] = []
+    for start, end in union:
+        if blocks and start - blocks[-1][-1][1] < min_gap:
+            blocks[-1].append((start, end))
+        else:
+            blocks.append([(start, end)])
+
+    sizes = [sum(end - start for start, end in block) for block in blocks]
+    caps = [
+        (size - 1) // min_gap + 1 if min_gap else size for size in sizes
+    ]
+    allocation = [0] * len(blocks)
+    if len(blocks) == 1:
+        allocation[0] = min(count, caps[0])
+    for _ in range(min(count, sum(caps)) - sum(allocation)):
+        candidates = [
+            i for i in range(len(blocks)) if allocation[i] < caps[i]
+        ]
+        i = rng.choices(
+            candidates, weights=[sizes[j] for j in candidates]
+        )[0]
+        allocation[i] += 1
+
+    slots = []
+    for block, size, n in zip(blocks, sizes, allocation):
+        if not n:
+            continue
+        span = size - 1 - (n - 1) * min_gap
+        bases = sorted(rng.randint(0, span) for _ in range(n))
+        slots.extend(
+            _to_real(block, base + i * min_gap)
+            for i, base in enumerate(bases)
+        )
+    return sorted(slots)
@@ -0,0 +1,144 @@
+"""X（Twitter）の重み付き文字数カウント - twitter-text v3 設定に準拠
+
+X は文字数を「重み」で数える。下表の範囲の文字は重み1、それ以外
+（CJK・全角記号など）は重み2、URLは長さに関係なく23、絵文字は
+結合シーケンス全体で2として数え、合計280以下であれば投稿できる。
+"""
+
+import re
+import unicodedata
+
+MAX_WEIGHTED_LENGTH = 280
+URL_WEIGHT = 23
+EMOJI_WEIGHT = 2
+DEFAULT_WEIGHT = 2
+
+# 重み1として数えるコードポイント範囲（twitter-text v3 の ranges）
+LIGHT_RANGES = (
+    (0x0000, 0x10FF),   # Latin / ギリシャ / キリル / ヘブライ / アラビア 等
+    (0x2000, 0x200D),   # スペース類
+    (0x2010, 0x201F),   # ダッシュ・引用符
+    (0x2032, 0x2037),   # プライム記号
+)
+
+_LIGHT_CLASS = "".join(
+    f"\\U{start:08x}-\\U{end:08x}" for start, end in LIGHT_RANGES
+)
+# 重み2の文字（上表以外）
+_HEAVY_RE = re.compile(f"[^{_LIGHT_CLASS}]")
+
+# URL（末尾の句読点・閉じ括弧はURLに含めない）
+_URL_PATTERN = (
+    r"(?:https?://|www\.)[^\s<>\"'\u3000、。「」（）]+"
+    r"(?<![.,:;!?)\]}'\"。、！？])"
+)
+# 絵文字シーケンス（異体字セレクタ・肌色修飾・ZWJ結合・国旗・キーキャップ）
+_EMOJI_BASE = (
+    "\U0001F000-\U0001FAFF\u2300-\u23FF\u2600-\u27BF\u2B00-\u2BFF"
+    "\u3030\u303D\u3297\u3299"
+)
+_EMOJI_MODIFIERS = "\uFE0F\U0001F3FB-\U0001F3FF"
+_EMOJI_PATTERN = (
+    "(?:[\U0001F1E6-\U0001F1FF]{2})"
+    "|(?:[0-9#*]\uFE0F?\u20E3)"
+    f"|(?:[{_EMOJI_BASE}][{_EMOJI_MODIFIERS}]*"
+    f"(?:\u200D[{_EMOJI_BASE}\u2640\u2642][{_EMOJI_MODIFIERS}]*)*)"
+)
+# URL・絵文字を含む可能性があるか（大半のツイートはここで高速パスに入る）
+_MAYBE_SPECIAL_RE = re.compile(
+    "://|www\\.|[\u20E3\u2300-\u2BFF\u3030\u303D\u3297\u3299"
+    "\U0001F000-\U0001FAFF]",
+    re.IGNORECASE
+)
+_URL_RE = re.compile(_URL_PATTERN, re.IGNORECASE)
+_SPECIAL_RE = re.compile(
+    f"(?P<url>{_URL_PATTERN})|(?P<emoji>{_EMOJI_PATTERN})", re.IGNORECASE
+)
+
+
+def normalize(text: str) -> str:
+    """X と同じくNFC正規化"""
+    return unicodedata.normalize("NFC", text)
+
+
+def _plain_weight(text: str) -> int:
+    # 重み1の文字数 + 重み2の文字数 = len + 重み2の文字数
+    return len(text) + len(_HEAVY_RE.findall(text))
+
+
+def _pieces(text: str):
+    """(部分文字列, 特殊トークンの重み or None) に分割（URL・絵文字は1トークン）"""
+    if not _MAYBE_SPECIAL_RE.search(text):
+        yield text, None
+        return
+    pos = 0
+    for m in _SPECIAL_RE.finditer(text):
+        if m.start() > pos:
+            yield text[pos:m.start()], None
+        yield m.group(), (
+            URL_WEIGHT if m.lastgroup == "url" else EMOJI_WEIGHT
+        )
+        pos = m.end()
+    if pos < len(text):
+        yield text[pos:], None
+
+
+def weighted_length(text: str) -> int:
+    """X の重み付き文字数"""
+    return sum(
+        _plain_weight(piece) if weight is None else weight
+        for piece, weight in _pieces(normalize(text))
+    )
+
+
+def is_within_limit(text: str, max_weight: int = MAX_WEIGHTED_LENGTH) -> bool:
+    """重み付き文字数が上限以内か"""
+    return weighted_length(text) <= max_weight
+
+
+def extract_urls(text: str) -> list[str]:
+    """本文中のURL（末尾の句読点を除いたもの）"""
+    return _URL_RE.findall(normalize(text))
+
+
+def extract_emojis(text: str) -> list[str]:
+    """本文中の絵文字（結合シーケンス単位）"""
+    text = normalize(text)
+    if not _MAYBE_SPECIAL_RE.search(text):
+        return []
+    return [
+        m.group() for m in _SPECIAL_RE.finditer(text)
+        if m.lastgroup == "emoji"
+    ]
+
+
+def fit_prefix(text: str, max_weight: int) -> str:
+    """重み付き文字数が max_weight 以内に収まる最長の先頭部分（URL・絵文字は途中で切らない）"""
+    text = normalize(text)
+    out = []
+    remaining = max_weight
+    for piece, weight in _pieces(text):
+        if weight is not None:
+            if weight > remaining:
+                break
+            out.append(piece)
+            remaining -= weight
+            continue
+
+        piece_weight = _plain_weight(piece)
+        if piece_weight <= remaining:
+            out.append(piece)
+            remaining -= piece_weight
+            continue
+
+        # 収まる最長の長さを二分探索（重みは長さに対して単調増加）
+        lo, hi = 0, min(len(piece), remaining)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if _plain_weight(piece[:mid]) <= remaining:
+                lo = mid
+            else:
+                hi = mid - 1
+        out.append(piece[:lo])
+        break
+    return "".join(out)
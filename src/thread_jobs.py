@@ -0,0 +1,169 @@
+"""スレッド投稿ジョブ - 1ツイートごとに進捗を保存し、中断しても再開できるようにする"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from src.history_store import atomic_write_text
+from src.logger import PostHistory
+from src.metrics import metrics
+
+logger = logging.getLogger("x-auto-poster")
+
+# スレッド内の投稿間隔（秒）
+THREAD_INTERVAL_SECONDS = 2
+# 失敗（レート制限以外の延期を含む）で再試行する回数と間隔（秒）
+MAX_STEP_FAILURES = 3
+STEP_RETRY_SECONDS = 60
+
+
+class ThreadJobStore:
+    """スレッド投稿ジョブの永続化（logs/thread_jobs.json）"""
+
+    def __init__(self, path: str = None):
+        if path is None:
+            path = Path(__file__).parent.parent / "logs" / "thread_jobs.json"
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True)
+        self._lock = threading.RLock()
+        self._jobs: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._jobs = json.load(f).get("jobs", {})
+
+    def _save(self):
+        atomic_write_text(
+            self.path,
+            json.dumps({"jobs": self._jobs}, ensure_ascii=False, indent=2)
+        )
+
+    def create(self, account_id: str, result: dict) -> dict:
+        """生成済みスレッドから新しいジョブを作成"""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "account": account_id,
+            "category": result["category"],
+            "texts": list(result["thread_texts"]),
+            "posted_ids": [],
+            "failures": 0,
+            "next_at": time.time(),
+            "created_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._save()
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self) -> list[dict]:
+        """未完了のジョブ一覧（再起動時の再開用）"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def checkpoint(self, job: dict):
+        """ジョブの進捗を保存"""
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._save()
+
+    def finish(self, job_id: str):
+        with self._lock:
+            if self._jobs.pop(job_id, None) is not None:
+                self._save()
+
+
+def _record_thread(job: dict, history: PostHistory):
+    """投稿済みのツイートがあれば履歴に記録（先頭ツイートのIDで記録）"""
+    if not job["posted_ids"]:
+        return
+    history.add(
+        account_id=job["account"],
+        tweet_text=job["texts"][0],
+        tweet_id=job["posted_ids"][0],
+        category=job["category"],
+    )
+
+
+def advance_thread_job(job: dict, pub, store: ThreadJobStore,
+                       history: PostHistory) -> float | None:
+    """
+    スレッドの次のツイートを1件だけ投稿する
+
+    投稿のたびに最後のツイートIDと残りのツイートを保存するため、
+    エラーや再起動の後も続きから再開できる。
+
+    Returns:
+        次のステップを実行するUNIX時刻（完了・中止ならNone）
+    """
+    account_id = job["account"]
+    index = len(job["posted_ids"])
+    total = len(job["texts"])
+    reply_to = job["posted_ids"][-1] if job["posted_ids"] else None
+
+    with metrics.timer(
+        "stage_duration_seconds", account=account_id, stage="thread_posting"
+    ):
+        outcome = pub.post_tweet(
+            job["texts"][index], reply_to=reply_to, defer=True
+        )
+
+    deferred = bool(outcome and outcome.get("deferred"))
+    # レート制限の延期は解除を待てば投稿できるため失敗に数えない
+    if outcome is None or (
+        deferred and outcome.get("reason", "rate_limit") != "rate_limit"
+    ):
+        job["failures"] += 1
+        if job["failures"] >= MAX_STEP_FAILURES:
+            # ジョブを終えるとアカウントのリースも手放せるようになる
+            logger.error(
+                f"❌ [{account_id}] スレッド投稿中止: {index + 1}/{total}で失敗"
+            )
+            _record_thread(job, history)
+            store.finish(job["job_id"])
+            metrics.inc("posts_total", account=account_id, result="failure")
+            return None
+
+    if deferred:
+        job["next_at"] = outcome["retry_at"]
+        store.checkpoint(job)
+        return job["next_at"]
+
+    if outcome is None:
+        job["next_at"] = time.time() + STEP_RETRY_SECONDS
+        store.checkpoint(job)
+        return job["next_at"]
+
+    job["posted_ids"].append(outcome["id"])
+    job["failures"] = 0
+    logger.info(
+        f"[{account_id}] スレッド {index + 1}/{total} 投稿: {outcome['id']}"
+    )
+
+    if len(job["posted_ids"]) >= total:
+        _record_thread(job, history)
+        store.finish(job["job_id"])
+        logger.info(
+            f"✅ [{account_id}] スレッド投稿完了: {job['posted_ids'][0]}"
+        )
+        metrics.inc("posts_total", account=account_id, result="success")
+        return None
+
+    job["next_at"] = time.time() + THREAD_INTERVAL_SECONDS
+    store.checkpoint(job)
+    return job["next_at"]
+
+
+def run_thread_job(job: dict, pub, store: ThreadJobStore,
+                   history: PostHistory):
+    """ジョブを完了まで同期実行（--once 用）"""
+    next_at = job["next_at"]
+    while next_at is not None:
+        time.sleep(max(0.0, next_at - time.time()))
+        next_at = advance_thread_job(job, pub, store, history)
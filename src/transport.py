@@ -0,0 +1,249 @@
+"""HTTPトランスポート - X API / Anthropic API の接続プールを全アカウントで共有
+
+アカウントごとに tweepy.Client を作っても、HTTPセッション（keep-alive接続）は
+プロセス全体で1つを共有する。接続・TLSハンドシェイク・最初の応答バイトまでの
+時間はリクエストごとにメトリクスへ記録する。
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from src.metrics import metrics
+
+logger = logging.getLogger("x-auto-poster")
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_X_READ_TIMEOUT = 30.0
+DEFAULT_ANTHROPIC_READ_TIMEOUT = 120.0
+
+# tweepy が送信先に使うオリジン（X_API_BASE_URL で差し替えられる）
+X_API_ORIGIN = "https://api.twitter.com"
+
+# http_phase_seconds 用のバケット（ハンドシェイクはミリ秒単位）
+PHASE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120
+)
+
+
+def transport_settings() -> dict:
+    """環境変数から接続プールとタイムアウトの設定を読む"""
+    return {
+        "x_pool_size": int(os.getenv("X_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        "anthropic_pool_size": int(
+            os.getenv("ANTHROPIC_POOL_SIZE", DEFAULT_POOL_SIZE)
+        ),
+        "connect_timeout": float(
+            os.getenv("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)
+        ),
+        "x_read_timeout": float(
+            os.getenv("X_READ_TIMEOUT", DEFAULT_X_READ_TIMEOUT)
+        ),
+        "anthropic_read_timeout": float(
+            os.getenv("ANTHROPIC_READ_TIMEOUT", DEFAULT_ANTHROPIC_READ_TIMEOUT)
+        ),
+        # ベンチマーク・検証用のスタブサーバー（tweepy はURLを固定しているため）
+        "x_api_base_url": os.getenv("X_API_BASE_URL") or None,
+    }
+
+
+def _observe_phase(service: str, phase: str, seconds: float):
+    metrics.observe(
+        "http_phase_seconds", seconds, buckets=PHASE_BUCKETS,
+        service=service, phase=phase
+    )
+
+
+# --- X API（requests / urllib3） ---
+
+# 送信中のリクエストで発生した新規接続の所要時間（スレッドごと）
+_handshakes = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _handshakes.connect = time.perf_counter() - start
+        return sock
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _handshakes.connect = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        # TCP接続（_new_conn）+ TLSハンドシェイク
+        start = time.perf_counter()
+        super().connect()
+        _handshakes.tls = time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """接続プールを持ち、既定のタイムアウトと接続フェーズの計測を行うアダプター"""
+
+    def __init__(self, service: str, timeout: tuple[float, float],
+                 pool_size: int = DEFAULT_POOL_SIZE, base_url: str = None):
+        self.service = service
+        self.timeout = timeout
+        # 指定すると X_API_ORIGIN 宛てのリクエストをこのURLに送る
+        self.base_url = base_url.rstrip("/") if base_url else None
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, timeout=None, **kwargs):
+        # tweepy はタイムアウトを指定しないため、ここで既定値を補う
+        if timeout is None:
+            timeout = self.timeout
+        if self.base_url and request.url.startswith(X_API_ORIGIN):
+            request.url = self.base_url + request.url[len(X_API_ORIGIN):]
+        # connect: TCP接続、tls: TCP接続 + TLSハンドシェイク（HTTPSのみ）
+        _handshakes.connect = None
+        _handshakes.tls = None
+        start = time.perf_counter()
+        try:
+            return super().send(request, timeout=timeout, **kwargs)
+        finally:
+            # send() はレスポンスヘッダー受信までを含む
+            elapsed = time.perf_counter() - start
+            connect = _handshakes.connect
+            handshake = _handshakes.tls or connect or 0.0
+            metrics.inc(
+                "http_connections_total", service=self.service,
+                reused="true" if connect is None else "false"
+            )
+            if connect is not None:
+                _observe_phase(self.service, "connect", connect)
+            if _handshakes.tls is not None:
+                _observe_phase(
+                    self.service, "tls",
+                    max(0.0, _handshakes.tls - (connect or 0.0))
+                )
+            _observe_phase(
+                self.service, "ttfb", max(0.0, elapsed - handshake)
+            )
+
+
+_x_session: requests.Session | None = None
+_lock = threading.Lock()
+
+
+def get_x_session() -> requests.Session:
+    """X API用の共有セッション（全アカウントの tweepy.Client で使う）"""
+    global _x_session
+    with _lock:
+        if _x_session is None:
+            settings = transport_settings()
+            adapter = TimedHTTPAdapter(
+                "x",
+                (settings["connect_timeout"], settings["x_read_timeout"]),
+                pool_size=settings["x_pool_size"],
+                base_url=settings["x_api_base_url"],
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _x_session = session
+            logger.debug(
+                f"X API接続プール作成: 最大{settings['x_pool_size']}接続"
+            )
+        return _x_session
+
+
+# --- Anthropic API（httpx） ---
+
+def _httpx_trace(service: str):
+    """httpcore のトレースイベントから接続・TLS・TTFBを計測するコールバック"""
+    started: dict[str, float] = {}
+    connected: list[bool] = []
+    phases = {
+        "connection.connect_tcp": "connect",
+        "connection.start_tls": "tls",
+        "http11.receive_response_headers": "ttfb",
+        "http2.receive_response_headers": "ttfb",
+    }
+
+    def trace(event_name: str, info: dict):
+        name, _, state = event_name.rpartition(".")
+        if name.endswith("send_request_headers") and state == "started":
+            # このリクエストで接続していなければ既存の接続を再利用している
+            metrics.inc(
+                "http_connections_total", service=service,
+                reused="false" if connected else "true"
+            )
+            return
+        phase = phases.get(name)
+        if phase is None:
+            return
+        if state == "started":
+            started[phase] = time.perf_counter()
+        elif state == "complete" and phase in started:
+            if phase == "connect":
+                connected.append(True)
+            _observe_phase(
+                service, phase, time.perf_counter() - started.pop(phase)
+            )
+
+    return trace
+
+
+_anthropic_client = None
+
+
+def get_anthropic_http_client():
+    """
+    Anthropic クライアント用の共有 httpx.Client（接続数上限・タイムアウト・計測付き）
+
+    httpx は anthropic の依存パッケージのため、ここで遅延importする。
+    """
+    global _anthropic_client
+    with _lock:
+        if _anthropic_client is None:
+            _anthropic_client = _create_anthropic_http_client()
+        return _anthropic_client
+
+
+def _create_anthropic_http_client():
+    import httpx
+
+    settings = transport_settings()
+
+    def on_request(request):
+        request.extensions["trace"] = _httpx_trace("anthropic")
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=settings["anthropic_pool_size"],
+            max_keepalive_connections=settings["anthropic_pool_size"],
+        ),
+        timeout=httpx.Timeout(
+            settings["anthropic_read_timeout"],
+            connect=settings["connect_timeout"],
+        ),
+        follow_redirects=True,
+        event_hooks={"request": [on_request]},
+    )
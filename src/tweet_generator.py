@@ -1,114 +1,478 @@
 """ツイート生成モジュール - Claude APIでツイートを自動生成"""
 
+import json
+import logging
 import random
+import re
+import time
+import httpx
 from anthropic import Anthropic
+from src.candidates import MIN_SPARE_SCORE, score_candidate
+from src.dedup import DuplicateIndex, DEFAULT_SIMILARITY_THRESHOLD
 from src.logger import PostHistory
+from src.metrics import metrics
+from src.model_router import (
+    GenerationUnavailable, LatencyBudgetExceeded, ModelRouter,
+    ROUTE_BATCH, ROUTE_SINGLE, ROUTE_THREAD, is_failover_error,
+)
+from src.quota import QuotaManager
+from src.text_weight import fit_prefix, weighted_length
+from src.transport import get_anthropic_http_client, transport_settings
+
+logger = logging.getLogger("x-auto-poster")
+
+# キャッシュ読み込みは通常の入力トークンの10%の料金
+CACHE_READ_SAVINGS_RATE = 0.9
+
+# プロンプトに含める直近投稿のヒント（件数・文字数）
+TOPIC_HINT_COUNT = 5
+TOPIC_HINT_CHARS = 40
+DEFAULT_MAX_REGENERATIONS = 2
+# 1回の呼び出しで生成する単一ツイートの候補数（style.candidates）
+DEFAULT_CANDIDATES = 1
+
+# ストリーミング生成で「明らかに超過」とみなす重み付き文字数の余裕
+# （トリム時にハッシュタグ除去・文の区切りを探せる分だけ余分に受け取る）
+STREAM_OVERFLOW_MARGIN = 40
+THREAD_SEPARATOR = "---"
+# 打ち切ったストリームの出力トークン数の見積もり（ASCIIは4文字で1トークン、
+# それ以外は1文字1トークンとして多めに数える）
+ASCII_CHARS_PER_TOKEN = 4
 
 
 class TweetGenerator:
     """Claude APIを使ったツイート生成"""
 
-    def __init__(self, api_key: str, history: PostHistory = None):
-        self.client = Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, history: PostHistory = None,
+                 base_url: str = None, dedup_index: DuplicateIndex = None,
+                 router: ModelRouter = None, quota: QuotaManager = None):
+        # base_url はローカルのスタブサーバーでの検証用
+        self.client = Anthropic(
+            api_key=api_key, base_url=base_url,
+            http_client=get_anthropic_http_client()
+        )
+        self.router = router or ModelRouter()
+        # トークン使用量を月間予算の管理に記録する
+        self.quota = quota
+        self._connect_timeout = transport_settings()["connect_timeout"]
         self.history = history or PostHistory()
+        self.dedup_index = dedup_index or DuplicateIndex(self.history)
+        # アカウントごとの固定プロンプト（ペルソナ・ルール）
+        self._prefixes: dict[str, list[dict]] = {}
+        # アカウントごとのプロンプトキャッシュ利用状況
+        self.cache_stats: dict[str, dict] = {}
+
+    def prepare(self, config: dict):
+        """設定読み込み時に全アカウントの固定プロンプトを構築"""
+        for account_id, acc_config in config["accounts"].items():
+            self._prefixes[account_id] = self.build_prompt_prefix(acc_config)
+
+    def invalidate_prefix(self, account_id: str):
+        """固定プロンプトを破棄（設定変更時）"""
+        self._prefixes.pop(account_id, None)
+
+    def _get_prefix(self, account_id: str, config: dict) -> list[dict]:
+        prefix = self._prefixes.get(account_id)
+        if prefix is None:
+            prefix = self._prefixes[account_id] = (
+                self.build_prompt_prefix(config)
+            )
+        return prefix
+
+    @staticmethod
+    def build_prompt_prefix(config: dict) -> list[dict]:
+        """
+        アカウント固有の固定プロンプト（systemブロック）を構築
+
+        ペルソナとルールは呼び出しごとに変わらないため、
+        cache_control を付けてプロンプトキャッシュの対象にする。
+        """
+        content_config = config["content"]
+        style = content_config["style"]
+        language = config.get("language", "en")
+
+        lang_instruction = {
+            "en": "Write in English.",
+            "ja": "日本語で書いてください。"
+        }.get(language, "Write in English.")
+
+        max_h = style.get("max_hashtags", 2)
+        hashtag_instruction = "Do NOT use hashtags."
+        if style.get("use_hashtags"):
+            hashtag_instruction = f"Include up to {max_h} relevant hashtags."
+
+        max_chars = style["max_characters"]
+        length_rule = (
+            f"Maximum {max_chars} characters per tweet "
+            "(this is strict - count carefully)"
+        )
+        if language == "ja":
+            # X は日本語（CJK）1文字を2文字として数える
+            length_rule = (
+                f"X counts each Japanese character as 2, so keep each tweet "
+                f"within {max_chars // 2} Japanese characters "
+                f"(weighted limit {max_chars}, URLs count as 23)"
+            )
+        rules = [
+            lang_instruction,
+            length_rule,
+            hashtag_instruction,
+        ]
+        if not style.get("use_emojis", False):
+            rules.append("Do NOT use any emojis.")
+        rules += [
+            "Be original, insightful, and engaging",
+            "Sound like a real person, not a corporate account or AI",
+            "Vary sentence structure and format "
+            "(questions, statements, observations, tips)",
+            'Do NOT start with "Just" or generic filler phrases',
+        ]
+
+        text = f"""You write posts for a single X (Twitter) account.
+
+<persona>
+{content_config['persona'].strip()}
+</persona>
+
+<rules>
+{chr(10).join(f"- {r}" for r in rules)}
+</rules>
+
+<thread_rules>
+- The first tweet should hook the reader
+- Each subsequent tweet should add value
+- The last tweet should have a takeaway or call to thought
+- Only the last tweet should have hashtags (max {max_h})
+</thread_rules>"""
+
+        return [{
+            "type": "text",
+            "text": text,
+            "cache_control": {"type": "ephemeral"},
+        }]
+
+    def _create_message(self, account_id: str, config: dict, prompt: str,
+                        max_tokens: int, stop_when=None,
+                        kind: str = ROUTE_SINGLE, category: str = None) -> str:
+        """
+        固定プロンプト + 可変部分でAPIを呼び出し、応答テキストを返す
+
+        モデルは ModelRouter が種類（kind）・カテゴリから選ぶ。過負荷・タイムアウト・
+        レイテンシ予算超過で失敗したら代替モデルで呼び直し、全て失敗したら
+        GenerationUnavailable を送出する。
+        style.stream が有効で stop_when が指定されていれば応答をストリーミングで
+        受け取り、stop_when(途中までのテキスト) が真になった時点で打ち切る。
+        """
+        models, budget = self.router.route(config, kind, category)
+        stream = stop_when is not None and config["content"]["style"].get(
+            "stream"
+        )
+        timeout = httpx.Timeout(
+            budget, connect=min(self._connect_timeout, budget)
+        )
+        error = None
+        for i, model in enumerate(models):
+            kwargs = {
+                "model": model,
+                "max_tokens": max_tokens,
+                "system": self._get_prefix(account_id, config),
+                "messages": [{"role": "user", "content": prompt}],
+                "timeout": timeout,
+            }
+            fallback_left = i < len(models) - 1
+            # 代替モデルがある間はSDKの自動リトライで予算を使い切らない
+            client = (
+                self.client.with_options(max_retries=0) if fallback_left
+                else self.client
+            )
+            start = time.perf_counter()
+            try:
+                if stream:
+                    text, usage = self._stream_message(
+                        client, account_id, kwargs, stop_when, start + budget
+                    )
+                else:
+                    response = client.messages.create(**kwargs)
+                    text, usage = response.content[0].text, response.usage
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                elapsed = time.perf_counter() - start
+                self.router.record_failure(model, elapsed, e)
+                logger.warning(
+                    f"[{account_id}] {model} で生成失敗 "
+                    f"({type(e).__name__}, {elapsed:.1f}秒)"
+                    + ("、代替モデルで再試行" if fallback_left else ""),
+                    extra={"account": account_id},
+                )
+                error = e
+                continue
+            self.router.record_success(
+                model, account_id, time.perf_counter() - start, usage
+            )
+            self._record_usage(account_id, usage)
+            return text.strip()
+        raise GenerationUnavailable(
+            f"全てのモデル ({', '.join(models)}) で生成に失敗: {error}"
+        ) from error
+
+    def _stream_message(self, client: Anthropic, account_id: str,
+                        kwargs: dict, stop_when, deadline: float):
+        """
+        ストリーミングで受信し、stop_when を満たしたら接続を閉じて打ち切る
+
+        deadline（perf_counter の値）を過ぎても受信中なら LatencyBudgetExceeded。
+
+        Returns:
+            (受信したテキスト, 使用量)
+        """
+        start = time.perf_counter()
+        text = ""
+        stopped = False
+        with client.messages.stream(**kwargs) as stream:
+            for delta in stream.text_stream:
+                now = time.perf_counter()
+                if not text:
+                    metrics.observe(
+                        "stage_duration_seconds", now - start,
+                        account=account_id, stage="first_token"
+                    )
+                text += delta
+                if stop_when(text):
+                    stopped = True
+                    break
+                if now > deadline:
+                    raise LatencyBudgetExceeded(
+                        f"{now - start:.1f}秒で未完了"
+                    )
+            usage = stream.current_message_snapshot.usage
+
+        if stopped:
+            # 出力トークン数は最後の message_delta で届くため、打ち切ると
+            # スナップショットにはほぼ0が残る。受信済みのテキストから見積もる
+            # （切断までにサーバー側で生成された分は含まれない）
+            usage = usage.model_copy(update={"output_tokens": max(
+                usage.output_tokens, self._estimate_tokens(text)
+            )})
+            metrics.inc("stream_early_stops_total", account=account_id)
+            logger.info(
+                f"[{account_id}] ストリーミング生成を打ち切り: "
+                f"出力 約{usage.output_tokens} トークン時点"
+            )
+        return text, usage
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """テキストのトークン数の見積もり（実際より少なくならないよう多めに数える）"""
+        ascii_chars = sum(1 for ch in text if ch.isascii())
+        return -(-ascii_chars // ASCII_CHARS_PER_TOKEN) + len(text) - ascii_chars
+
+    @staticmethod
+    def _single_overflowed(max_chars: int):
+        """単一ツイートが上限を明らかに超えたら真を返す判定関数"""
+        limit = max_chars + STREAM_OVERFLOW_MARGIN
+        return lambda text: weighted_length(text) > limit
+
+    @staticmethod
+    def _thread_completed(thread_count: int):
+        """
+        区切り線で閉じられたツイートが thread_count 件そろったら真を返す判定関数
+
+        プロンプトで最後のツイートの後にも区切り線を出力させるため、
+        thread_count 件目の区切り線を受信した時点で打ち切れる。
+        """
+        def check(text: str) -> bool:
+            parts = text.split(THREAD_SEPARATOR)[:-1]
+            return sum(1 for p in parts if p.strip()) >= thread_count
+        return check
+
+    def _record_usage(self, account_id: str, usage):
+        """プロンプトキャッシュのヒット状況とトークン削減量を記録"""
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        stats = self.cache_stats.setdefault(account_id, {
+            "calls": 0, "hits": 0, "input_tokens": 0, "output_tokens": 0,
+            "cache_read_tokens": 0, "cache_write_tokens": 0,
+            "saved_tokens": 0,
+        })
+        saved = int(cache_read * CACHE_READ_SAVINGS_RATE)
+        stats["calls"] += 1
+        stats["hits"] += 1 if cache_read else 0
+        stats["input_tokens"] += usage.input_tokens
+        stats["output_tokens"] += usage.output_tokens
+        stats["cache_read_tokens"] += cache_read
+        stats["cache_write_tokens"] += cache_write
+        stats["saved_tokens"] += saved
+        for kind, value in (
+            ("input", usage.input_tokens), ("output", usage.output_tokens),
+            ("cache_read", cache_read), ("cache_write", cache_write),
+        ):
+            metrics.inc("tokens_total", value, account=account_id, kind=kind)
+        if self.quota is not None:
+            self.quota.record_tokens(
+                account_id, usage.input_tokens + cache_read + cache_write,
+                usage.output_tokens
+            )
+
+        logger.info(
+            f"[{account_id}] プロンプトキャッシュ"
+            f"{'ヒット' if cache_read else 'ミス'}: "
+            f"入力 {usage.input_tokens} / 出力 {usage.output_tokens} / "
+            f"キャッシュ読込 {cache_read} / 書込 {cache_write} トークン "
+            f"(削減 {saved})",
+            extra={"account": account_id},
+        )
 
     def _select_category(self, categories: list) -> dict:
         """重み付きランダムでカテゴリを選択"""
         weights = [c.get("weight", 1) for c in categories]
         return random.choices(categories, weights=weights, k=1)[0]
 
-    def generate(self, account_id: str, config: dict) -> dict:
+    def _recent_context(self, account_id: str,
+                        pending_texts: list[str] = None) -> str:
+        """
+        直近の話題ヒントを作る
+
+        重複そのものは生成後に DuplicateIndex で判定するため、
+        プロンプトには直近数件の冒頭だけを話題の目安として含める。
+        """
+        hints = self.history.get_recent_texts(account_id, TOPIC_HINT_COUNT)
+        if pending_texts:
+            hints = hints + list(pending_texts)[-TOPIC_HINT_COUNT:]
+        if not hints:
+            return ""
+        return (
+            "\n\n<recent_topics>\n"
+            "以下の話題は最近扱ったので避けてください:\n"
+            + "\n".join(f"- {t[:TOPIC_HINT_CHARS]}" for t in hints)
+            + "\n</recent_topics>"
+        )
+
+    @staticmethod
+    def _result_text(result: dict) -> str:
+        """重複判定に使う本文（スレッドは全ツイートを連結）"""
+        if result["is_thread"]:
+            return "\n".join(result["thread_texts"])
+        return result["text"]
+
+    def _is_duplicate(self, account_id: str, config: dict, result: dict,
+                      pending_texts: list[str] = None) -> bool:
+        style = config["content"]["style"]
+        threshold = style.get("dedup_threshold", DEFAULT_SIMILARITY_THRESHOLD)
+        similarity = self.dedup_index.max_similarity(
+            account_id, self._result_text(result), pending_texts
+        )
+        if similarity >= threshold:
+            logger.warning(
+                f"[{account_id}] 類似投稿を検出 (類似度 {similarity:.2f}): "
+                f"{result['text'][:40]}..."
+            )
+            return True
+        return False
+
+    def generate(self, account_id: str, config: dict,
+                 pending_texts: list[str] = None,
+                 spares: list = None) -> dict:
         """
         ツイートを生成する
 
+        履歴・下書きと似すぎている場合は max_regenerations 回まで再生成し、
+        それでも似すぎていれば GenerationUnavailable を送出する。
+
         Args:
             account_id: アカウント識別子
             config: アカウントのcontent設定
+            pending_texts: 未投稿の下書き本文（重複防止のため履歴と同様に扱う）
+            spares: 指定すると、複数候補のうち採用しなかった良い候補を
+                generate() と同じ形式で追加する（下書きプール用）
 
         Returns:
             {"text": str, "category": str, "is_thread": bool, "thread_texts": list}
+
+        Raises:
+            GenerationUnavailable: 主モデル・代替モデルの全てで生成に失敗した、
+                候補生成の応答を解析できなかった、または再生成しても類似投稿だった
         """
-        content_config = config["content"]
-        style = content_config["style"]
-        category = self._select_category(content_config["categories"])
-        language = config.get("language", "en")
+        style = config["content"]["style"]
+        attempts = 1 + style.get(
+            "max_regenerations", DEFAULT_MAX_REGENERATIONS
+        )
+        for attempt in range(attempts):
+            with metrics.timer(
+                "stage_duration_seconds", account=account_id,
+                stage="generation"
+            ):
+                result = self._generate_once(
+                    account_id, config, pending_texts, spares
+                )
+            if not self._is_duplicate(
+                account_id, config, result, pending_texts
+            ):
+                return result
+            if attempt < attempts - 1:
+                logger.info(
+                    f"[{account_id}] 再生成 ({attempt + 1}/{attempts - 1})"
+                )
+        # 重複と分かっている投稿は出さない（下書きでの代替・見送りは呼び出し側）
+        logger.warning(
+            f"[{account_id}] {attempts}回生成しても類似投稿のため採用しません",
+            extra={"account": account_id},
+        )
+        raise GenerationUnavailable(
+            f"{attempts}回生成しても履歴・下書きとの類似度がしきい値以上"
+        )
 
-        # 直近の投稿を取得（重複防止用）
-        recent_texts = self.history.get_recent_texts(account_id, 15)
-        recent_context = ""
-        if recent_texts:
-            recent_context = (
-                "\n\n<recent_posts>\n"
-                "以下はこのアカウントの直近の投稿です。内容が重複しないようにしてください:\n"
-                + "\n".join(f"- {t}" for t in recent_texts)
-                + "\n</recent_posts>"
-            )
+    def _generate_once(self, account_id: str, config: dict,
+                       pending_texts: list[str] = None,
+                       spares: list = None) -> dict:
+        """重複チェックなしで1回生成"""
+        style = config["content"]["style"]
+        category = self._select_category(config["content"]["categories"])
+
+        # 直近の話題ヒント
+        recent_context = self._recent_context(account_id, pending_texts)
 
         # スレッド投稿判定
         is_thread = random.random() < style.get("thread_probability", 0)
 
         if is_thread:
             return self._generate_thread(
-                account_id, content_config, style, category,
-                language, recent_context
+                account_id, config, category, recent_context
             )
-        else:
-            return self._generate_single(
-                account_id, content_config, style, category,
-                language, recent_context
+
+        count = style.get("candidates", DEFAULT_CANDIDATES)
+        if count > 1:
+            return self._generate_candidates(
+                account_id, config, category, recent_context, count,
+                pending_texts, spares
             )
+        return self._generate_single(
+            account_id, config, category, recent_context
+        )
 
-    def _generate_single(self, account_id, content_config, style,
-                         category, language, recent_context) -> dict:
+    def _generate_single(self, account_id, config, category,
+                         recent_context) -> dict:
         """単一ツイートを生成"""
-        lang_instruction = {
-            "en": "Write the tweet in English.",
-            "ja": "ツイートは日本語で書いてください。"
-        }.get(language, "Write the tweet in English.")
-
-        hashtag_instruction = ""
-        if style.get("use_hashtags"):
-            max_h = style.get("max_hashtags", 2)
-            hashtag_instruction = f"Include up to {max_h} relevant hashtags."
-
-        emoji_instruction = ""
-        if not style.get("use_emojis", False):
-            emoji_instruction = "Do NOT use any emojis."
+        style = config["content"]["style"]
 
         prompt = f"""Generate a single tweet for the following topic.
 
-<persona>
-{content_config['persona']}
-</persona>
-
 <topic>{category['topic']}</topic>
 <topic_description>{category.get('description', '')}</topic_description>
-
-<rules>
-- {lang_instruction}
-- Maximum {style['max_characters']} characters (this is strict - count carefully)
-- {hashtag_instruction}
-- {emoji_instruction}
-- Be original, insightful, and engaging
-- Sound like a real person, not a corporate account or AI
-- Vary sentence structure and format (questions, statements, observations, tips)
-- Do NOT start with "Just" or generic filler phrases
-</rules>
 {recent_context}
 
 Output ONLY the tweet text. No quotes, no explanation, no preamble."""
 
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=300,
-            messages=[{"role": "user", "content": prompt}]
+        tweet_text = self._create_message(
+            account_id, config, prompt, 300,
+            stop_when=self._single_overflowed(style["max_characters"]),
+            category=category["topic"]
         )
 
-        tweet_text = response.content[0].text.strip()
-
         # 文字数チェック（超過時は再生成ではなくトリム）
-        if len(tweet_text) > style["max_characters"]:
-            tweet_text = self._trim_tweet(tweet_text, style["max_characters"])
+        tweet_text = self._trim_tweet(
+            tweet_text, style["max_characters"], account_id
+        )
 
         return {
             "text": tweet_text,
@@ -117,52 +481,124 @@ Output ONLY the tweet text. No quotes, no explanation, no preamble."""
             "thread_texts": [],
         }
 
-    def _generate_thread(self, account_id, content_config, style,
-                         category, language, recent_context) -> dict:
-        """スレッド（2〜4ツイート）を生成"""
-        lang_instruction = {
-            "en": "Write in English.",
-            "ja": "日本語で書いてください。"
-        }.get(language, "Write in English.")
-
-        thread_count = random.randint(2, 4)
+    def _generate_candidates(self, account_id, config, category,
+                             recent_context, count, pending_texts=None,
+                             spares=None) -> dict:
+        """
+        単一ツイートの候補を1回の呼び出しで count 件生成し、ローカルの採点で選ぶ
 
-        prompt = f"""Generate a Twitter thread of exactly {thread_count} tweets.
+        長さ・履歴との類似度・ハッシュタグ/絵文字ルール・カテゴリ一致で採点し、
+        最高点の候補を返す。採用しなかった候補のうち上限内でルールを守り、
+        MIN_SPARE_SCORE 以上のものは spares に追加する。
+        """
+        style = config["content"]["style"]
+        max_chars = style["max_characters"]
+        threshold = style.get("dedup_threshold", DEFAULT_SIMILARITY_THRESHOLD)
 
-<persona>
-{content_config['persona']}
-</persona>
+        prompt = f"""Generate {count} alternative tweets for the following topic.
+Each tweet must take a different angle and stand on its own.
 
 <topic>{category['topic']}</topic>
 <topic_description>{category.get('description', '')}</topic_description>
+{recent_context}
 
-<rules>
-- {lang_instruction}
-- Each tweet must be under {style['max_characters']} characters
-- The first tweet should hook the reader
-- Each subsequent tweet should add value
-- The last tweet should have a takeaway or call to thought
-- Sound natural, not like AI-generated content
-- Only the last tweet should have hashtags (max {style.get('max_hashtags', 2)})
-</rules>
+Output ONLY a JSON array of {count} strings: ["tweet text", ...]
+No markdown, no explanation."""
+
+        raw = self._create_message(
+            account_id, config, prompt, min(4000, 300 * count + 100),
+            category=category["topic"]
+        )
+        texts = self._parse_candidates(account_id, raw)
+
+        # 採点の高い順に、互いに似すぎていない候補だけを残す
+        scored = sorted(
+            (
+                (score_candidate(
+                    text, style, category,
+                    self.dedup_index.max_similarity(
+                        account_id, text, pending_texts
+                    )
+                ), text)
+                for text in texts
+            ),
+            key=lambda item: item[0]["score"], reverse=True
+        )
+        chosen = []
+        for score, text in scored:
+            if score["similarity"] >= threshold or (
+                chosen and self.dedup_index.max_similarity(
+                    account_id, text, [t for _, t in chosen]
+                ) >= threshold
+            ):
+                metrics.inc(
+                    "candidates_total", account=account_id, outcome="duplicate"
+                )
+                continue
+            chosen.append((score, text))
+
+        # 全候補が重複なら最高点を返し、generate() 側の再生成に任せる
+        best_score, best_text = chosen[0] if chosen else scored[0]
+        logger.info(
+            f"[{account_id}] 候補{len(texts)}件から選択 "
+            f"(スコア {best_score['score']:.2f}, "
+            f"類似度 {best_score['similarity']:.2f})"
+        )
+        metrics.inc("candidates_total", account=account_id, outcome="chosen")
+
+        for score, text in chosen[1:]:
+            # 上限超過・ルール違反の候補は下書きに残さない
+            if (spares is None or score["length"] == 0.0
+                    or score["rules"] < 1.0
+                    or score["score"] < MIN_SPARE_SCORE):
+                metrics.inc(
+                    "candidates_total", account=account_id,
+                    outcome="discarded"
+                )
+                continue
+            spares.append({
+                "text": text,
+                "category": category["topic"],
+                "is_thread": False,
+                "thread_texts": [],
+            })
+            metrics.inc("candidates_total", account=account_id, outcome="spare")
+
+        return {
+            "text": self._trim_tweet(best_text, max_chars, account_id),
+            "category": category["topic"],
+            "is_thread": False,
+            "thread_texts": [],
+        }
+
+    def _generate_thread(self, account_id, config, category,
+                         recent_context) -> dict:
+        """スレッド（2〜4ツイート）を生成"""
+        style = config["content"]["style"]
+        thread_count = random.randint(2, 4)
+
+        prompt = f"""Generate a Twitter thread of exactly {thread_count} tweets following the thread rules.
+
+<topic>{category['topic']}</topic>
+<topic_description>{category.get('description', '')}</topic_description>
 {recent_context}
 
-Output each tweet on a separate line, separated by "---" on its own line.
+Output each tweet followed by a line containing only "---", including after the last tweet.
 No quotes, no numbering, no explanation."""
 
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=800,
-            messages=[{"role": "user", "content": prompt}]
+        raw = self._create_message(
+            account_id, config, prompt, 800,
+            stop_when=self._thread_completed(thread_count),
+            kind=ROUTE_THREAD, category=category["topic"]
         )
-
-        raw = response.content[0].text.strip()
-        tweets = [t.strip() for t in raw.split("---") if t.strip()]
+        # 打ち切り時に受信していた次のツイートの断片は捨てる
+        tweets = [
+            t.strip() for t in raw.split(THREAD_SEPARATOR) if t.strip()
+        ][:thread_count]
 
         # 文字数チェック
         tweets = [
-            self._trim_tweet(t, style["max_characters"])
-            if len(t) > style["max_characters"] else t
+            self._trim_tweet(t, style["max_characters"], account_id)
             for t in tweets
         ]
 
@@ -173,23 +609,177 @@ No quotes, no numbering, no explanation."""
             "thread_texts": tweets,
         }
 
-    def _trim_tweet(self, text: str, max_chars: int) -> str:
-        """ツイートを文字数制限内にトリム"""
-        if len(text) <= max_chars:
+    def generate_batch(self, account_id: str, config: dict, count: int,
+                       pending_texts: list[str] = None) -> list[dict]:
+        """
+        1日分のツイートを1回のリクエストでまとめて生成する
+
+        カテゴリとスレッド有無は事前にローカルで決め、JSON配列で受け取る。
+
+        Args:
+            account_id: アカウント識別子
+            config: アカウント設定
+            count: 生成する投稿数
+            pending_texts: 未投稿の下書き本文（重複防止用）
+
+        Returns:
+            generate() と同じ形式のdictのリスト
+        """
+        if count <= 0:
+            return []
+
+        content_config = config["content"]
+        style = content_config["style"]
+        max_chars = style["max_characters"]
+
+        # 各投稿のカテゴリ・スレッド本数をローカルで決定
+        plan = []
+        for _ in range(count):
+            category = self._select_category(content_config["categories"])
+            is_thread = random.random() < style.get("thread_probability", 0)
+            plan.append((category, random.randint(2, 4) if is_thread else 1))
+
+        recent_context = self._recent_context(account_id, pending_texts)
+        items = "\n".join(
+            f'<post index="{i + 1}" tweets="{n}">'
+            f"<topic>{category['topic']}</topic>"
+            f"<topic_description>{category.get('description', '')}"
+            f"</topic_description></post>"
+            for i, (category, n) in enumerate(plan)
+        )
+
+        prompt = f"""Generate {count} independent posts for today, one for each item below.
+A post with tweets="1" is a single tweet; tweets="N" (N > 1) is a thread of exactly N tweets following the thread rules.
+Every post must cover a different angle; do not repeat ideas across posts.
+
+<posts>
+{items}
+</posts>
+{recent_context}
+
+Output ONLY a JSON array with one object per post, in the same order:
+[{{"index": 1, "tweets": ["tweet text", ...]}}, ...]
+No markdown, no explanation."""
+
+        raw = self._create_message(
+            account_id, config, prompt,
+            min(8000, sum(300 * n for _, n in plan) + 200),
+            kind=ROUTE_BATCH
+        )
+        logger.info(f"[{account_id}] 一括生成: {count}件")
+
+        posts = self._parse_batch(raw)
+        results = []
+        accepted = list(pending_texts or [])
+        for (category, n), post in zip(plan, posts):
+            tweets = [
+                self._trim_tweet(t, max_chars, account_id)
+                for t in (str(x).strip() for x in post.get("tweets", []))
+                if t
+            ]
+            if not tweets:
+                continue
+            is_thread = n > 1 and len(tweets) > 1
+            result = {
+                "text": tweets[0],
+                "category": category["topic"],
+                "is_thread": is_thread,
+                "thread_texts": tweets if is_thread else [],
+            }
+            # 似すぎている投稿は捨てる（不足分は呼び出し側で補充される）
+            if self._is_duplicate(account_id, config, result, accepted):
+                continue
+            accepted.append(self._result_text(result))
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _parse_json_array(raw: str) -> list:
+        """応答中のJSON配列を解析"""
+        raw = raw.strip()
+        # ```json ... ``` で囲まれていても受け付ける
+        fenced = re.search(r"```(?:json)?\s*(.*?)```", raw, re.DOTALL)
+        if fenced:
+            raw = fenced.group(1).strip()
+        start, end = raw.find("["), raw.rfind("]")
+        if start < 0 or end < start:
+            raise ValueError("応答にJSON配列がありません")
+        items = json.loads(raw[start:end + 1])
+        if not isinstance(items, list):
+            raise ValueError("応答がJSON配列ではありません")
+        return items
+
+    def _parse_candidates(self, account_id: str, raw: str) -> list[str]:
+        """
+        候補生成の応答を解析
+
+        JSON配列で返らなかった場合、配列の書きかけでなければ応答全体を
+        1件の候補として扱う。候補を取り出せなければ GenerationUnavailable。
+        """
+        try:
+            texts = [
+                str(t).strip() for t in self._parse_json_array(raw)
+                if str(t).strip()
+            ]
+        except ValueError as e:
+            metrics.inc(
+                "candidates_total", account=account_id, outcome="unparsed"
+            )
+            # 出力上限で途切れた配列などは本文として使えない
+            if not raw or "[" in raw:
+                raise GenerationUnavailable(
+                    f"候補生成の応答を解析できません: {e}"
+                ) from e
+            logger.warning(
+                f"[{account_id}] 候補生成の応答がJSON配列ではないため、"
+                f"応答全体を1件の候補として扱います",
+                extra={"account": account_id},
+            )
+            return [raw]
+        if not texts:
+            raise GenerationUnavailable("候補生成の応答に候補がありません")
+        return texts
+
+    @staticmethod
+    def _parse_batch(raw: str) -> list[dict]:
+        """一括生成の応答（JSON配列）を解析"""
+        return [
+            p for p in TweetGenerator._parse_json_array(raw)
+            if isinstance(p, dict)
+        ]
+
+    def _trim_tweet(self, text: str, max_chars: int,
+                    account_id: str = "") -> str:
+        """ツイートをXの重み付き文字数の上限内にトリム"""
+        if weighted_length(text) <= max_chars:
             return text
+        with metrics.timer(
+            "stage_duration_seconds", account=account_id, stage="trimming"
+        ):
+            return self._trim_text(text, max_chars)
 
+    @staticmethod
+    def _trim_text(text: str, max_chars: int) -> str:
         # ハッシュタグを分離
         parts = text.rsplit("#", 1)
         if len(parts) == 2 and len(parts[0].strip()) > 0:
             main_text = parts[0].strip()
-            if len(main_text) <= max_chars:
+            if weighted_length(main_text) <= max_chars:
                 return main_text
 
-        # 最後の文で切る
-        for sep in ["。", ". ", "! ", "？", "? "]:
-            idx = text[:max_chars].rfind(sep)
-            if idx > 0:
-                return text[:idx + len(sep)].strip()
+        # 上限内に収まる範囲の最後の文で切る
+        head = fit_prefix(text, max_chars)
+        cut = max(
+            (head.rfind(sep) + len(sep)
+             for sep in ["。", ". ", "! ", "！", "？", "? "]
+             if head.rfind(sep) > 0),
+            default=0
+        )
+        if cut > 0:
+            return head[:cut].strip()
 
-        # それでもダメなら強制カット
-        return text[:max_chars - 1] + "…"
+        # それでもダメなら強制カット（「…」自体の重みも差し引く）
+        return (
+            fit_prefix(text, max_chars - weighted_length("…")).rstrip()
+            + "…"
+        )
@@ -0,0 +1,36 @@
+"""仮想時刻の時計を使うストアのテスト"""
+
+import json
+from datetime import datetime
+
+from src.clock import VirtualClock
+from src.draft_pool import DraftPool
+from src.logger import PostHistory
+from src.schedule_store import JsonScheduleStore
+
+# 2030-01-01 00:00 UTC
+START = 1893456000.0
+
+
+def test_history_timestamps_use_clock(tmp_path):
+    clock = VirtualClock(START)
+    history = PostHistory(history_dir=tmp_path, backend="memory", clock=clock)
+    history.add("acct", "投稿")
+    assert history.get_last_post_time("acct") == datetime.fromtimestamp(START)
+
+
+def test_draft_expiry_uses_clock(tmp_path):
+    clock = VirtualClock(START)
+    pool = DraftPool(tmp_path / "drafts.json", clock=clock)
+    pool.push("acct", {"text": "下書き"}, ttl_hours=1)
+    assert pool.count("acct") == 1
+    clock.advance(2 * 3600)
+    assert pool.pop("acct") is None
+    assert pool.pop_stale("acct") == {"text": "下書き"}
+
+
+def test_schedule_saved_at_uses_clock(tmp_path):
+    path = tmp_path / "schedule_state.json"
+    JsonScheduleStore(path, clock=VirtualClock(START)).save({"acct": {}})
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["saved_at"].startswith("2030-01-01T00:00:00")
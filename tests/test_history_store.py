@@ -0,0 +1,49 @@
+"""投稿履歴ストアのテスト"""
+
+from src.dedup import DuplicateIndex
+from src.logger import PostHistory
+
+
+def _history(tmp_path, retention=3):
+    return PostHistory(
+        history_dir=tmp_path, backend="sqlite", default_retention=retention
+    )
+
+
+def test_sqlite_compaction_keeps_other_workers_accounts(tmp_path):
+    """同じDBを共有するワーカーのコンパクションが他のアカウントを消さない"""
+    worker_a = _history(tmp_path)
+    worker_b = _history(tmp_path)
+    worker_b.add("acct_b", "B の投稿 1")
+    worker_b.add("acct_b", "B の投稿 2")
+
+    # worker_a だけが acct_a をしきい値（保持件数の2倍）を超えて追加する
+    for i in range(10):
+        worker_a.add("acct_a", f"A の投稿 {i}")
+
+    reader = _history(tmp_path)
+    assert reader.get_recent_texts("acct_b") == ["B の投稿 1", "B の投稿 2"]
+    assert reader.get_recent_texts("acct_a") == [
+        "A の投稿 7", "A の投稿 8", "A の投稿 9"
+    ]
+    for history in (worker_a, worker_b, reader):
+        history.store.close()
+
+
+def test_reload_account_picks_up_other_workers_posts(tmp_path):
+    """引き継いだアカウントの履歴を読み直すと、前の担当の投稿が重複判定に使われる"""
+    new_owner = _history(tmp_path)
+    index = DuplicateIndex(new_owner)
+    assert index.max_similarity("acct", "朝のコーヒーと読書の習慣について") < 0.5
+
+    old_owner = _history(tmp_path)
+    old_owner.add("acct", "朝のコーヒーと読書の習慣について")
+    assert new_owner.get_recent_texts("acct") == []
+
+    new_owner.reload_account("acct")
+    assert new_owner.get_recent_texts("acct") == [
+        "朝のコーヒーと読書の習慣について"
+    ]
+    assert index.is_duplicate("acct", "朝のコーヒーと読書の習慣について")
+    for history in (new_owner, old_owner):
+        history.store.close()
@@ -0,0 +1,77 @@
+"""ワーカー間のアカウント分担（リースの再配分）のテスト"""
+
+from src.leases import LeaseManager, assign_owner
+
+ACCOUNTS = [f"acct{i}" for i in range(12)]
+
+
+def _workers(tmp_path, *worker_ids):
+    managers = [
+        LeaseManager(tmp_path / "leases.db", worker_id)
+        for worker_id in worker_ids
+    ]
+    for manager in managers:
+        manager.heartbeat()
+    return managers
+
+
+def test_join_moves_accounts_after_owner_releases(tmp_path):
+    """新しいワーカーは前の担当が解放したアカウントだけを引き継ぐ"""
+    (w1,) = _workers(tmp_path, "w1")
+    acquired, _ = w1.rebalance(ACCOUNTS)
+    assert acquired == set(ACCOUNTS)
+
+    (w2,) = _workers(tmp_path, "w2")
+    expected = {a for a in ACCOUNTS if assign_owner(a, ["w1", "w2"]) == "w2"}
+    assert expected and expected != set(ACCOUNTS)
+    # w1 がリースを持っている間は取得できない
+    assert w2.rebalance(ACCOUNTS) == (set(), set())
+
+    assert w1.rebalance(ACCOUNTS) == (set(), expected)
+    acquired, _ = w2.rebalance(ACCOUNTS)
+    assert acquired == expected
+    assert w1.owned().isdisjoint(w2.owned())
+    assert w1.owned() | w2.owned() == set(ACCOUNTS)
+    assert all(w2.holds(a) for a in expected)
+    assert not any(w1.holds(a) for a in expected)
+
+    w1.stop()
+    w2.stop()
+
+
+def test_stopped_worker_accounts_are_taken_over(tmp_path):
+    w1, w2 = _workers(tmp_path, "w1", "w2")
+    w1.rebalance(ACCOUNTS)
+    w2.rebalance(ACCOUNTS)
+    assert w1.owned() and w2.owned()
+
+    w2.stop()
+    assert w1.live_workers() == ["w1"]
+    _, released = w1.rebalance(ACCOUNTS)
+    assert released == set()
+    assert w1.owned() == set(ACCOUNTS)
+    w1.stop()
+
+
+def test_kept_account_is_not_released(tmp_path):
+    """スレッド投稿中など keep に含めたアカウントは担当外になっても手放さない"""
+    (w1,) = _workers(tmp_path, "w1")
+    w1.rebalance(ACCOUNTS)
+    (w2,) = _workers(tmp_path, "w2")
+    moving = sorted(
+        a for a in ACCOUNTS if assign_owner(a, ["w1", "w2"]) == "w2"
+    )
+    kept = moving[0]
+
+    _, released = w1.rebalance(ACCOUNTS, keep={kept})
+    assert released == set(moving[1:])
+    acquired, _ = w2.rebalance(ACCOUNTS)
+    assert acquired == set(moving[1:])
+    assert w1.holds(kept) and not w2.holds(kept)
+
+    # 設定から削除されたアカウントは keep に含めても解放する
+    remaining = [a for a in ACCOUNTS if a != kept]
+    _, released = w1.rebalance(remaining, keep={kept})
+    assert released == {kept}
+    w1.stop()
+    w2.stop()
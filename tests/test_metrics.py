@@ -0,0 +1,67 @@
+"""メトリクスの書き出しのテスト"""
+
+import threading
+
+from src.metrics import MetricsRegistry, load_summary, load_worker_summaries
+
+
+def test_workers_write_separate_files_with_worker_label(tmp_path):
+    """ワーカーごとに別ファイルへ書き出し、他のワーカーの値を上書きしない"""
+    for worker_id, posts in (("w1", 2), ("w2", 5)):
+        registry = MetricsRegistry()
+        registry.worker_id = worker_id
+        registry.inc("posts_total", posts, account="acct", result="success")
+        registry.observe("stage_duration_seconds", 0.2, stage="posting")
+        registry.flush(tmp_path)
+
+    assert load_summary(tmp_path) is None
+    summaries = load_worker_summaries(tmp_path)
+    assert sorted(summaries) == ["w1", "w2"]
+    assert summaries["w2"]["counters"]["posts_total"][0]["value"] == 5
+
+    prom = (tmp_path / "metrics-w1.prom").read_text(encoding="utf-8")
+    assert (
+        'xautopost_posts_total{account="acct",result="success",'
+        'worker_id="w1"} 2' in prom
+    )
+    assert 'le="+Inf"' in prom and all(
+        'worker_id="w1"' in line
+        for line in prom.splitlines() if not line.startswith("#")
+    )
+
+
+def test_single_process_keeps_default_file_names(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc("posts_total", account="acct", result="success")
+    registry.flush(tmp_path)
+    assert (tmp_path / "metrics.prom").exists()
+    assert "worker_id" not in (tmp_path / "metrics.prom").read_text()
+    assert load_worker_summaries(tmp_path) == {}
+
+
+def test_concurrent_flushes_do_not_collide(tmp_path, caplog):
+    """複数スレッドから同時に flush() しても失敗せず一時ファイルも残らない"""
+    registry = MetricsRegistry()
+    registry.inc("posts_total", account="acct", result="success")
+    errors = []
+
+    def flush_many():
+        try:
+            for _ in range(20):
+                registry.flush(tmp_path)
+        except Exception as e:  # pragma: no cover - 失敗時の診断用
+            errors.append(e)
+
+    threads = [threading.Thread(target=flush_many) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    # 書き込み失敗は flush() 内でログに出るだけなので警告の有無も確認する
+    assert "メトリクスの書き出しに失敗" not in caplog.text
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "metrics.json", "metrics.prom"
+    ]
+    assert load_summary(tmp_path)["counters"]["posts_total"][0]["value"] == 1
@@ -0,0 +1,74 @@
+"""Publisher のエラー処理のテスト（X APIは呼ばずに応答を差し替える）"""
+
+import json
+import time
+
+import pytest
+import requests
+import tweepy
+
+from src.publisher import MAX_BACKOFF_EXPONENT, Publisher
+
+
+def _response(status: int, headers: dict = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({"title": "error"}).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def publisher():
+    return Publisher("key", "secret", "token", "token_secret", "acct")
+
+
+def _raise(publisher, monkeypatch, error):
+    def create_tweet(**kwargs):
+        raise error
+    monkeypatch.setattr(publisher.client, "create_tweet", create_tweet)
+
+
+@pytest.mark.parametrize("error", [
+    tweepy.BadRequest(_response(400)),
+    tweepy.Unauthorized(_response(401)),
+    tweepy.NotFound(_response(404)),
+])
+def test_payload_errors_fail_without_account_backoff(
+        publisher, monkeypatch, error):
+    """429以外の4xxは延期せず失敗とし、アカウントの他の投稿を止めない"""
+    _raise(publisher, monkeypatch, error)
+    assert publisher.post_tweet("本文", defer=True) is None
+    assert publisher.blocked_until() == 0.0
+    assert publisher._failures == 0
+
+
+def test_rate_limit_defers_until_reset(publisher, monkeypatch):
+    reset = time.time() + 600
+    _raise(publisher, monkeypatch, tweepy.TooManyRequests(_response(429, {
+        "x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset),
+    })))
+    outcome = publisher.post_tweet("本文", defer=True)
+    assert outcome["deferred"] and outcome["reason"] == "rate_limit"
+    assert outcome["retry_at"] == pytest.approx(reset)
+
+
+@pytest.mark.parametrize("error, reason", [
+    (tweepy.TwitterServerError(_response(503)), "server_error"),
+    (requests.ConnectionError("connection reset"), "other"),
+])
+def test_server_and_transport_errors_defer(
+        publisher, monkeypatch, error, reason):
+    _raise(publisher, monkeypatch, error)
+    outcome = publisher.post_tweet("本文", defer=True)
+    assert outcome["deferred"] and outcome["reason"] == reason
+    assert publisher.blocked_until() > time.time()
+
+
+def test_backoff_exponent_is_capped(publisher, monkeypatch):
+    """連続失敗回数は上限で止まり、バックオフが際限なく伸びない"""
+    _raise(publisher, monkeypatch, tweepy.TwitterServerError(_response(503)))
+    for _ in range(MAX_BACKOFF_EXPONENT + 5):
+        publisher.rate_limit.backoff_until = 0.0
+        publisher.post_tweet("本文", defer=True)
+    assert publisher._failures == MAX_BACKOFF_EXPONENT
@@ -0,0 +1,70 @@
+"""月間予算による投稿枠の削減のテスト"""
+
+from datetime import date
+
+from src.clock import VirtualClock
+from src.metrics import metrics
+from src.quota import QuotaManager, QuotaStore
+from src.scheduler import PostScheduler
+
+# 2030-01-01 00:00 UTC（1月は31日）
+START = 1893456000.0
+DAY = date(2030, 1, 1)
+
+SCHEDULE = {
+    "posts_per_day": 3,
+    "posts_per_day_jitter": 0,
+    "timezone": "UTC",
+    "core_hours_start": 8,
+    "core_hours_end": 20,
+    "min_interval_hours": 2,
+}
+
+
+def _quota(monthly_tweets, clock):
+    config = {
+        "accounts": {
+            "acct": {
+                "schedule": SCHEDULE,
+                "quota": {"monthly_tweets": monthly_tweets},
+            },
+        },
+    }
+    return QuotaManager(QuotaStore(":memory:"), config, clock=clock)
+
+
+def _removed_metric():
+    series = metrics.summary()["counters"].get("quota_removed_slots_total", [])
+    return sum(s["value"] for s in series if s["labels"]["account"] == "acct")
+
+
+def test_slots_are_trimmed_to_daily_pace():
+    """月31ツイートなら1日1件に減らし、削減数を記録する"""
+    quota = _quota(31, VirtualClock(START))
+    before = _removed_metric()
+    assert quota.daily_allowance("acct", DAY, 3) == 1
+    assert quota.removed_slots == {"acct": 2}
+    assert _removed_metric() - before == 2
+    assert (
+        "# HELP xautopost_quota_removed_slots_total Post slots removed"
+        in metrics.to_prometheus()
+    )
+
+
+def test_exhausted_budget_leaves_no_slots():
+    quota = _quota(31, VirtualClock(START))
+    quota.record_post("acct", "app", tweets=31)
+    assert quota.daily_allowance("acct", DAY, 3) == 0
+    assert quota.removed_slots == {"acct": 3}
+
+
+def test_budget_within_pace_keeps_planned_slots():
+    quota = _quota(310, VirtualClock(START))
+    assert quota.daily_allowance("acct", DAY, 3) == 3
+    assert quota.removed_slots == {}
+
+
+def test_scheduler_samples_only_allowed_slots():
+    clock = VirtualClock(START)
+    scheduler = PostScheduler(clock=clock, quota=_quota(31, clock))
+    assert len(scheduler.generate_daily_schedule("acct", SCHEDULE)) == 1
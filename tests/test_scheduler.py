@@ -0,0 +1,105 @@
+"""スケジューラーの延期・再起動時の状態復元のテスト"""
+
+from datetime import timedelta, timezone
+
+from src.clock import VirtualClock
+from src.schedule_store import JsonScheduleStore
+from src.scheduler import SLOT_SKIPPED, SLOT_TAKEN, PostScheduler
+
+# 2030-01-01 00:00 UTC
+START = 1893456000.0
+
+SCHEDULE = {
+    "posts_per_day": 3,
+    "posts_per_day_jitter": 0,
+    "timezone": "UTC",
+    "core_hours_start": 8,
+    "core_hours_end": 20,
+    "min_interval_hours": 2,
+}
+ACCOUNTS = {"acct": {"schedule": SCHEDULE}}
+
+
+def _scheduler(clock, path):
+    return PostScheduler(
+        state_store=JsonScheduleStore(path, clock=clock), clock=clock
+    )
+
+
+def _advance_to(clock, t, seconds=0):
+    clock.advance(t.timestamp() + seconds - clock.time())
+
+
+def test_requeued_post_is_not_consumed_twice(tmp_path):
+    clock = VirtualClock(START)
+    scheduler = _scheduler(clock, tmp_path / "schedule_state.json")
+    first = scheduler.generate_daily_schedule("acct", SCHEDULE)[0]
+
+    _advance_to(clock, first)
+    assert scheduler.pop_due() == [("acct", first)]
+    retry_at = first + timedelta(minutes=10)
+    scheduler.requeue("acct", retry_at)
+
+    _advance_to(clock, retry_at)
+    assert scheduler.pop_due() == [("acct", retry_at)]
+    assert scheduler.consumed_slots("acct") == [(first, SLOT_TAKEN)]
+    assert scheduler.get_status()["acct"]["remaining"] == 2
+
+
+def test_restart_replays_missed_slots_and_keeps_retries(tmp_path):
+    """再起動後も延期中の投稿は再試行として扱い、猶予を超えた枠は見送る"""
+    path = tmp_path / "schedule_state.json"
+    clock = VirtualClock(START)
+    before = _scheduler(clock, path)
+    first, second, third = before.generate_daily_schedule("acct", SCHEDULE)
+
+    _advance_to(clock, first)
+    before.pop_due()
+    retry_at = first + timedelta(minutes=10)
+    before.requeue("acct", retry_at)
+    before.save_state()
+
+    # 再試行時刻の5分後に再起動: 延期中の投稿は猶予内なので再実行する
+    _advance_to(clock, retry_at, 5 * 60)
+    after = _scheduler(clock, path)
+    assert after.restore_state(ACCOUNTS) == {"acct"}
+    assert after.consumed_slots("acct") == [(first, SLOT_TAKEN)]
+    assert after.pop_due() == [("acct", retry_at)]
+    assert after.consumed_slots("acct") == [(first, SLOT_TAKEN)]
+
+    # 2件目の枠から1時間後に再起動: 猶予（30分）を超えたので見送る
+    _advance_to(clock, second, 3600)
+    restarted = _scheduler(clock, path)
+    restarted.restore_state(ACCOUNTS)
+    assert restarted.pop_due() == []
+    assert restarted.consumed_slots("acct") == [
+        (first, SLOT_TAKEN), (second, SLOT_SKIPPED)
+    ]
+    assert [
+        t.astimezone(timezone.utc) for t in restarted.schedules["acct"]
+    ] == [third.astimezone(timezone.utc)]
+
+
+def test_regenerated_schedule_subtracts_consumed_slots(tmp_path):
+    """設定変更で作り直しても当日に消化した枠の分は投稿数から差し引く"""
+    clock = VirtualClock(START)
+    scheduler = _scheduler(clock, tmp_path / "schedule_state.json")
+    first = scheduler.generate_daily_schedule("acct", SCHEDULE)[0]
+    _advance_to(clock, first)
+    scheduler.pop_due()
+    retry_at = first + timedelta(minutes=10)
+    scheduler.requeue("acct", retry_at)
+
+    changed = dict(SCHEDULE, core_hours_end=23)
+    times = scheduler.generate_daily_schedule(
+        "acct", changed, keep_consumed=True
+    )
+    assert retry_at in times
+    new_slots = [t for t in times if t != retry_at]
+    assert len(new_slots) == 2
+    assert all(t - first >= timedelta(hours=2) for t in new_slots)
+    assert scheduler.consumed_slots("acct") == [(first, SLOT_TAKEN)]
+
+    _advance_to(clock, retry_at)
+    assert scheduler.pop_due() == [("acct", retry_at)]
+    assert scheduler.consumed_slots("acct") == [(first, SLOT_TAKEN)]
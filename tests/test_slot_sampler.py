@@ -0,0 +1,33 @@
+"""投稿枠サンプラーのテスト"""
+
+import random
+
+from src.slot_sampler import sample_slots
+
+HOUR = 3600
+
+
+def _gaps(slots):
+    return [b - a for a, b in zip(slots, slots[1:])]
+
+
+def test_overlapping_windows_keep_min_gap():
+    """重なる時間帯（8〜12時と10〜14時）でも最低間隔を守る"""
+    windows = [(8 * HOUR, 12 * HOUR), (10 * HOUR, 14 * HOUR)]
+    rng = random.Random(0)
+    for _ in range(2000):
+        slots = sample_slots(windows, 3, 2 * HOUR, rng)
+        assert len(slots) == 3
+        assert all(8 * HOUR <= s < 14 * HOUR for s in slots)
+        assert all(gap >= 2 * HOUR for gap in _gaps(slots))
+
+
+def test_nested_and_touching_windows_are_merged():
+    """内包・隣接する時間帯は1つの区間として収容数を数える"""
+    windows = [(0, 4 * HOUR), (1 * HOUR, 2 * HOUR), (4 * HOUR, 6 * HOUR)]
+    rng = random.Random(1)
+    for _ in range(500):
+        # 0〜6時に2時間間隔で入るのは最大3件
+        slots = sample_slots(windows, 5, 2 * HOUR, rng)
+        assert len(slots) == 3
+        assert all(gap >= 2 * HOUR for gap in _gaps(slots))
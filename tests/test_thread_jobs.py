@@ -0,0 +1,81 @@
+"""スレッド投稿ジョブのテスト"""
+
+import time
+
+from src.logger import PostHistory
+from src.thread_jobs import (
+    MAX_STEP_FAILURES, ThreadJobStore, advance_thread_job,
+)
+
+THREAD = {
+    "category": "AI tools",
+    "thread_texts": ["1つ目", "2つ目", "3つ目"],
+}
+
+
+class _StubPublisher:
+    """post_tweet の戻り値を順に返す"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post_tweet(self, text, reply_to=None, defer=False):
+        self.calls += 1
+        outcome = self.outcomes[min(self.calls, len(self.outcomes)) - 1]
+        return outcome(text) if callable(outcome) else outcome
+
+
+def _deferred(reason):
+    return lambda text: {
+        "id": None, "text": text, "deferred": True,
+        "retry_at": time.time() + 60, "attempt": 1, "reason": reason,
+    }
+
+
+def _setup(tmp_path):
+    store = ThreadJobStore(tmp_path / "thread_jobs.json")
+    history = PostHistory(history_dir=tmp_path, backend="memory")
+    return store, history, store.create("acct", THREAD)
+
+
+def test_job_abandoned_after_repeated_server_error_deferrals(tmp_path):
+    """5xx・通信エラーの延期が続くジョブは上限で中止し、担当を手放せるようにする"""
+    store, history, job = _setup(tmp_path)
+    pub = _StubPublisher(
+        {"id": "100", "text": "1つ目"}, _deferred("server_error")
+    )
+    results = [
+        advance_thread_job(job, pub, store, history)
+        for _ in range(1 + MAX_STEP_FAILURES)
+    ]
+    assert results[-1] is None
+    assert all(r is not None for r in results[:-1])
+    assert store.pending() == []
+    # 投稿済みの先頭ツイートは履歴に残る
+    assert history.get_recent_texts("acct") == ["1つ目"]
+
+
+def test_rate_limit_deferrals_do_not_abandon_job(tmp_path):
+    store, history, job = _setup(tmp_path)
+    pub = _StubPublisher(_deferred("rate_limit"))
+    for _ in range(MAX_STEP_FAILURES * 3):
+        assert advance_thread_job(job, pub, store, history) is not None
+    assert [j["job_id"] for j in store.pending()] == [job["job_id"]]
+    assert job["failures"] == 0
+
+
+def test_success_resets_failures(tmp_path):
+    store, history, job = _setup(tmp_path)
+    pub = _StubPublisher(
+        _deferred("other"), {"id": "1", "text": "1つ目"},
+        {"id": "2", "text": "2つ目"}, {"id": "3", "text": "3つ目"},
+    )
+    assert advance_thread_job(job, pub, store, history) is not None
+    assert job["failures"] == 1
+    assert advance_thread_job(job, pub, store, history) is not None
+    assert job["failures"] == 0
+    advance_thread_job(job, pub, store, history)
+    assert advance_thread_job(job, pub, store, history) is None
+    assert job["posted_ids"] == ["1", "2", "3"]
+    assert store.pending() == []
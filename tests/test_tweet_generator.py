@@ -0,0 +1,122 @@
+"""ツイート生成のテスト（APIは呼ばずに応答を差し替える）"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+from anthropic.types import Message, Usage
+
+from src.logger import PostHistory
+from src.model_router import GenerationUnavailable
+from src.tweet_generator import TweetGenerator
+
+
+def _config(**style):
+    return {
+        "content": {
+            "style": {
+                "max_characters": 280,
+                "thread_probability": 0,
+                **style,
+            },
+            "categories": [{"topic": "AI tools", "weight": 1}],
+        },
+    }
+
+
+@pytest.fixture
+def generator(tmp_path):
+    history = PostHistory(history_dir=tmp_path, backend="memory")
+    return TweetGenerator(api_key="test", history=history)
+
+
+def _reply_with(generator, monkeypatch, *replies):
+    replies = list(replies)
+    monkeypatch.setattr(
+        generator, "_create_message", lambda *args, **kwargs: replies.pop(0)
+    )
+
+
+def test_candidates_plain_text_reply_becomes_single_candidate(
+        generator, monkeypatch):
+    """JSON配列ではない応答は1件の候補として扱う"""
+    _reply_with(generator, monkeypatch, "AIツールの選び方は目的から逆算する")
+    result = generator.generate("acct", _config(candidates=3))
+    assert result["text"] == "AIツールの選び方は目的から逆算する"
+
+
+def test_candidates_truncated_array_raises_generation_unavailable(
+        generator, monkeypatch):
+    """途切れたJSON配列は ValueError ではなく GenerationUnavailable になる"""
+    _reply_with(generator, monkeypatch, '["最初の候補", "途中で切れた')
+    with pytest.raises(GenerationUnavailable):
+        generator.generate("acct", _config(candidates=3))
+
+
+def test_duplicate_after_regenerations_is_not_returned(generator, monkeypatch):
+    """再生成しても履歴と同じ内容なら投稿せず GenerationUnavailable"""
+    text = "AIツールの選び方は目的から逆算するのが一番の近道です"
+    generator.history.add("acct", text)
+    _reply_with(generator, monkeypatch, text, text)
+    with pytest.raises(GenerationUnavailable):
+        generator.generate("acct", _config(max_regenerations=1))
+
+
+def test_regeneration_returns_first_non_duplicate(generator, monkeypatch):
+    text = "AIツールの選び方は目的から逆算するのが一番の近道です"
+    generator.history.add("acct", text)
+    _reply_with(generator, monkeypatch, text, "今日は朝の散歩で季節の変化を感じました")
+    result = generator.generate("acct", _config(max_regenerations=1))
+    assert result["text"] == "今日は朝の散歩で季節の変化を感じました"
+
+
+class _FakeStream:
+    """client.messages.stream() の代わり（受信したチャンク数を数える）"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.received = 0
+        self.current_message_snapshot = Message(
+            id="msg", type="message", role="assistant", model="stub",
+            content=[], stop_reason=None, stop_sequence=None,
+            usage=Usage(input_tokens=100, output_tokens=1),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for chunk in self.chunks:
+            self.received += 1
+            yield chunk
+
+
+def _fake_client(stream):
+    return SimpleNamespace(
+        messages=SimpleNamespace(stream=lambda **kwargs: stream)
+    )
+
+
+def test_thread_stream_stops_at_closing_separator(generator):
+    """thread_count 件目の区切り線で受信を打ち切り、続きは受け取らない"""
+    chunks = [
+        "一つ目のツイート", "\n---\n", "二つ目のツイート", "\n---\n",
+        "三つ目のツイート", "\n---\n",
+        "四つ目の余分なツイート", "\n---\n", "補足の説明",
+    ]
+    stream = _FakeStream(chunks)
+    text, usage = generator._stream_message(
+        _fake_client(stream), "acct", {},
+        generator._thread_completed(3), time.perf_counter() + 60
+    )
+    assert stream.received == 6
+    assert [t.strip() for t in text.split("---") if t.strip()] == [
+        "一つ目のツイート", "二つ目のツイート", "三つ目のツイート"
+    ]
+    # 打ち切ったストリームの出力トークン数は受信済みのテキストから見積もる
+    assert usage.output_tokens >= len("一つ目のツイート") * 3
+    assert usage.input_tokens == 100